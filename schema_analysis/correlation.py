@@ -0,0 +1,149 @@
+import pandas as pd
+import numpy as np
+from scipy import stats
+
+# Bootstrap replicates weighted per batch (bounds the (batch, subjects, 3 * faces) temporary)
+BOOTSTRAP_BATCH = 16
+
+
+def subject_face_matrix(subject_D_df, value='D'):
+    """
+    Pivots subject-level values into a subjects x faces matrix.
+
+    Returns:
+        tuple: (values, mask, user_numbers, face_ids). `values` is a float array
+        with 0 where a subject has no value for a face; `mask` marks the
+        observed entries.
+    """
+    wide = subject_D_df.pivot_table(index='user_number', columns='face_id', values=value, aggfunc='mean')
+    mask = wide.notna().to_numpy()
+    values = np.where(mask, wide.to_numpy(dtype=float), 0.0)
+    return values, mask, wide.index.to_numpy(), wide.columns.to_numpy()
+
+
+def pairwise_correlations(values, mask, weights=None):
+    """
+    Pairwise-complete Pearson correlations between all columns, as matrix products.
+
+    Every pair (a, b) uses only the subjects observed for both. With the
+    masked matrix X (0 where missing) and the mask M, the sums over those
+    subjects are X'M (sums of a where b is present), (X*X)'M and X'X, so all
+    pairs come out of a few (faces x faces) products. Columns are centered
+    first to keep the products well conditioned.
+
+    Args:
+        values (np.ndarray): (n_subjects, n_faces) values, 0 where missing.
+        mask (np.ndarray): (n_subjects, n_faces) observed entries.
+        weights (np.ndarray): Optional (n_replicates, n_subjects) subject weights
+            (bootstrap counts); gives one set of matrices per replicate.
+
+    Returns:
+        tuple: (r, n) matrices; n is the (weighted) number of shared subjects.
+        r is NaN for pairs with fewer than 3 shared subjects or no variance.
+    """
+    m = mask.astype(float)
+    observed = m.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        center = np.where(observed > 0, values.sum(axis=0) / observed, 0)
+    x = (values - center) * m
+
+    if weights is None:
+        n = m.T @ m
+        sx = x.T @ m
+        sxx = (x * x).T @ m
+        sxy = x.T @ x
+    else:
+        # All four weighted sums from one batched product: [m | x | x*x]' W [m | x]
+        k = values.shape[1]
+        left = np.concatenate([m, x, x * x], axis=1)
+        weighted = np.swapaxes(left[None] * weights[:, :, None], 1, 2)
+        products = weighted @ np.concatenate([m, x], axis=1)
+        n = products[:, :k, :k]
+        sx = products[:, k:2 * k, :k]
+        sxx = products[:, 2 * k:, :k]
+        sxy = products[:, k:2 * k, k:]
+
+    sx_t = np.swapaxes(sx, -1, -2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = sxy - sx * sx_t / n
+        var_a = sxx - sx ** 2 / n
+        var_b = np.swapaxes(var_a, -1, -2)
+        r = cov / np.sqrt(var_a * var_b)
+    r = np.where((n >= 3) & (var_a > 0) & (var_b > 0), np.clip(r, -1, 1), np.nan)
+    return r, n
+
+
+def face_correlations(subject_D_df, n_boot=0, alpha=0.05, seed=0, value='D'):
+    """
+    Do subjects who show an effect for one face also show it for the others?
+    Correlates subject-level D between every pair of faces.
+
+    For each pair, over the subjects measured on both faces: Pearson r and its
+    two-sided p-value (t = r * sqrt((n - 2) / (1 - r^2)) on n - 2 df, as
+    scipy.stats.pearsonr), and sign agreement (share of those subjects whose D
+    has the same sign on both faces). With n_boot > 0, percentile bootstrap
+    CIs of r from resampling subjects; each replicate is a vector of
+    multinomial subject counts, so replicates are computed as weighted matrix
+    products in batches rather than by resampling rows.
+
+    Args:
+        subject_D_df (pd.DataFrame): Output of calc_subject_D() (user_number, face_id, D).
+        n_boot (int): Bootstrap replicates (0 = no CIs).
+        alpha (float): CI level is 1 - alpha.
+        seed (int): Seed for the bootstrap.
+        value (str): Column to correlate.
+
+    Returns:
+        pd.DataFrame: One row per face pair (face_a < face_b) with n_subjects, r,
+        p_value, sign_agreement and, with n_boot > 0, ci_low and ci_high.
+    """
+    columns = ['face_a', 'face_b', 'n_subjects', 'r', 'p_value', 'sign_agreement']
+    if n_boot:
+        columns += ['ci_low', 'ci_high']
+    if subject_D_df.empty:
+        return pd.DataFrame(columns=columns)
+
+    values, mask, _, faces = subject_face_matrix(subject_D_df, value)
+    r, n = pairwise_correlations(values, mask)
+
+    positive = ((values > 0) & mask).astype(float)
+    negative = ((values < 0) & mask).astype(float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sign_agreement = (positive.T @ positive + negative.T @ negative) / n
+        t_stat = r * np.sqrt((n - 2) / (1 - r ** 2))
+    p_value = np.where(np.abs(r) == 1, 0.0, 2 * stats.t.sf(np.abs(t_stat), np.maximum(n - 2, 1)))
+    p_value = np.where(np.isnan(r), np.nan, p_value)
+
+    a, b = np.triu_indices(len(faces), k=1)
+    result = pd.DataFrame({
+        'face_a': faces[a],
+        'face_b': faces[b],
+        'n_subjects': n[a, b].astype(int),
+        'r': r[a, b],
+        'p_value': p_value[a, b],
+        'sign_agreement': sign_agreement[a, b],
+    })
+
+    if n_boot:
+        rng = np.random.default_rng(seed)
+        n_subjects = len(values)
+        boot_r = np.empty((n_boot, len(a)))
+        for start in range(0, n_boot, BOOTSTRAP_BATCH):
+            size = min(BOOTSTRAP_BATCH, n_boot - start)
+            weights = rng.multinomial(n_subjects, np.full(n_subjects, 1 / n_subjects), size=size).astype(float)
+            boot_r[start:start + size] = pairwise_correlations(values, mask, weights)[0][:, a, b]
+        ci = np.full((2, len(a)), np.nan)
+        defined = ~np.isnan(boot_r).all(axis=0)
+        ci[:, defined] = np.nanquantile(boot_r[:, defined], [alpha / 2, 1 - alpha / 2], axis=0)
+        result['ci_low'] = ci[0]
+        result['ci_high'] = ci[1]
+
+    return result[columns]
+
+
+def correlation_matrix(correlations_df, column='r'):
+    """Square faces x faces view of one face_correlations() column (diagonal NaN)."""
+    faces = sorted(set(correlations_df['face_a']) | set(correlations_df['face_b']))
+    square = correlations_df.pivot(index='face_a', columns='face_b', values=column)
+    square = square.reindex(index=faces, columns=faces)
+    return square.combine_first(square.T).rename_axis(index=None, columns=None)
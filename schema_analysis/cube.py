@@ -0,0 +1,145 @@
+import itertools
+import pandas as pd
+import numpy as np
+from . import processing
+from . import rank_tests as rank_test_engine
+from . import bayes
+
+# Dimensions the cube can break results down by (in addition to face_id)
+CUBE_DIMENSIONS = ['tubeTypeIndex', 'pair_type', 'sightType', 'session_group']
+
+# Dimensions that describe a subject rather than a pair; joined from the trial table
+SUBJECT_ATTRIBUTES = ['sightType', 'session_group']
+
+
+def all_grouping_sets(dimensions):
+    """
+    Returns every combination of `dimensions` (the power set), smallest first.
+    The empty set is the plain per-face breakdown reported by calc_stats().
+    """
+    return [list(combo)
+            for order in range(len(dimensions) + 1)
+            for combo in itertools.combinations(dimensions, order)]
+
+
+def attach_subject_attributes(pairs_df, trials_df, attributes=SUBJECT_ATTRIBUTES):
+    """
+    Adds per-subject attributes (e.g. sightType, session_group) to the pairs table.
+    Attributes missing from the trial table are skipped. Raises ValueError if an
+    attribute is not constant within a subject (missing counts as a value).
+    """
+    attributes = [a for a in attributes if a in trials_df.columns and a not in pairs_df.columns]
+    if not attributes:
+        return pairs_df
+    grouped = trials_df.groupby('user_number')[attributes]
+    n_values = grouped.nunique(dropna=False)
+    varying = n_values.columns[(n_values > 1).any()]
+    for attribute in varying:
+        users = n_values.index[n_values[attribute] > 1].tolist()
+        raise ValueError(f"'{attribute}' changes within subject(s) {users[:10]}; "
+                         f"cannot assign them to a single {attribute} slice.")
+    subject_attrs = grouped.first()
+    return pairs_df.join(subject_attrs, on='user_number')
+
+
+def calc_subject_D_cube(pairs_df, grouping_sets):
+    """
+    Calculates subject-level D for every grouping set in one pass.
+
+    The pairs are reduced once to per-cell sufficient statistics (sum and count
+    of 'd' at the finest requested granularity). Every grouping set is then a
+    re-aggregation of that small table rather than a new pass over the pairs.
+
+    Args:
+        pairs_df (pd.DataFrame): Output of balance_trials(), with any extra dimension columns.
+        grouping_sets (list): List of lists of dimension names.
+
+    Returns:
+        pd.DataFrame: Long table with columns grouping, face_id, <dimensions...>, user_number, D, n_pairs.
+        Dimensions not part of a row's grouping set are NaN.
+    """
+    dimensions = sorted({d for gs in grouping_sets for d in gs}, key=_dimension_order)
+    missing = [d for d in dimensions if d not in pairs_df.columns]
+    if missing:
+        raise ValueError(f"Missing dimension column(s) {missing} in pairs data.")
+
+    base_keys = ['user_number', 'face_id']
+    cells = (pairs_df.groupby(base_keys + dimensions, dropna=False)['d']
+             .agg(d_sum='sum', n_pairs='count')
+             .reset_index())
+
+    subject_tables = []
+    for grouping in grouping_sets:
+        keys = base_keys + list(grouping)
+        subject = (cells.groupby(keys, dropna=False)[['d_sum', 'n_pairs']]
+                   .sum()
+                   .reset_index())
+        subject['D'] = subject['d_sum'] / subject['n_pairs']
+        subject['grouping'] = _grouping_label(grouping)
+        subject_tables.append(subject.drop(columns='d_sum'))
+
+    subject_D = pd.concat(subject_tables, ignore_index=True)
+    return subject_D[['grouping', 'face_id'] + dimensions + ['user_number', 'D', 'n_pairs']]
+
+
+def calc_stats_cube(pairs_df, grouping_sets=None, dimensions=CUBE_DIMENSIONS, rank_tests=False,
+                    bayes_factor=False):
+    """
+    Calculates the per-face one-sample t-test summary for every grouping set.
+
+    Args:
+        pairs_df (pd.DataFrame): Output of balance_trials(), with subject attributes attached.
+        grouping_sets (list): List of lists of dimension names. Defaults to every
+            combination of `dimensions` that is present in `pairs_df`.
+        dimensions (list): Candidate dimensions used when grouping_sets is None.
+        rank_tests (bool): Add Wilcoxon signed-rank and Yuen trimmed-mean columns
+            (see rank_tests.rank_test_summary), ranked for all slices in one pass.
+        bayes_factor (bool): Add the JZS Bayes factor column 'bf10' (see
+            bayes.jzs_bayes_factor), integrated for all slices in one pass.
+
+    Returns:
+        pd.DataFrame: Long table with columns grouping, face_id, <dimensions...>,
+        mean, std, sem, n_subjects, t_stat, p_value. Dimensions not part of a
+        row's grouping set are NaN.
+    """
+    if grouping_sets is None:
+        grouping_sets = all_grouping_sets([d for d in dimensions if d in pairs_df.columns])
+    grouping_sets = [list(gs) for gs in grouping_sets]
+    dimensions = sorted({d for gs in grouping_sets for d in gs}, key=_dimension_order)
+
+    stat_cols = ['mean', 'std', 'sem', 'n_subjects', 't_stat', 'p_value']
+    if rank_tests:
+        stat_cols += rank_test_engine.RANK_TEST_COLUMNS
+    if bayes_factor:
+        stat_cols += bayes.BAYES_COLUMNS
+    if pairs_df.empty:
+        return pd.DataFrame(columns=['grouping', 'face_id'] + dimensions + stat_cols)
+
+    subject_D = calc_subject_D_cube(pairs_df, grouping_sets)
+
+    # Mark dimensions outside each row's grouping set with a sentinel so they
+    # group together without being confused with genuinely missing values
+    sentinel = '__all__'
+    keyed = subject_D.copy()
+    for dim in dimensions:
+        labels_using_dim = [_grouping_label(gs) for gs in grouping_sets if dim in gs]
+        keyed[dim] = keyed[dim].astype(object)
+        keyed.loc[~keyed['grouping'].isin(labels_using_dim), dim] = sentinel
+
+    by = ['grouping', 'face_id'] + dimensions
+    summary = processing.one_sample_t_summary(keyed, by)
+    if rank_tests:
+        summary = summary.merge(rank_test_engine.rank_test_summary(keyed, by), on=by, how='left')
+    if bayes_factor:
+        summary = bayes.add_bayes_factors(summary)
+    for dim in dimensions:
+        summary[dim] = summary[dim].where(summary[dim] != sentinel, np.nan)
+    return summary
+
+
+def _grouping_label(grouping):
+    return '+'.join(['face_id'] + list(grouping))
+
+
+def _dimension_order(dim):
+    return CUBE_DIMENSIONS.index(dim) if dim in CUBE_DIMENSIONS else len(CUBE_DIMENSIONS)
@@ -1,32 +1,225 @@
 import pandas as pd
+import bz2
+import gzip
+import lzma
 import os
+import queue
+import threading
+import warnings
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-def load_and_merge_csvs(directory):
+# Columns identifying one trial across exports
+TRIAL_KEY_COLUMNS = ['user_number', 'trialIndex']
+
+SOURCE_COLUMN = 'source_file'
+
+# Export files the loader reads; compressed files are decompressed while streaming
+EXPORT_SUFFIXES = ('.csv', '.csv.gz', '.csv.bz2', '.csv.xz', '.zip')
+
+# Rows per chunk and chunks buffered between the reader threads and the consumer
+DEFAULT_CHUNKSIZE = 100_000
+MAX_PENDING_CHUNKS = 8
+
+_DECOMPRESSORS = {'gz': gzip.open, 'bz2': bz2.open, 'xz': lzma.open}
+
+_DONE = object()
+
+def deduplicate_trials(df, key_columns=TRIAL_KEY_COLUMNS, source_column=SOURCE_COLUMN, on_conflict='keep'):
     """
-    Finds and merges all CSV files in the specified directory.
-    
+    Drops exact duplicate trials and detects conflicting ones.
+
+    Each row is reduced to a 64-bit hash of its key columns and a 64-bit hash
+    of its content (every column except `source_column`). Exact duplicates
+    share both hashes; conflicts share a key hash but differ in content.
+    Detection is a hash-based duplicated()/groupby, so it scales linearly.
+
     Args:
-        directory (str): Path to directory containing CSV files
-        
+        df (pd.DataFrame): Merged trials, optionally with a column naming the source file.
+        key_columns (list): Columns identifying a trial.
+        source_column (str): Column with the originating file (ignored for content).
+        on_conflict (str): What to do with conflicting trials:
+            'keep' leaves every version, 'first' keeps the first one loaded,
+            'drop' removes all versions.
+
+    Returns:
+        tuple: (deduplicated DataFrame, conflicts DataFrame). The conflicts table
+        holds every version of each conflicting trial, sorted by key.
+    """
+    if on_conflict not in ('keep', 'first', 'drop'):
+        raise ValueError(f"Unknown on_conflict '{on_conflict}'. Use 'keep', 'first' or 'drop'.")
+    missing = [c for c in key_columns if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing key column(s) {missing}.")
+
+    content_columns = [c for c in df.columns if c != source_column]
+    key_hash = pd.util.hash_pandas_object(df[key_columns], index=False).to_numpy()
+    row_hash = pd.util.hash_pandas_object(df[content_columns], index=False).to_numpy()
+    hashes = pd.DataFrame({'key': key_hash, 'row': row_hash})
+
+    exact_duplicate = hashes.duplicated().to_numpy()
+    deduped = df[~exact_duplicate]
+    hashes = hashes[~exact_duplicate]
+
+    versions = hashes.groupby('key')['row'].transform('size').to_numpy()
+    conflicting = versions > 1
+    conflicts = deduped[conflicting].sort_values(key_columns, kind='stable')
+
+    if on_conflict == 'drop':
+        deduped = deduped[~conflicting]
+    elif on_conflict == 'first':
+        deduped = deduped[~hashes.duplicated('key').to_numpy()]
+
+    return deduped.reset_index(drop=True), conflicts.reset_index(drop=True)
+
+def find_export_files(directory):
+    """
+    Returns the export files in a directory (plain, gzip/bz2/xz-compressed
+    CSVs and zip bundles), sorted by name.
+    """
+    return sorted(p for p in Path(directory).iterdir()
+                  if p.is_file() and p.name.lower().endswith(EXPORT_SUFFIXES))
+
+
+def iter_trial_chunks(files, chunksize=DEFAULT_CHUNKSIZE, n_workers=4, max_pending=MAX_PENDING_CHUNKS):
+    """
+    Streams trials from export files in chunks, decompressing several files concurrently.
+
+    Each file is read by a worker thread with pd.read_csv(chunksize=...), so
+    compressed data is decompressed incrementally and never written to disk.
+    Zip bundles yield every *.csv member. Workers hand chunks over through a
+    bounded queue, so at most `max_pending` chunks are held in memory ahead
+    of the consumer.
+
+    Chunks of different files arrive interleaved; chunks of one CSV arrive in order.
+
+    Args:
+        files (list): Paths of export files (see find_export_files).
+        chunksize (int): Rows per chunk.
+        n_workers (int): Files decompressed concurrently.
+        max_pending (int): Chunks buffered ahead of the consumer.
+
+    Yields:
+        tuple: (file_number, source, chunk_number, DataFrame). `source` names the
+        file, or 'bundle.zip/member.csv' for zip members; `file_number` is the
+        position in `files`.
+    """
+    files = [Path(f) for f in files]
+    chunks = queue.Queue(maxsize=max_pending)
+    stop = threading.Event()
+
+    def put(item):
+        # Give up if the consumer stopped iterating, instead of blocking forever
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def read_file(file_number, path):
+        try:
+            for source, handle in _open_export(path):
+                with handle:
+                    for chunk_number, chunk in enumerate(pd.read_csv(handle, chunksize=chunksize)):
+                        if not put((file_number, source, chunk_number, chunk)):
+                            return
+            put(_DONE)
+        except BaseException as e:
+            put(e)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, n_workers))
+    try:
+        for file_number, path in enumerate(files):
+            executor.submit(read_file, file_number, path)
+        remaining = len(files)
+        while remaining:
+            item = chunks.get()
+            if item is _DONE:
+                remaining -= 1
+            elif isinstance(item, BaseException):
+                raise item
+            else:
+                yield item
+    finally:
+        stop.set()
+        executor.shutdown(wait=True)
+
+
+def _open_export(path):
+    """Yields (source name, binary stream) for each CSV stored in an export file."""
+    name = path.name.lower()
+    if name.endswith('.zip'):
+        with zipfile.ZipFile(path) as bundle:
+            for member in bundle.namelist():
+                if member.lower().endswith('.csv') and not member.startswith('__MACOSX/'):
+                    yield f"{path.name}/{member}", bundle.open(member)
+    else:
+        opener = _DECOMPRESSORS.get(name.rsplit('.', 1)[-1], open)
+        yield path.name, opener(path, 'rb')
+
+
+def load_and_merge_csvs(directory, deduplicate=True, on_conflict='keep', return_conflicts=False,
+                        chunksize=DEFAULT_CHUNKSIZE, n_workers=4):
+    """
+    Finds and merges all CSV exports in the specified directory.
+    Plain .csv, compressed .csv.gz/.csv.bz2/.csv.xz and .zip bundles of CSVs
+    are read directly, streaming in chunks (see iter_trial_chunks).
+
+    Args:
+        directory (str): Path to directory containing the exports
+        deduplicate (bool): Drop exact duplicate trials (same user_number and
+            trialIndex with identical content), e.g. from sessions exported twice.
+            Skipped with a warning when the exports lack a key column.
+        on_conflict (str): Handling of trials whose content differs between
+            copies: 'keep', 'first' or 'drop' (see deduplicate_trials).
+        return_conflicts (bool): Also return the table of conflicting trials.
+        chunksize (int): Rows read per chunk.
+        n_workers (int): Files decompressed concurrently.
+
     Returns:
         pd.DataFrame: Merged DataFrame with all experiments
+        (and the conflicts DataFrame if return_conflicts=True)
     """
-    csv_files = list(Path(directory).glob('*.csv'))
-    
-    if not csv_files:
+    export_files = find_export_files(directory)
+
+    if not export_files:
         raise FileNotFoundError(f"No CSV files found in {directory}")
-    
-    print(f"Found {len(csv_files)} CSV file(s) in {directory}")
-    
-    dataframes = []
-    for csv_file in csv_files:
-        print(f"  Loading: {csv_file.name}")
-        df = pd.read_csv(csv_file)
-        dataframes.append(df)
-    
+
+    print(f"Found {len(export_files)} export file(s) in {directory}")
+
+    # Chunks arrive interleaved across files; reassemble them in file order
+    parts = {}
+    for file_number, source, chunk_number, chunk in iter_trial_chunks(export_files, chunksize, n_workers):
+        if chunk_number == 0:
+            print(f"  Loading: {source}")
+        chunk[SOURCE_COLUMN] = source
+        parts[(file_number, source, chunk_number)] = chunk
+    if not parts:
+        raise FileNotFoundError(f"No CSV data found in the exports in {directory}")
+    dataframes = [parts[key] for key in sorted(parts)]
+    # Header-only exports carry no rows but would widen every column to object
+    dataframes = [df for df in dataframes if len(df)] or dataframes[:1]
+
     # Merge all dataframes
     merged_df = pd.concat(dataframes, ignore_index=True)
     print(f"Combined total: {len(merged_df)} trials")
-    
+
+    conflicts = merged_df.iloc[0:0]
+    missing_keys = [c for c in TRIAL_KEY_COLUMNS if c not in merged_df.columns]
+    if deduplicate and missing_keys:
+        warnings.warn(f"Exports have no {missing_keys} column(s); trials were not de-duplicated.")
+    elif deduplicate:
+        n_before = len(merged_df)
+        merged_df, conflicts = deduplicate_trials(merged_df, on_conflict=on_conflict)
+        n_conflicting = len(conflicts.drop_duplicates(TRIAL_KEY_COLUMNS))
+        removed = "duplicate" if on_conflict == 'keep' else "duplicate/conflicting"
+        print(f"Removed {n_before - len(merged_df)} {removed} row(s); "
+              f"{n_conflicting} trial(s) have conflicting copies (on_conflict='{on_conflict}')")
+
+    merged_df = merged_df.drop(columns=SOURCE_COLUMN)
+    if return_conflicts:
+        return merged_df, conflicts
     return merged_df
@@ -0,0 +1,205 @@
+import json
+import os
+import shutil
+from pathlib import Path
+import pandas as pd
+
+EXPORT_FORMATS = ('parquet', 'arrow', 'csv')
+
+# File extension per format
+EXTENSIONS = {'parquet': '.parquet', 'arrow': '.arrow', 'csv': '.csv'}
+
+# Key under which the export metadata is stored in the Arrow/Parquet schema
+METADATA_KEY = b'schema_analysis'
+
+PARTITION_COLUMN = 'face_id'
+
+# Hive name of the partition holding rows without a face_id
+NULL_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+
+# Codec per format for compression='auto': Arrow IPC stays uncompressed so
+# read_table() can memory-map it without copying
+DEFAULT_COMPRESSION = {'parquet': 'zstd', 'arrow': None}
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("Parquet/Arrow export requires pyarrow. Install it with: pip install pyarrow")
+    return pyarrow
+
+
+def export_results(output_dir, tables, fmt='parquet', thresholds=None, compression='auto'):
+    """
+    Writes result tables (e.g. d_values, subject_D, statistics) to `output_dir`.
+
+    Parquet and Arrow IPC tables are partitioned by face_id in hive layout
+    (<output_dir>/<table>/face_id=<ID>/part-0.<ext>) and carry the thresholds
+    in their schema metadata. Rows without a face_id go to the
+    face_id=__HIVE_DEFAULT_PARTITION__ partition. CSV writes one flat <output_dir>/<table>.csv
+    per table, as before.
+
+    Args:
+        output_dir (str): Directory to write into.
+        tables (dict): Table name -> pd.DataFrame.
+        fmt (str): 'parquet', 'arrow' or 'csv'.
+        thresholds (dict): Analysis settings to record, e.g. min_angle, max_angle, max_invalid_trials.
+        compression (str): Codec for Parquet/Arrow ('zstd', 'lz4', None). 'auto'
+            uses zstd for Parquet and no compression for Arrow IPC, which
+            can then be memory-mapped without any copy (see read_table()).
+
+    Returns:
+        dict: Table name -> path written.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown format '{fmt}'. Choose one of {EXPORT_FORMATS}.")
+    if compression == 'auto':
+        compression = DEFAULT_COMPRESSION.get(fmt)
+    os.makedirs(output_dir, exist_ok=True)
+
+    paths = {}
+    for name, df in tables.items():
+        if fmt == 'csv':
+            path = os.path.join(output_dir, f"{name}.csv")
+            df.to_csv(path, index=False)
+        else:
+            path = os.path.join(output_dir, name)
+            _write_partitioned(df, path, fmt, name, thresholds or {}, compression)
+        paths[name] = path
+    return paths
+
+
+def _write_partitioned(df, path, fmt, name, thresholds, compression):
+    pa = _require_pyarrow()
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    metadata = dict(schema.metadata or {})
+    metadata[METADATA_KEY] = json.dumps({'table': name, 'thresholds': thresholds}).encode()
+    schema = schema.with_metadata(metadata)
+
+    # Replace any earlier export so stale face partitions do not linger
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+    if PARTITION_COLUMN not in df.columns:
+        _write_file(pa.Table.from_pandas(df, schema=schema, preserve_index=False),
+                    os.path.join(path, f"part-0{EXTENSIONS[fmt]}"), fmt, compression)
+        return
+
+    for face_id, face_df in df.groupby(PARTITION_COLUMN, sort=True, dropna=False):
+        partition_dir = os.path.join(path, _partition_name(face_id))
+        os.makedirs(partition_dir, exist_ok=True)
+        table = pa.Table.from_pandas(face_df, schema=schema, preserve_index=False)
+        _write_file(table, os.path.join(partition_dir, f"part-0{EXTENSIONS[fmt]}"), fmt, compression)
+
+
+def _partition_name(face_id):
+    return f"{PARTITION_COLUMN}={NULL_PARTITION if pd.isna(face_id) else face_id}"
+
+
+def _write_file(table, path, fmt, compression):
+    pa = _require_pyarrow()
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        pq.write_table(table, path, compression=compression or 'none')
+    else:
+        options = pa.ipc.IpcWriteOptions(compression=compression)
+        with pa.OSFile(path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema, options=options) as writer:
+                writer.write_table(table)
+
+
+def _partition_files(path, fmt):
+    files = sorted(Path(path).glob(f"**/*{EXTENSIONS[fmt]}"))
+    if not files:
+        raise FileNotFoundError(f"No {fmt} files found in {path}")
+    return files
+
+
+def _detect_format(output_dir, name):
+    if os.path.isfile(os.path.join(output_dir, f"{name}.csv")):
+        return 'csv'
+    for fmt in ('parquet', 'arrow'):
+        if any(Path(output_dir, name).glob(f"**/*{EXTENSIONS[fmt]}")):
+            return fmt
+    raise FileNotFoundError(f"No exported table '{name}' found in {output_dir}")
+
+
+def read_table(output_dir, name, fmt=None, face_ids=None):
+    """
+    Reads an exported table as a pyarrow Table, memory-mapping every partition.
+
+    Only uncompressed Arrow IPC (the Arrow default of export_results()) is
+    zero-copy: its columns are views of the mapped pages. Compressed Arrow IPC
+    and Parquet are decompressed from the mapped pages into new buffers, so
+    they take less disk but are copied into memory on every read.
+
+    Args:
+        output_dir (str): Directory passed to export_results().
+        name (str): Table name, e.g. 'd_values'.
+        fmt (str): 'parquet' or 'arrow'. Detected from the files when None.
+        face_ids (list): Only read these face partitions (None or NaN selects
+            the rows without a face_id).
+
+    Returns:
+        pyarrow.Table
+    """
+    pa = _require_pyarrow()
+    fmt = fmt or _detect_format(output_dir, name)
+    if fmt == 'csv':
+        raise ValueError("CSV exports are not memory-mappable; use read_results().")
+
+    partitions = None if face_ids is None else {_partition_name(f) for f in face_ids}
+    tables = []
+    for path in _partition_files(os.path.join(output_dir, name), fmt):
+        if partitions is not None and not partitions & set(path.parts):
+            continue
+        if fmt == 'parquet':
+            import pyarrow.parquet as pq
+            tables.append(pq.read_table(path, memory_map=True))
+        else:
+            tables.append(pa.ipc.open_file(pa.memory_map(str(path), 'r')).read_all())
+
+    if not tables:
+        raise FileNotFoundError(f"No partitions of '{name}' matched face_ids={face_ids}")
+    return pa.concat_tables(tables)
+
+
+def read_results(output_dir, name, fmt=None, face_ids=None):
+    """
+    Reads an exported table back into a pandas DataFrame.
+
+    Args:
+        output_dir (str): Directory passed to export_results().
+        name (str): Table name, e.g. 'd_values'.
+        fmt (str): 'parquet', 'arrow' or 'csv'. Detected from the files when None.
+        face_ids (list): Only read these face partitions.
+
+    Returns:
+        pd.DataFrame
+    """
+    fmt = fmt or _detect_format(output_dir, name)
+    if fmt == 'csv':
+        df = pd.read_csv(os.path.join(output_dir, f"{name}.csv"))
+        if face_ids is not None:
+            df = df[df[PARTITION_COLUMN].isin(face_ids)].reset_index(drop=True)
+        return df
+    return read_table(output_dir, name, fmt, face_ids).to_pandas()
+
+
+def read_metadata(output_dir, name, fmt=None):
+    """
+    Returns the metadata (table name and thresholds) recorded with an exported table.
+    """
+    fmt = fmt or _detect_format(output_dir, name)
+    if fmt == 'csv':
+        raise ValueError("CSV exports carry no schema metadata.")
+    path = _partition_files(os.path.join(output_dir, name), fmt)[0]
+
+    pa = _require_pyarrow()
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        schema = pq.read_schema(path, memory_map=True)
+    else:
+        schema = pa.ipc.open_file(pa.memory_map(str(path), 'r')).schema
+    return json.loads(schema.metadata[METADATA_KEY])
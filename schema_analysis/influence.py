@@ -0,0 +1,79 @@
+import pandas as pd
+import numpy as np
+from scipy import stats
+
+
+def jackknife_subject_D(subject_D_df, alpha=0.05):
+    """
+    Leave-one-subject-out influence of every subject on its face's t-test.
+
+    Each subject's removal is a closed-form downdate of the face's sufficient
+    statistics (n, mean, sum of squared deviations), so the whole table is
+    computed in one vectorized pass instead of rerunning calc_stats() once
+    per subject.
+
+    Args:
+        subject_D_df (pd.DataFrame): Output of calc_subject_D() (user_number, face_id, D).
+        alpha (float): Significance level used to flag subjects whose removal
+            changes the significance of their face.
+
+    Returns:
+        pd.DataFrame: One row per subject and face, ranked within each face by
+        influence (|delta_t|, largest first). Columns: face_id, influence_rank,
+        user_number, D, n_subjects, mean, std, sem, t_stat, p_value (all with the
+        subject removed), full_mean, full_t_stat, full_p_value, delta_mean,
+        delta_t, significance_flip.
+    """
+    columns = ['face_id', 'influence_rank', 'user_number', 'D', 'n_subjects', 'mean', 'std', 'sem',
+               't_stat', 'p_value', 'full_mean', 'full_t_stat', 'full_p_value',
+               'delta_mean', 'delta_t', 'significance_flip']
+    if subject_D_df.empty:
+        return pd.DataFrame(columns=columns)
+
+    df = subject_D_df[['user_number', 'face_id', 'D']].copy()
+    D = df['D'].to_numpy(dtype=float)
+    grouped = df.groupby('face_id')['D']
+
+    # Full-sample sufficient statistics per face, broadcast to each subject
+    n = grouped.transform('count').to_numpy(dtype=float)
+    mean = grouped.transform('mean').to_numpy(dtype=float)
+    m2 = pd.Series((D - mean) ** 2).groupby(df['face_id'].to_numpy()).transform('sum').to_numpy()
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        full_sem = np.sqrt(m2 / (n - 1) / n)
+        full_t = mean / full_sem
+
+        # Downdate: remove this subject from n, mean and M2
+        n_loo = n - 1
+        mean_loo = (n * mean - D) / n_loo
+        m2_loo = np.maximum(m2 - (D - mean) * (D - mean_loo), 0)
+        std_loo = np.sqrt(m2_loo / (n_loo - 1))
+        sem_loo = std_loo / np.sqrt(n_loo)
+        t_loo = mean_loo / sem_loo
+
+    full_p = _two_sided_p(full_t, n - 1)
+    p_loo = _two_sided_p(t_loo, n_loo - 1)
+
+    df['n_subjects'] = n_loo.astype(int)
+    df['mean'] = np.where(n_loo > 0, mean_loo, np.nan)
+    df['std'] = np.where(n_loo > 1, std_loo, np.nan)
+    df['sem'] = np.where(n_loo > 1, sem_loo, np.nan)
+    df['t_stat'] = np.where(n_loo > 1, t_loo, np.nan)
+    df['p_value'] = p_loo
+    df['full_mean'] = mean
+    df['full_t_stat'] = np.where(n > 1, full_t, np.nan)
+    df['full_p_value'] = full_p
+    df['delta_mean'] = df['mean'] - df['full_mean']
+    df['delta_t'] = df['t_stat'] - df['full_t_stat']
+    df['significance_flip'] = (full_p < alpha) != (p_loo < alpha)
+
+    df['_abs_delta_t'] = df['delta_t'].abs()
+    df = df.sort_values(['face_id', '_abs_delta_t'], ascending=[True, False], na_position='last')
+    df['influence_rank'] = df.groupby('face_id').cumcount() + 1
+    return df[columns].reset_index(drop=True)
+
+
+def _two_sided_p(t_stat, dof):
+    with np.errstate(invalid='ignore'):
+        p = 2 * stats.t.sf(np.abs(t_stat), np.maximum(dof, 1))
+    return np.where(dof > 0, p, np.nan)
@@ -0,0 +1,186 @@
+import pandas as pd
+import numpy as np
+from . import processing
+
+# Which side of a pair's d each end angle contributes to
+ANGLE_MEASURES = ['towards_angle', 'away_angle']
+
+
+def rolling_angle_stats(df, window=8):
+    """
+    Rolling and cumulative end angle per subject and face, in trial order.
+
+    Each face and direction (towards/away) is rolled separately, so a drift
+    in either direction (or in their difference, D) shows up without mixing
+    faces with different effects into one window. Invalid trials are left
+    out when validity columns are present.
+
+    Args:
+        df (pd.DataFrame): Processed trials with user_number, face_id,
+            trialIndex, towards_away and end_angle.
+        window (int): Number of trials in the rolling window.
+
+    Returns:
+        pd.DataFrame: One row per trial with user_number, face_id, towards_away,
+        trialIndex, trial_number (1-based position within the subject, face
+        and direction), end_angle, rolling_mean, rolling_std, rolling_n and
+        cumulative_mean.
+    """
+    keys = ['user_number', 'face_id', 'towards_away']
+    _require_columns(df, keys + ['trialIndex', 'end_angle'])
+    trials = df[processing.trial_validity(df)] if len(df) else df
+    trials = trials.sort_values(keys + ['trialIndex'], kind='stable')
+    out = trials[keys + ['trialIndex', 'end_angle']].reset_index(drop=True)
+
+    groups = pd.MultiIndex.from_frame(out[keys])
+    return _add_window_stats(out, groups, 'end_angle', window, 'trial_number')
+
+
+def rolling_D_stats(pair_rows, df, window=4):
+    """
+    Rolling and cumulative d per subject and face (D is defined per subject
+    per face, so windows never mix faces), with pairs ordered by the trial
+    that completed them (the later of the towards and away trial).
+
+    Args:
+        pair_rows (pd.DataFrame): PairIndex.pair_rows() output (pairs with
+            towards_index and away_index row labels into df).
+        df (pd.DataFrame): The trial table the pairs were built from.
+        window (int): Number of pairs in the rolling window.
+
+    Returns:
+        pd.DataFrame: One row per pair with user_number, face_id, tubeTypeIndex,
+        pair_type, trialIndex, pair_number (1-based position within the subject
+        and face), d, rolling_mean, rolling_std, rolling_n and cumulative_D.
+    """
+    keys = ['user_number', 'face_id']
+    pairs = attach_pair_order(pair_rows, df)
+    pairs = pairs.sort_values(keys + ['trialIndex'], kind='stable').reset_index(drop=True)
+    out = pairs[keys + ['tubeTypeIndex', 'pair_type', 'trialIndex', 'd']].copy()
+
+    groups = pd.MultiIndex.from_frame(out[keys])
+    out = _add_window_stats(out, groups, 'd', window, 'pair_number')
+    return out.rename(columns={'cumulative_mean': 'cumulative_D'})
+
+
+def block_stats(pair_rows, df, n_blocks=2):
+    """
+    Early/late (or finer) block comparison of D and the paired end angles.
+
+    Each subject's session is split into `n_blocks` equal ranges of trialIndex,
+    and every pair is assigned to the block of the trial that completed it.
+    Subject-level block means are then summarized per face:
+    - 'D': one-sample t-test of block D against 0 (as in calc_stats()).
+    - 'D_change': D in the last block minus D in the first block, tested
+      against 0 over subjects with pairs in both (a paired early/late test).
+    - 'towards_angle' / 'away_angle': mean end angle of the paired trials
+      (descriptive, no test).
+
+    Args:
+        pair_rows (pd.DataFrame): PairIndex.pair_rows() output.
+        df (pd.DataFrame): The trial table the pairs were built from.
+        n_blocks (int): Number of blocks (2 = early/late).
+
+    Returns:
+        pd.DataFrame: Tidy table with measure, face_id, block, mean, std, sem,
+        n_subjects, t_stat and p_value. 'D_change' rows carry block = n_blocks.
+    """
+    if n_blocks < 2:
+        raise ValueError("n_blocks must be at least 2.")
+
+    pairs = attach_pair_order(pair_rows, df)
+    pairs['block'] = _assign_blocks(pairs, df, n_blocks)
+
+    keys = ['user_number', 'face_id', 'block']
+    subject_blocks = pairs.groupby(keys, sort=True)[['d'] + ANGLE_MEASURES].mean().reset_index()
+    subject_blocks = subject_blocks.rename(columns={'d': 'D'})
+
+    tables = [processing.one_sample_t_summary(subject_blocks, ['face_id', 'block']).assign(measure='D')]
+
+    wide = subject_blocks.pivot_table(index=['user_number', 'face_id'], columns='block', values='D')
+    if 1 in wide.columns and n_blocks in wide.columns:
+        change = (wide[n_blocks] - wide[1]).dropna().rename('D_change').reset_index()
+        if len(change):
+            change['block'] = n_blocks
+            tables.append(processing.one_sample_t_summary(change, ['face_id', 'block'], value='D_change')
+                          .assign(measure='D_change'))
+
+    for measure in ANGLE_MEASURES:
+        angle = processing.one_sample_t_summary(subject_blocks, ['face_id', 'block'], value=measure)
+        tables.append(angle.assign(measure=measure, t_stat=np.nan, p_value=np.nan))
+
+    columns = ['measure', 'face_id', 'block', 'mean', 'std', 'sem', 'n_subjects', 't_stat', 'p_value']
+    # subject_blocks is sorted by face and block, so each table already is
+    return pd.concat(tables, ignore_index=True)[columns]
+
+
+def attach_pair_order(pair_rows, df):
+    """
+    Adds the trial position of every pair: towards_angle, away_angle and
+    trialIndex (the later of the two trials' trialIndex).
+    """
+    _require_columns(df, ['trialIndex', 'end_angle'])
+    pairs = pair_rows.copy()
+    towards = df.loc[pairs['towards_index'], ['trialIndex', 'end_angle']].to_numpy()
+    away = df.loc[pairs['away_index'], ['trialIndex', 'end_angle']].to_numpy()
+    pairs['towards_angle'] = towards[:, 1]
+    pairs['away_angle'] = away[:, 1]
+    pairs['trialIndex'] = np.maximum(towards[:, 0], away[:, 0]).astype(int)
+    return pairs
+
+
+def _assign_blocks(pairs, df, n_blocks):
+    """Block (1..n_blocks) of each pair within its subject's trialIndex range."""
+    session = df.groupby('user_number')['trialIndex'].agg(['min', 'max'])
+    first = pairs['user_number'].map(session['min']).to_numpy()
+    length = pairs['user_number'].map(session['max']).to_numpy() - first + 1
+    block = (pairs['trialIndex'].to_numpy() - first) * n_blocks // length
+    return block.astype(int) + 1
+
+
+def _add_window_stats(out, groups, value, window, position_name):
+    """
+    Adds trailing-window and cumulative statistics of `value` within each group
+    of consecutive rows. Window sums are differences of padded cumulative sums,
+    so every window is O(1) regardless of the number of groups.
+    """
+    if window < 1:
+        raise ValueError("window must be at least 1.")
+
+    codes = pd.factorize(groups)[0] if len(out) else np.zeros(0, dtype=int)
+    n_rows = len(out)
+    row = np.arange(n_rows)
+    new_group = np.r_[True, codes[1:] != codes[:-1]] if n_rows else np.zeros(0, dtype=bool)
+    group_start = np.maximum.accumulate(np.where(new_group, row, 0)) if n_rows else row
+
+    x = out[value].to_numpy(dtype=float)
+    ok = ~np.isnan(x)
+    x = np.where(ok, x, 0.0)
+    c_n = np.r_[0, np.cumsum(ok)]
+    c_x = np.r_[0.0, np.cumsum(x)]
+    c_xx = np.r_[0.0, np.cumsum(x * x)]
+
+    lo = np.maximum(row - window + 1, group_start)
+    n = c_n[row + 1] - c_n[lo]
+    s = c_x[row + 1] - c_x[lo]
+    ss = c_xx[row + 1] - c_xx[lo]
+    n_all = c_n[row + 1] - c_n[group_start]
+    s_all = c_x[row + 1] - c_x[group_start]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = s / n
+        var = np.maximum(ss - s * mean, 0) / (n - 1)
+        cumulative = s_all / n_all
+
+    out.insert(out.columns.get_loc(value), position_name, row - group_start + 1)
+    out['rolling_mean'] = np.where(n > 0, mean, np.nan)
+    out['rolling_std'] = np.where(n > 1, np.sqrt(var), np.nan)
+    out['rolling_n'] = n
+    out['cumulative_mean'] = np.where(n_all > 0, cumulative, np.nan)
+    return out
+
+
+def _require_columns(df, columns):
+    missing = [c for c in columns if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing column(s) {missing}.")
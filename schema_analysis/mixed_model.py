@@ -0,0 +1,178 @@
+import pandas as pd
+import numpy as np
+from scipy import sparse, stats
+from scipy.optimize import minimize_scalar
+
+# Fixed effects besides face; each is sum-to-zero (deviation) coded
+MIXED_FACTORS = ['tubeTypeIndex', 'pair_type']
+
+# Search range for log(subject variance / residual variance)
+LOG_RATIO_BOUNDS = (-20.0, 10.0)
+
+
+def mixed_design(pairs_df, factors=MIXED_FACTORS):
+    """
+    Sparse fixed-effects design of the pair-level model.
+
+    Faces are cell-mean coded (one indicator per face, no intercept), the
+    other factors sum-to-zero coded (one column per level but the last, which
+    gets -1 in all of them). A face's coefficient is then its mean d averaged
+    over the levels of the other factors, and is tested against 0 like the
+    per-face t-test; a factor level's coefficient is its deviation from that
+    average.
+
+    Returns:
+        tuple: (X, terms) with X a (n_pairs, n_terms) CSR matrix.
+    """
+    n = len(pairs_df)
+    rows, cols, data, terms = [], [], [], []
+
+    faces = pd.Categorical(pairs_df['face_id'])
+    rows.append(np.arange(n))
+    cols.append(faces.codes)
+    data.append(np.ones(n))
+    terms += [f"face_id[{face}]" for face in faces.categories]
+
+    for factor in factors:
+        levels = pd.Categorical(pairs_df[factor])
+        k = len(levels.categories)
+        codes = levels.codes
+        offset = len(terms)
+        kept = np.flatnonzero(codes < k - 1)
+        last = np.flatnonzero(codes == k - 1)
+        rows += [kept, np.repeat(last, k - 1)]
+        cols += [offset + codes[kept], offset + np.tile(np.arange(k - 1), len(last))]
+        data += [np.ones(len(kept)), -np.ones(len(last) * (k - 1))]
+        terms += [f"{factor}[{level}]" for level in levels.categories[:-1]]
+
+    X = sparse.csr_matrix((np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+                          shape=(n, len(terms)))
+    return X, terms
+
+
+def fit_mixed_model(pairs_df, factors=MIXED_FACTORS, group='user_number', value='d'):
+    """
+    Linear mixed model of pair-level d with a random intercept per subject:
+
+        d = X beta + Z u + e,   u ~ N(0, s2_subject I),   e ~ N(0, s2 I)
+
+    fitted by REML. X (see mixed_design) and the subject indicator matrix Z
+    are sparse, and all data enter through the cross products X'X, X'y, y'y,
+    Z'X, Z'y and the pairs per subject, computed once. With
+    gamma = s2_subject / s2, the Woodbury identity gives
+    (I + gamma Z Z')^-1 = I - Z diag(gamma / (1 + gamma n_j)) Z', so every
+    evaluation of the REML criterion (profiled over beta and s2) costs
+    O(n_subjects * n_terms^2) regardless of the number of pairs, and gamma
+    is found by a bounded scalar search over log(gamma).
+
+    Args:
+        pairs_df (pd.DataFrame): Pair-level d (output of balance_trials()).
+        factors (list): Fixed-effect factors besides face_id.
+        group (str): Column identifying subjects.
+        value (str): Response column.
+
+    Returns:
+        MixedModelFit
+    """
+    data = pairs_df.dropna(subset=[value])
+    if data.empty:
+        raise ValueError("No pairs to fit.")
+    factors = [f for f in factors if data[f].nunique() > 1]
+
+    X, terms = mixed_design(data, factors)
+    y = data[value].to_numpy(dtype=float)
+    subjects = pd.Categorical(data[group])
+    Z = sparse.csr_matrix((np.ones(len(y)), (np.arange(len(y)), subjects.codes)),
+                          shape=(len(y), len(subjects.categories)))
+    n, p = X.shape
+
+    XtX = (X.T @ X).toarray()
+    Xty = X.T @ y
+    yty = y @ y
+    ZtX = (Z.T @ X).toarray()
+    Zty = Z.T @ y
+    n_j = np.asarray(Z.sum(axis=0)).ravel()
+
+    if np.linalg.matrix_rank(XtX) < p:
+        raise ValueError("Fixed effects are not estimable (rank-deficient design).")
+    if n <= p:
+        raise ValueError("Not enough pairs for the fixed effects.")
+
+    def solve(log_ratio):
+        gamma = np.exp(log_ratio)
+        w = gamma / (1 + gamma * n_j)
+        A = XtX - ZtX.T @ (w[:, None] * ZtX)
+        b = Xty - ZtX.T @ (w * Zty)
+        beta = np.linalg.solve(A, b)
+        q = yty - w @ Zty ** 2 - b @ beta
+        return gamma, w, A, beta, q
+
+    def reml_criterion(log_ratio):
+        gamma, _, A, _, q = solve(log_ratio)
+        return ((n - p) * np.log(q) + np.sum(np.log1p(gamma * n_j)) + np.linalg.slogdet(A)[1])
+
+    search = minimize_scalar(reml_criterion, bounds=LOG_RATIO_BOUNDS, method='bounded',
+                             options={'xatol': 1e-10})
+    gamma, w, A, beta, q = solve(search.x)
+    residual_var = q / (n - p)
+
+    cov = residual_var * np.linalg.inv(A)
+    se = np.sqrt(np.diag(cov))
+    z_stat = beta / se
+    z_crit = stats.norm.ppf(0.975)
+    fixed_effects = pd.DataFrame({
+        'term': terms,
+        'coef': beta,
+        'se': se,
+        'z_stat': z_stat,
+        'p_value': 2 * stats.norm.sf(np.abs(z_stat)),
+        'ci_low': beta - z_crit * se,
+        'ci_high': beta + z_crit * se,
+    })
+    random_effects = pd.Series(w * (Zty - ZtX @ beta), index=subjects.categories, name='subject_effect')
+    reml_llf = -0.5 * (reml_criterion(search.x) + (n - p) * (1 + np.log(2 * np.pi / (n - p))))
+
+    return MixedModelFit(fixed_effects, cov, gamma * residual_var, residual_var, random_effects,
+                         n, len(n_j), reml_llf, bool(search.success))
+
+
+class MixedModelFit:
+    """
+    Result of fit_mixed_model().
+
+    Attributes:
+        fixed_effects (pd.DataFrame): term, coef, se, z_stat, p_value, ci_low, ci_high
+            (Wald z-tests, as in statsmodels MixedLM).
+        cov (np.ndarray): Covariance of the fixed effects.
+        subject_var (float): Random-intercept variance.
+        residual_var (float): Pair-level residual variance.
+        random_effects (pd.Series): Predicted (BLUP) intercept per subject.
+        n_pairs (int), n_subjects (int), reml_llf (float), converged (bool)
+    """
+
+    def __init__(self, fixed_effects, cov, subject_var, residual_var, random_effects,
+                 n_pairs, n_subjects, reml_llf, converged):
+        self.fixed_effects = fixed_effects
+        self.cov = cov
+        self.subject_var = subject_var
+        self.residual_var = residual_var
+        self.random_effects = random_effects
+        self.n_pairs = n_pairs
+        self.n_subjects = n_subjects
+        self.reml_llf = reml_llf
+        self.converged = converged
+
+    @property
+    def icc(self):
+        """Share of the variance of d that lies between subjects."""
+        return self.subject_var / (self.subject_var + self.residual_var)
+
+    def face_effects(self):
+        """Fixed effects of the faces only, with face_id instead of term."""
+        faces = self.fixed_effects[self.fixed_effects['term'].str.startswith('face_id[')].copy()
+        faces.insert(0, 'face_id', faces.pop('term').str.slice(len('face_id['), -1))
+        return faces.reset_index(drop=True)
+
+    def __repr__(self):
+        return (f"<MixedModelFit: {self.n_pairs} pairs, {self.n_subjects} subjects, "
+                f"subject var {self.subject_var:.3f}, residual var {self.residual_var:.3f}>")
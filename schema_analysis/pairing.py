@@ -0,0 +1,227 @@
+import hashlib
+import pandas as pd
+import numpy as np
+
+# A pairing cell: one subject, one face, one tube, one face side
+CELL_KEYS = ['user_number', 'face_id', 'tubeTypeIndex', 'faceSide']
+
+PAIR_TYPES = {'left': 'FaceLeft', 'right': 'FaceRight'}
+
+# Reasons a cell did or did not produce a pair, in order of precedence
+REASON_PAIRED = 'paired'
+REASON_MISSING_TOWARDS = 'missing_towards'
+REASON_MISSING_AWAY = 'missing_away'
+REASON_DUPLICATE_TOWARDS = 'duplicate_towards'
+REASON_DUPLICATE_AWAY = 'duplicate_away'
+REASON_INVALID_BOTH = 'invalid_both'
+REASON_INVALID_TOWARDS = 'invalid_towards'
+REASON_INVALID_AWAY = 'invalid_away'
+
+PAIR_COLUMNS = ['user_number', 'face_id', 'tubeTypeIndex', 'pair_type', 'd']
+
+# Boolean columns that must all be True for a trial to be usable in a pair.
+# Only the columns present in the trial table are used.
+TRIAL_VALIDITY_COLUMNS = ['angle_valid', 'latency_valid']
+
+
+class PairIndex:
+    """
+    Towards/away candidates for every pairing cell, built in one vectorized pass.
+
+    A cell (user, face, tube, faceSide) pairs when it holds exactly one towards
+    trial (tip_direction == faceSide) and exactly one away trial, and both are
+    valid. The index keeps the row labels of each side, their validity and the
+    reason every cell did or did not pair, so pairing, unmatched-trial listing
+    and verification sampling can all be read from it.
+
+    Attributes:
+        cells (pd.DataFrame): One row per cell, in the order balance_trials reports pairs.
+            Columns: CELL_KEYS, pair_type, towards_count, away_count, towards_index,
+            away_index, towards_valid, away_valid, towards_angle, away_angle, reason.
+        index (pd.Index): Index of the trial table the index was built from.
+    """
+
+    def __init__(self, cells, index, angle_dtype=float):
+        self.cells = cells
+        self.index = index
+        self.angle_dtype = angle_dtype
+
+    @staticmethod
+    def source_key(df, valid_cols=None):
+        """
+        Fingerprint of everything from_trials() reads (cell keys, tip direction,
+        end angle, validity columns and the row labels). An index built from a
+        table is still current while the table's key is unchanged.
+        """
+        if valid_cols is None:
+            valid_cols = [c for c in TRIAL_VALIDITY_COLUMNS if c in df.columns]
+        columns = CELL_KEYS + ['tip_direction', 'end_angle'] + list(valid_cols)
+        row_hash = pd.util.hash_pandas_object(df[columns], index=True).to_numpy()
+        return tuple(valid_cols), len(df), hashlib.sha1(row_hash.tobytes()).hexdigest()
+
+    @classmethod
+    def from_trials(cls, df, valid_cols=None):
+        """
+        Builds the index from a trial table.
+
+        Args:
+            df (pd.DataFrame): Trials with end_angle and the validity column(s).
+            valid_cols (list): Boolean columns that must all be True for a trial
+                to be usable. Defaults to the TRIAL_VALIDITY_COLUMNS present.
+
+        Returns:
+            PairIndex
+        """
+        sides = df['faceSide'].where(df['faceSide'].isin(list(PAIR_TYPES)))
+        tips = df['tip_direction'].where(df['tip_direction'].isin(list(PAIR_TYPES)))
+        usable = sides.notna() & tips.notna()
+
+        rows = df.loc[usable, CELL_KEYS[:-1]].copy()
+        rows['faceSide'] = sides[usable]
+        rows['is_towards'] = (sides[usable] == tips[usable]).to_numpy()
+        rows['position'] = np.flatnonzero(usable.to_numpy())
+        if valid_cols is None:
+            valid_cols = [c for c in TRIAL_VALIDITY_COLUMNS if c in df.columns]
+        valid = np.ones(len(df), dtype=bool)
+        for col in valid_cols:
+            valid &= df[col].fillna(False).astype(bool).to_numpy()
+        rows['valid'] = valid[usable.to_numpy()]
+        rows['angle'] = df.loc[usable, 'end_angle'].to_numpy()
+
+        # Reproduce the reference traversal order: users, then faces within a
+        # user, then tubes within a face, each in order of first appearance
+        # in the full table (rows with other side labels still count)
+        all_pos = pd.Series(np.arange(len(df)), index=df.index)
+        order_keys = []
+        for depth in range(1, 4):
+            keys = CELL_KEYS[:depth]
+            first = all_pos.groupby([df[k] for k in keys]).transform('min')
+            rows[f'_order{depth}'] = first[usable].to_numpy()
+            order_keys.append(f'_order{depth}')
+
+        cell_order = rows.groupby(CELL_KEYS, sort=False)[order_keys].first()
+        side_stats = (rows.groupby(CELL_KEYS + ['is_towards'], sort=False)
+                      .agg(count=('position', 'size'),
+                           position=('position', 'first'),
+                           valid=('valid', 'first'),
+                           angle=('angle', 'first'))
+                      .reset_index())
+
+        towards = side_stats[side_stats['is_towards']].drop(columns='is_towards')
+        away = side_stats[~side_stats['is_towards']].drop(columns='is_towards')
+        cells = towards.merge(away, on=CELL_KEYS, how='outer', suffixes=('_towards', '_away'))
+        cells = cells.join(cell_order, on=CELL_KEYS)
+
+        cells = cells.rename(columns={
+            'count_towards': 'towards_count', 'count_away': 'away_count',
+            'position_towards': 'towards_position', 'position_away': 'away_position',
+            'valid_towards': 'towards_valid', 'valid_away': 'away_valid',
+            'angle_towards': 'towards_angle', 'angle_away': 'away_angle',
+        })
+        cells['towards_count'] = cells['towards_count'].fillna(0).astype(int)
+        cells['away_count'] = cells['away_count'].fillna(0).astype(int)
+        cells['towards_valid'] = cells['towards_valid'].astype('boolean').fillna(False).astype(bool)
+        cells['away_valid'] = cells['away_valid'].astype('boolean').fillna(False).astype(bool)
+        cells['pair_type'] = cells['faceSide'].map(PAIR_TYPES)
+
+        cells['_side_order'] = (cells['faceSide'] == 'right').astype(int)
+        cells = cells.sort_values(order_keys + ['_side_order'], kind='stable')
+        cells = cells.drop(columns=order_keys + ['_side_order']).reset_index(drop=True)
+
+        cells['towards_index'] = _labels_at(df.index, cells['towards_position'])
+        cells['away_index'] = _labels_at(df.index, cells['away_position'])
+        cells = cells.drop(columns=['towards_position', 'away_position'])
+        cells['reason'] = _cell_reasons(cells)
+
+        columns = CELL_KEYS + ['pair_type', 'towards_count', 'away_count',
+                               'towards_index', 'away_index', 'towards_valid', 'away_valid',
+                               'towards_angle', 'away_angle', 'reason']
+        return cls(cells[columns], df.index, angle_dtype=df['end_angle'].dtype)
+
+    @property
+    def paired(self):
+        """Boolean mask over cells that produced a pair."""
+        return (self.cells['reason'] == REASON_PAIRED).to_numpy()
+
+    def pair_rows(self):
+        """
+        Returns the pairs with the row labels of both trials.
+        Columns: user_number, face_id, tubeTypeIndex, pair_type, d, towards_index, away_index
+        """
+        cells = self.cells[self.paired]
+        pairs = cells[['user_number', 'face_id', 'tubeTypeIndex', 'pair_type']].copy()
+        # Both sides exist in paired cells, so restore the end_angle dtype
+        # that the outer merge widened to float
+        d = cells['towards_angle'].to_numpy() - cells['away_angle'].to_numpy()
+        pairs['d'] = d.astype(self.angle_dtype)
+        pairs['towards_index'] = cells['towards_index']
+        pairs['away_index'] = cells['away_index']
+        return pairs.reset_index(drop=True)
+
+    def pairs(self):
+        """
+        Returns the DataFrame of d values, identical to balance_trials() output.
+        """
+        if not self.paired.any():
+            return pd.DataFrame(columns=PAIR_COLUMNS)
+        return self.pair_rows()[PAIR_COLUMNS]
+
+    @property
+    def used_indices(self):
+        """Set of trial row labels that are part of a pair."""
+        cells = self.cells[self.paired]
+        return set(cells['towards_index']).union(cells['away_index'])
+
+    def unmatched_mask(self):
+        """Boolean mask over the trial table: True for trials not part of a pair."""
+        return ~self.index.isin(list(self.used_indices))
+
+    def reason_counts(self):
+        """Returns the number of cells per pairing outcome."""
+        return self.cells['reason'].value_counts()
+
+    def sample(self, n, seed=None):
+        """
+        Draws a seeded random sample of pairs (without replacement).
+
+        Args:
+            n (int): Number of pairs. Capped at the number available.
+            seed (int): Seed for reproducible selection.
+
+        Returns:
+            pd.DataFrame: Rows of pair_rows() in sampled order.
+        """
+        pairs = self.pair_rows()
+        rng = np.random.default_rng(seed)
+        chosen = rng.choice(len(pairs), size=min(n, len(pairs)), replace=False)
+        return pairs.iloc[chosen].reset_index(drop=True)
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __repr__(self):
+        return f"<PairIndex: {len(self.cells)} cells, {int(self.paired.sum())} pairs>"
+
+
+def _labels_at(index, positions):
+    """Maps float positions (NaN for missing) to row labels (None for missing)."""
+    labels = np.full(len(positions), None, dtype=object)
+    present = positions.notna().to_numpy()
+    labels[present] = index[positions[present].astype(int).to_numpy()]
+    return labels
+
+
+def _cell_reasons(cells):
+    conditions = [
+        cells['towards_count'] == 0,
+        cells['away_count'] == 0,
+        cells['towards_count'] > 1,
+        cells['away_count'] > 1,
+        ~cells['towards_valid'] & ~cells['away_valid'],
+        ~cells['towards_valid'],
+        ~cells['away_valid'],
+    ]
+    choices = [REASON_MISSING_TOWARDS, REASON_MISSING_AWAY, REASON_DUPLICATE_TOWARDS,
+               REASON_DUPLICATE_AWAY, REASON_INVALID_BOTH, REASON_INVALID_TOWARDS,
+               REASON_INVALID_AWAY]
+    return np.select(conditions, choices, default=REASON_PAIRED)
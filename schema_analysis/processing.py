@@ -1,5 +1,23 @@
 import pandas as pd
 import numpy as np
+from scipy import stats
+from .pairing import PairIndex, TRIAL_VALIDITY_COLUMNS
+
+# Bits of the 'exclusion_flags' column: why a trial did not reach the analysis
+EXCLUSION_REASONS = {
+    'session_group': 1,   # missing session_group
+    'angle': 2,           # outside the angle range (validate_angles)
+    'latency': 4,         # latency outlier (flag_latency_outliers)
+    'subject': 8,         # subject excluded (identify_bad_subjects)
+    'unpaired': 16,       # usable trial without a partner (balance_trials)
+}
+EXCLUSION_COLUMN = 'exclusion_flags'
+
+# Face IDs recorded under an older name
+FACE_ID_RENAMES = {
+    'ID001': 'ID017',
+    'ID022': 'ID015',
+}
 
 def rename_face_ids(df):
     """
@@ -7,12 +25,9 @@ def rename_face_ids(df):
     ID001 -> ID017
     ID022 -> ID015
     """
-    print(f"Original face IDs: {sorted(df['face_id'].unique())}")
-    df['face_id'] = df['face_id'].replace({
-        'ID001': 'ID017',
-        'ID022': 'ID015'
-    })
-    print(f"Updated face IDs: {sorted(df['face_id'].unique())}")
+    print(f"Original face IDs: {sorted(df['face_id'].dropna().unique())}")
+    df['face_id'] = df['face_id'].replace(FACE_ID_RENAMES)
+    print(f"Updated face IDs: {sorted(df['face_id'].dropna().unique())}")
     return df
 
 def transform_angles(df):
@@ -21,14 +36,9 @@ def transform_angles(df):
     Left: raw_angle * -1
     Right: raw_angle * 1
     """
-    def calculate_end_angle(row):
-        if row['tip_direction'] == 'left':
-            return row['raw_angle'] * -1
-        elif row['tip_direction'] == 'right':
-            return row['raw_angle'] * 1
-        return row['raw_angle']
-    
-    df['end_angle'] = df.apply(calculate_end_angle, axis=1)
+    # Any other tip_direction keeps raw_angle unchanged
+    sign = np.where(df['tip_direction'] == 'left', -1, 1)
+    df['end_angle'] = df['raw_angle'] * sign
     return df
 
 def validate_angles(df, min_angle=3, max_angle=43):
@@ -38,28 +48,149 @@ def validate_angles(df, min_angle=3, max_angle=43):
     df['angle_valid'] = (df['end_angle'] > min_angle) & (df['end_angle'] < max_angle)
     return df
 
-def identify_bad_subjects(df, max_invalid_trials=2):
+def flag_latency_outliers(df, method='mad', threshold=3.5, upper_pct=99):
+    """
+    Marks slow latency outliers (e.g. inattentive trials lasting minutes) using
+    grouped vectorized transforms. Only slow trials are flagged: a fast trial is
+    not a sign of inattention.
+    Adds column: 'latency_valid' (bool). Trials with missing or non-positive
+    latency stay valid.
+
+    Args:
+        df (pd.DataFrame): Trials with 'latency' and 'user_number'.
+        method (str): 'mad' flags trials whose robust z-score of log latency,
+            (log latency - median) / (1.4826 * MAD) per subject, exceeds
+            `threshold`. 'percentile' flags trials slower than the `upper_pct`
+            percentile of all trials (one cutoff, so a subject without slow
+            trials loses none).
+        threshold (float): Robust z-score cut-off for 'mad'.
+        upper_pct (float): Percentile of all latencies used as the cutoff for 'percentile'.
+    """
+    latency = df['latency'].astype(float)
+
+    if method == 'mad':
+        # Latencies are right-skewed; on the log scale the MAD is a sensible spread
+        log_latency = np.log(latency.where(latency > 0))
+        deviation = log_latency - log_latency.groupby(df['user_number']).transform('median')
+        scale = deviation.abs().groupby(df['user_number']).transform('median') * 1.4826
+        # Subjects with MAD 0 (mostly identical latencies) have no usable scale
+        robust_z = deviation / scale.where(scale > 0)
+        outlier = robust_z > threshold
+    elif method == 'percentile':
+        outlier = latency > latency.quantile(upper_pct / 100)
+    else:
+        raise ValueError(f"Unknown latency outlier method '{method}'. Use 'mad' or 'percentile'.")
+
+    df['latency_valid'] = ~outlier.fillna(False).astype(bool)
+    return df
+
+def trial_validity(df):
+    """
+    Combined trial validity: True where every validity column present
+    (angle_valid, and latency_valid once latency outliers are flagged) is True.
+    """
+    valid = pd.Series(True, index=df.index)
+    for col in TRIAL_VALIDITY_COLUMNS:
+        if col in df.columns:
+            valid &= df[col].fillna(False).astype(bool)
+    return valid
+
+def set_exclusion_flag(df, reason, mask):
+    """
+    Records one exclusion reason in the 'exclusion_flags' bitmask column.
+    The reason's bit is set where `mask` is True and cleared elsewhere, so a
+    stage can be re-run with new thresholds. Other bits are left unchanged.
+
+    Args:
+        df (pd.DataFrame): Trials (modified in place and returned).
+        reason (str): Key of EXCLUSION_REASONS.
+        mask (array-like): Boolean, True where the trial is excluded for this reason.
+
+    Returns:
+        pd.DataFrame
+    """
+    bit = np.uint8(EXCLUSION_REASONS[reason])
+    if EXCLUSION_COLUMN in df.columns:
+        flags = df[EXCLUSION_COLUMN].to_numpy(dtype=np.uint8)
+    else:
+        flags = np.zeros(len(df), dtype=np.uint8)
+    df[EXCLUSION_COLUMN] = np.where(np.asarray(mask, dtype=bool), flags | bit, flags & ~bit)
+    return df
+
+def decode_exclusion_flags(flags):
+    """
+    Expands an exclusion bitmask into one boolean column per reason.
+    Returns a DataFrame with the EXCLUSION_REASONS keys as columns.
+    """
+    index = flags.index if isinstance(flags, pd.Series) else None
+    flags = np.asarray(flags, dtype=np.uint8)
+    return pd.DataFrame({reason: (flags & bit) > 0 for reason, bit in EXCLUSION_REASONS.items()},
+                        index=index)
+
+def exclusion_summary(df, by=None):
     """
-    Identifies subjects who have more than `max_invalid_trials` invalid trials.
+    Counts excluded trials per reason.
+    A trial excluded for several reasons is counted under each of them.
+
+    Args:
+        df (pd.DataFrame): Trials with an 'exclusion_flags' column.
+        by (str or list): Grouping, e.g. 'user_number', 'face_id' or
+            ['user_number', 'face_id']. None gives one overall row.
+
+    Returns:
+        pd.DataFrame: One row per group with n_trials, n_included (no reason set)
+        and one count column per reason.
+    """
+    if EXCLUSION_COLUMN not in df.columns:
+        raise ValueError(f"Missing column '{EXCLUSION_COLUMN}'. Run the marking steps first.")
+
+    counts = decode_exclusion_flags(df[EXCLUSION_COLUMN]).astype(int)
+    counts.insert(0, 'n_included', (df[EXCLUSION_COLUMN] == 0).astype(int))
+    counts.insert(0, 'n_trials', 1)
+
+    if by is None:
+        return counts.sum().to_frame().T
+    by = [by] if isinstance(by, str) else list(by)
+    return counts.groupby([df[col] for col in by], dropna=False).sum().reset_index()
+
+def identify_bad_subjects(df, max_invalid_trials=2, max_latency_outliers=None):
+    """
+    Identifies subjects who have more than `max_invalid_trials` trials breaking
+    the angle rule or, when given, more than `max_latency_outliers` latency
+    outliers (flag_latency_outliers). The two budgets are separate; by default
+    latency outliers only drop their own trials and never exclude a subject.
     Returns a list of subject IDs to exclude.
     """
-    angle_invalid_per_subject = df[~df['angle_valid']].groupby('user_number').size()
-    subjects_to_exclude = angle_invalid_per_subject[angle_invalid_per_subject > max_invalid_trials].index.tolist()
+    invalid = ~df['angle_valid'].fillna(False).astype(bool)
+    bad = invalid.groupby(df['user_number']).sum() > max_invalid_trials
+    if max_latency_outliers is not None and 'latency_valid' in df.columns:
+        outliers = ~df['latency_valid'].fillna(False).astype(bool)
+        bad |= outliers.groupby(df['user_number']).sum() > max_latency_outliers
+    subjects_to_exclude = bad.index[bad].tolist()
     return subjects_to_exclude
 
-def exclude_subjects(df, max_invalid_trials=2):
+def exclude_subjects(df, max_invalid_trials=2, max_latency_outliers=None):
     """
-    Excludes subjects who have more than `max_invalid_trials` invalid trials.
+    Excludes subjects with too many invalid trials (see identify_bad_subjects).
     Returns the filtered DataFrame and the list of excluded subjects.
     """
-    subjects_to_exclude = identify_bad_subjects(df, max_invalid_trials)
+    subjects_to_exclude = identify_bad_subjects(df, max_invalid_trials, max_latency_outliers)
     df_filtered = df[~df['user_number'].isin(subjects_to_exclude)].copy()
     return df_filtered, subjects_to_exclude
 
 def balance_trials(df):
     """
     Identifies valid pairs of trials (FaceLeft and FaceRight) for each user and face.
-    Returns a DataFrame of valid D values.
+    Returns a DataFrame of valid D values and the set of row labels used in pairs.
+    Reads the pairs from a PairIndex built in one vectorized pass.
+    """
+    pair_index = PairIndex.from_trials(df)
+    return pair_index.pairs(), pair_index.used_indices
+
+def balance_trials_reference(df):
+    """
+    Row-by-row implementation of balance_trials().
+    Kept as the reference the vectorized PairIndex is checked against.
     """
     valid_d_values = []
     used_indices = set()
@@ -110,3 +241,88 @@ def balance_trials(df):
     else:
         results_df = pd.DataFrame(valid_d_values)
     return results_df, used_indices
+
+def calc_subject_D(pairs_df):
+    """
+    Calculates 'Big D' (average of 'd' values) per subject per face.
+    Returns a DataFrame with columns: user_number, face_id, D
+    """
+    if pairs_df.empty:
+        return pd.DataFrame(columns=['user_number', 'face_id', 'D'])
+        
+    # Group by user and face, calculate mean of 'd'
+    subject_D = pairs_df.groupby(['user_number', 'face_id'])['d'].mean().reset_index()
+    subject_D.rename(columns={'d': 'D'}, inplace=True)
+    return subject_D
+
+def calc_face_stats(subject_D_df):
+    """
+    Calculates statistics for D values grouped by FaceID.
+    Performs a one-sample t-test against 0 for each face,
+    using the subject-level average D values.
+    Returns a DataFrame with stats.
+    """
+    if subject_D_df.empty:
+        return pd.DataFrame()
+        
+    stats_results = []
+    for face_id in subject_D_df['face_id'].unique():
+        face_data = subject_D_df[subject_D_df['face_id'] == face_id]['D']
+        if len(face_data) > 1:
+            t_stat, p_val = stats.ttest_1samp(face_data, 0)
+            stats_results.append({
+                'face_id': face_id,
+                'mean': face_data.mean(),
+                'std': face_data.std(),
+                'sem': face_data.sem(),
+                'n_subjects': len(face_data),
+                't_stat': t_stat,
+                'p_value': p_val
+            })
+        else:
+             stats_results.append({
+                'face_id': face_id,
+                'mean': face_data.mean() if len(face_data) > 0 else np.nan,
+                'std': np.nan,
+                'sem': np.nan,
+                'n_subjects': len(face_data),
+                't_stat': np.nan,
+                'p_value': np.nan
+            })
+            
+    return pd.DataFrame(stats_results)
+
+def one_sample_t_summary(subject_D_df, by, value='D'):
+    """
+    Vectorized one-sample t-test against 0 of `value` for every group in `by`.
+    Produces the same columns as TubeTrials.calc_stats() in a single grouped
+    aggregation instead of one scipy call per group.
+
+    Args:
+        subject_D_df (pd.DataFrame): Subject-level values (one row per subject per group).
+        by (list): Grouping columns, e.g. ['face_id'].
+        value (str): Column holding the subject-level values.
+
+    Returns:
+        pd.DataFrame: One row per group with mean, std, sem, n_subjects, t_stat, p_value.
+    """
+    summary = (subject_D_df.groupby(by, sort=False, dropna=False)[value]
+               .agg(mean='mean', std='std', n_subjects='count')
+               .reset_index())
+    n = summary['n_subjects'].to_numpy(dtype=float)
+    std = summary['std'].to_numpy(dtype=float)
+    mean = summary['mean'].to_numpy(dtype=float)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sem = std / np.sqrt(n)
+        t_stat = mean / sem
+    dof = n - 1
+    p_value = np.where(dof > 0, 2 * stats.t.sf(np.abs(t_stat), np.maximum(dof, 1)), np.nan)
+
+    # Single-subject groups have no spread, matching calc_stats()
+    has_spread = n > 1
+    summary['std'] = np.where(has_spread, std, np.nan)
+    summary['sem'] = np.where(has_spread, sem, np.nan)
+    summary['t_stat'] = np.where(has_spread, t_stat, np.nan)
+    summary['p_value'] = np.where(has_spread, p_value, np.nan)
+    return summary[list(by) + ['mean', 'std', 'sem', 'n_subjects', 't_stat', 'p_value']]
@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+import numpy as np
+from . import processing
+from . import visualization
+
+MANIFEST_NAME = 'qc_manifest.json'
+
+# Bump when the page layout changes so every page is redrawn
+REPORT_VERSION = 1
+
+
+def prepare_qc_data(trials):
+    """
+    Computes everything the QC pages need in one pass over all subjects.
+
+    Args:
+        trials (TubeTrials): Trials after process_angles() and mark_valid_angles()
+            (mark_valid_latencies() and mark_valid_subjects() are optional).
+
+    Returns:
+        tuple: (trial_df, cells_df, subject_D, group)
+            trial_df: trials with 'trial_valid' and 'paired' columns ('paired'
+                as in select(valid_only=True).calc_d_values()).
+            cells_df: PairIndex cells with the reason each cell did or did not pair.
+            subject_D: per-subject per-face D of the select(valid_only=True) pairs.
+            group: group reference values (median end angle per face, tube and
+                direction, mean reason counts per subject, median latency).
+    """
+    # Pairs come from the clean selection, so invalid duplicates in a cell
+    # cannot block them; the full-table cells keep every unpaired reason
+    clean_index = trials.select(valid_only=True).pair_index
+    trial_df = trials.df.copy()
+    trial_df['trial_valid'] = processing.trial_validity(trial_df)
+    trial_df['paired'] = trial_df.index.isin(list(clean_index.used_indices))
+
+    cells_df = trials.pair_index.cells
+    subject_D = processing.calc_subject_D(clean_index.pairs())
+
+    valid = trial_df[trial_df['trial_valid']]
+    n_subjects = max(trial_df['user_number'].nunique(), 1)
+    group = {
+        'angle_median': valid.groupby(['face_id', 'tubeTypeIndex', 'towards_away'])['end_angle'].median(),
+        'reasons_per_subject': cells_df['reason'].value_counts() / n_subjects,
+        'latency_median': trial_df['latency'].median() if 'latency' in trial_df.columns else np.nan,
+    }
+    return trial_df, cells_df, subject_D, group
+
+
+def subject_fingerprints(trial_df, settings=None):
+    """
+    Hashes every subject's trials (all columns, row order included) together
+    with the report settings. A page is up to date when its fingerprint is
+    unchanged.
+
+    Returns:
+        dict: user_number -> hex digest.
+    """
+    columns = sorted(trial_df.columns)
+    row_hash = pd.util.hash_pandas_object(trial_df[columns], index=False).to_numpy()
+    salt = json.dumps({'version': REPORT_VERSION, 'columns': columns, **(settings or {})},
+                      sort_keys=True, default=str).encode()
+
+    fingerprints = {}
+    for user, positions in trial_df.groupby('user_number').indices.items():
+        digest = hashlib.sha1(salt)
+        digest.update(row_hash[positions].tobytes())
+        fingerprints[user] = digest.hexdigest()
+    return fingerprints
+
+
+def generate_qc_reports(trials, output_dir, min_angle=3, max_angle=43, n_jobs=1, force=False):
+    """
+    Renders one QC page (PNG) per subject: end angles per condition, invalid and
+    unmatched trials in trial order, cell pairing outcomes and latency.
+
+    Group reference data is computed once and shared by all pages. Pages are
+    rendered headless in a process pool (n_jobs > 1). A manifest in output_dir
+    records each subject's data fingerprint, so later runs only redraw subjects
+    whose data changed, are new, or whose page is missing. The group references
+    are left out of the fingerprints, so unchanged pages keep the references of
+    the run that drew them; pass force=True to redraw every page against the
+    current group.
+
+    Args:
+        trials (TubeTrials): Trials after process_angles() and mark_valid_angles().
+        output_dir (str): Directory for the pages and the manifest.
+        min_angle (float): Lower angle bound drawn on the pages.
+        max_angle (float): Upper angle bound drawn on the pages.
+        n_jobs (int): Worker processes (-1 for all cores).
+        force (bool): Redraw every page.
+
+    Returns:
+        pd.DataFrame: One row per subject with user_number, page and
+        status ('generated' or 'unchanged').
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if n_jobs == -1:
+        n_jobs = os.cpu_count() or 1
+
+    trial_df, cells_df, subject_D, group = prepare_qc_data(trials)
+    settings = {'min_angle': min_angle, 'max_angle': max_angle}
+    fingerprints = subject_fingerprints(trial_df, settings)
+
+    manifest = _read_manifest(output_dir)
+    previous = manifest.get('subjects', {})
+
+    trials_by_subject = trial_df.groupby('user_number')
+    cells_by_subject = dict(list(cells_df.groupby('user_number')))
+    D_by_subject = dict(list(subject_D.groupby('user_number')))
+    jobs = []
+    status = {}
+    for user, fingerprint in fingerprints.items():
+        page = f"subject_{user}.png"
+        entry = previous.get(str(user))
+        up_to_date = (entry is not None and entry['fingerprint'] == fingerprint
+                      and os.path.exists(os.path.join(output_dir, page)))
+        if up_to_date and not force:
+            status[user] = (page, 'unchanged')
+            continue
+        jobs.append((user, trials_by_subject.get_group(user),
+                     cells_by_subject.get(user, cells_df.iloc[0:0]),
+                     D_by_subject.get(user, subject_D.iloc[0:0]),
+                     os.path.join(output_dir, page)))
+        status[user] = (page, 'generated')
+
+    print(f"QC reports: {len(jobs)} to generate, {len(fingerprints) - len(jobs)} unchanged")
+
+    # Record every finished page, even if a later one fails
+    done = {}
+    try:
+        for user in _render_pages(jobs, n_jobs, group, settings):
+            done[str(user)] = {'fingerprint': fingerprints[user], 'page': status[user][0]}
+    finally:
+        for user, (page, state) in status.items():
+            if state == 'unchanged':
+                done[str(user)] = {'fingerprint': fingerprints[user], 'page': page}
+        _write_manifest(output_dir, {'version': REPORT_VERSION, 'subjects': done})
+
+    return pd.DataFrame([{'user_number': user, 'page': page, 'status': state}
+                         for user, (page, state) in status.items()])
+
+
+def _render_pages(jobs, n_jobs, group, settings):
+    """Renders the pages, yielding each user_number as its page is written."""
+    if n_jobs > 1 and len(jobs) > 1:
+        # Group data goes to each worker once, not with every page
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                 initargs=(group, settings)) as executor:
+            futures = [executor.submit(_render_page, job) for job in jobs]
+            for future in as_completed(futures):
+                yield future.result()
+    else:
+        _init_worker(group, settings)
+        for job in jobs:
+            yield _render_page(job)
+
+
+_worker_state = {}
+
+
+def _init_worker(group, settings):
+    _worker_state['group'] = group
+    _worker_state['settings'] = settings
+
+
+def _render_page(job):
+    """Worker: draws one subject's QC page."""
+    user, subject_df, subject_cells, subject_D, path = job
+    visualization.plot_subject_qc(subject_df, subject_cells, subject_D, _worker_state['group'], path,
+                                  **_worker_state['settings'])
+    return user
+
+
+def _read_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        manifest = json.load(f)
+    return manifest if manifest.get('version') == REPORT_VERSION else {}
+
+
+def _write_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
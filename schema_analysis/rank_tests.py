@@ -0,0 +1,186 @@
+from functools import lru_cache
+import pandas as pd
+import numpy as np
+from scipy import stats
+
+# Largest sample (zeros included) given an exact signed-rank p-value, as in scipy.stats.wilcoxon
+MAX_EXACT_N = 50
+
+# Largest sample with ties/zeros given the full sign-flip distribution (2**13 flips)
+MAX_PERMUTATION_N = 13
+
+# Proportion trimmed from each tail by the Yuen test
+DEFAULT_TRIM = 0.2
+
+RANK_TEST_COLUMNS = ['wilcoxon_W', 'wilcoxon_p', 'trimmed_mean', 'yuen_t', 'yuen_p']
+
+
+def rank_test_summary(subject_D_df, by, value='D', trim=DEFAULT_TRIM):
+    """
+    Wilcoxon signed-rank and Yuen trimmed-mean tests against 0 for every group in `by`.
+    Meant to sit next to one_sample_t_summary() output (same `by` columns).
+
+    Args:
+        subject_D_df (pd.DataFrame): Subject-level values (one row per subject per group).
+        by (list): Grouping columns, e.g. ['face_id'].
+        value (str): Column holding the subject-level values.
+        trim (float): Proportion trimmed from each tail for the Yuen test.
+
+    Returns:
+        pd.DataFrame: One row per group with wilcoxon_W, wilcoxon_p,
+        trimmed_mean, yuen_t and yuen_p.
+    """
+    data = subject_D_df[list(by) + [value]].dropna(subset=[value])
+    if data.empty:
+        return pd.DataFrame(columns=list(by) + RANK_TEST_COLUMNS)
+
+    codes = data.groupby(list(by), sort=False, dropna=False).ngroup().to_numpy()
+    keys = data[list(by)].drop_duplicates().reset_index(drop=True)
+    x = data[value].to_numpy(dtype=float)
+
+    W, wilcoxon_p = signed_rank_test(x, codes)
+    trimmed_mean, yuen_t, yuen_p = yuen_test(x, codes, trim)
+    keys['wilcoxon_W'] = W
+    keys['wilcoxon_p'] = wilcoxon_p
+    keys['trimmed_mean'] = trimmed_mean
+    keys['yuen_t'] = yuen_t
+    keys['yuen_p'] = yuen_p
+    return keys
+
+
+def signed_rank_test(x, codes):
+    """
+    Two-sided Wilcoxon signed-rank test of every group against 0, in one pass.
+
+    All groups are ranked together (grouped average ranks of |x|, zeros
+    dropped as in zero_method='wilcox'). The p-value follows
+    scipy.stats.wilcoxon's default method: exact null distribution when
+    n <= 50 with no ties or zeros, the full sign-flip distribution when ties or
+    zeros occur and n <= 13, and the tie-corrected normal approximation
+    otherwise. Null distributions are cached per n.
+
+    Args:
+        x (np.ndarray): Values.
+        codes (np.ndarray): Group number (0..n_groups-1) of every value.
+
+    Returns:
+        tuple: (W, p_value) arrays, one entry per group; W = min(R+, R-).
+    """
+    n_groups = codes.max() + 1
+    nonzero = x != 0
+    abs_x = np.where(nonzero, np.abs(x), np.nan)
+    ranks = pd.Series(abs_x).groupby(codes).rank(method='average').to_numpy()
+
+    n_total = np.bincount(codes, minlength=n_groups)
+    n = np.bincount(codes, weights=nonzero, minlength=n_groups)
+    r_plus = np.bincount(codes, weights=np.where(x > 0, ranks, 0), minlength=n_groups)
+    r_minus = np.bincount(codes, weights=np.where(x < 0, ranks, 0), minlength=n_groups)
+
+    tie_sizes = pd.Series(1, index=[codes[nonzero], abs_x[nonzero]]).groupby(level=[0, 1]).size()
+    tie_groups = tie_sizes.index.get_level_values(0).to_numpy()
+    t = tie_sizes.to_numpy(dtype=float)
+    tie_term = np.bincount(tie_groups, weights=t ** 3 - t, minlength=n_groups)
+    has_ties = np.bincount(tie_groups, weights=t > 1, minlength=n_groups) > 0
+    has_zeros = n < n_total
+
+    # Normal approximation with tie correction (no continuity correction)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = (r_plus - n * (n + 1) / 4) / np.sqrt(n * (n + 1) * (2 * n + 1) / 24 - tie_term / 48)
+    p_value = 2 * stats.norm.sf(np.abs(z))
+
+    exact = (n_total <= MAX_EXACT_N) & ~has_ties & ~has_zeros
+    for size in np.unique(n[exact]).astype(int):
+        groups = exact & (n == size)
+        cdf, sf = _signed_rank_null(size)
+        lower = cdf[np.ceil(r_plus[groups]).astype(int)]
+        upper = sf[np.floor(r_plus[groups]).astype(int)]
+        p_value[groups] = np.minimum(2 * np.minimum(lower, upper), 1)
+
+    flipped = (n_total <= MAX_PERMUTATION_N) & ~exact
+    if flipped.any():
+        order = np.argsort(codes, kind='stable')
+        for size in np.unique(n[flipped]).astype(int):
+            groups = np.flatnonzero(flipped & (n == size))
+            rows = order[np.isin(codes[order], groups) & nonzero[order]]
+            group_ranks = ranks[rows].reshape(len(groups), size)
+            p_value[groups] = _sign_flip_p(group_ranks, r_plus[groups])
+
+    return np.minimum(r_plus, r_minus), p_value
+
+
+def yuen_test(x, codes, trim=DEFAULT_TRIM):
+    """
+    One-sample Yuen test of the trimmed mean against 0 for every group, in one pass.
+
+    With g = floor(trim * n) values cut from each tail and h = n - 2g kept,
+    t = trimmed mean / sqrt((n - 1) * winsorized variance / (h * (h - 1))),
+    on h - 1 degrees of freedom.
+
+    Returns:
+        tuple: (trimmed_mean, t_stat, p_value) arrays, one entry per group.
+    """
+    if not 0 <= trim < 0.5:
+        raise ValueError("trim must be in [0, 0.5).")
+
+    n_groups = codes.max() + 1
+    order = np.lexsort((x, codes))
+    xs, cs = x[order], codes[order]
+    n = np.bincount(cs, minlength=n_groups)
+    start = np.r_[0, np.cumsum(n)[:-1]]
+    position = np.arange(len(xs)) - start[cs]
+
+    g = np.floor(trim * n).astype(int)
+    h = n - 2 * g
+    kept = (position >= g[cs]) & (position < (n - g)[cs])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        trimmed_mean = np.bincount(cs, weights=np.where(kept, xs, 0), minlength=n_groups) / h
+
+        # Winsorize: clip each value to its group's g-th smallest and largest kept value
+        low = xs[np.minimum(start + g, len(xs) - 1)]
+        high = xs[np.maximum(start + n - g - 1, 0)]
+        w = np.clip(xs, low[cs], high[cs])
+        w_mean = np.bincount(cs, weights=w, minlength=n_groups) / n
+        w_var = np.bincount(cs, weights=(w - w_mean[cs]) ** 2, minlength=n_groups) / (n - 1)
+
+        se = np.sqrt((n - 1) * w_var / (h * (h - 1)))
+        t_stat = trimmed_mean / se
+    p_value = 2 * stats.t.sf(np.abs(t_stat), np.maximum(h - 1, 1))
+
+    enough = h > 1
+    return (trimmed_mean, np.where(enough, t_stat, np.nan), np.where(enough, p_value, np.nan))
+
+
+@lru_cache(maxsize=None)
+def _signed_rank_null(n):
+    """
+    Exact null distribution of R+ for n untied ranks, as (cdf, sf) arrays
+    indexed by the statistic (0..n(n+1)/2). Counts subsets of {1..n} by sum.
+    """
+    counts = np.zeros(n * (n + 1) // 2 + 1)
+    counts[0] = 1
+    for rank in range(1, n + 1):
+        counts[rank:] = counts[rank:] + counts[:-rank].copy()
+    pmf = counts / 2.0 ** n
+    cdf = np.cumsum(pmf)
+    sf = np.cumsum(pmf[::-1])[::-1]
+    cdf.flags.writeable = False
+    sf.flags.writeable = False
+    return cdf, sf
+
+
+@lru_cache(maxsize=None)
+def _sign_flips(n):
+    """All 2**n sign patterns as a (2**n, n) 0/1 matrix (1 = positive)."""
+    flips = (np.arange(2 ** n)[:, None] >> np.arange(n)) & 1
+    flips = flips.astype(float)
+    flips.flags.writeable = False
+    return flips
+
+
+def _sign_flip_p(group_ranks, observed):
+    """Two-sided p of R+ under every sign flip of each group's (tied) ranks."""
+    null = group_ranks @ _sign_flips(group_ranks.shape[1]).T
+    tolerance = np.abs(1e-14 * observed)[:, None]
+    greater = (null >= observed[:, None] - tolerance).mean(axis=1)
+    less = (null <= observed[:, None] + tolerance).mean(axis=1)
+    return np.minimum(2 * np.minimum(greater, less), 1)
@@ -0,0 +1,110 @@
+import pandas as pd
+import numpy as np
+from scipy import stats
+from . import processing
+
+# Model terms: end_angle ~ 1 + tubeTypeIndex + faceSide (right = 1) + towards (towards = 1)
+TERMS = ['intercept', 'tube', 'side', 'towards']
+
+MODEL_KEYS = ['user_number', 'face_id']
+
+
+def design_matrix(df):
+    """
+    Builds the stacked design matrix of the per-subject model.
+
+    Returns:
+        np.ndarray: (n_trials, len(TERMS)) with columns intercept, tubeTypeIndex,
+        faceSide == 'right' and towards_away == 'towards'.
+    """
+    return np.column_stack([
+        np.ones(len(df)),
+        df['tubeTypeIndex'].to_numpy(dtype=float),
+        (df['faceSide'] == 'right').to_numpy(dtype=float),
+        (df['towards_away'] == 'towards').to_numpy(dtype=float),
+    ])
+
+
+def fit_subject_models(df, by=MODEL_KEYS):
+    """
+    Ordinary least squares of end_angle on TERMS, one model per group, in one batch.
+
+    Rows are sorted by group and the per-group cross products X'X, X'y and the
+    residual sums of squares are accumulated with np.add.reduceat, so every
+    model is solved by a single batched np.linalg.solve/inv on a
+    (n_groups, p, p) stack instead of one fit per subject.
+
+    Groups whose design is rank deficient (e.g. a subject with only one tube
+    left) get NaN coefficients; groups with no residual degrees of freedom
+    get NaN standard errors.
+
+    Args:
+        df (pd.DataFrame): Trials to fit (e.g. the valid trials) with end_angle,
+            tubeTypeIndex, faceSide and towards_away.
+        by (list): Grouping columns; default one model per subject and face.
+
+    Returns:
+        pd.DataFrame: One row per group and term with coef, se, t_stat, p_value,
+        n_trials and df_resid.
+    """
+    columns = list(by) + ['term', 'coef', 'se', 't_stat', 'p_value', 'n_trials', 'df_resid']
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+
+    df = df.sort_values(list(by), kind='stable')
+    key_values = df[list(by)]
+    starts = np.flatnonzero((key_values != key_values.shift()).any(axis=1).to_numpy())
+    keys = key_values.iloc[starts]
+
+    X = design_matrix(df)
+    y = df['end_angle'].to_numpy(dtype=float)
+    p = X.shape[1]
+
+    XtX = np.add.reduceat(np.einsum('ni,nj->nij', X, X), starts, axis=0)
+    Xty = np.add.reduceat(X * y[:, None], starts, axis=0)
+    n_trials = np.diff(np.r_[starts, len(df)])
+
+    full_rank = np.linalg.matrix_rank(XtX) == p
+    beta = np.full((len(starts), p), np.nan)
+    cov_unscaled = np.full((len(starts), p, p), np.nan)
+    if full_rank.any():
+        beta[full_rank] = np.linalg.solve(XtX[full_rank], Xty[full_rank][..., None])[..., 0]
+        cov_unscaled[full_rank] = np.linalg.inv(XtX[full_rank])
+
+    # Residuals from each row's own group coefficients
+    group = np.repeat(np.arange(len(starts)), n_trials)
+    residual = y - np.einsum('ni,ni->n', X, beta[group])
+    rss = np.add.reduceat(residual ** 2, starts)
+    df_resid = n_trials - p
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sigma2 = np.where(df_resid > 0, rss / df_resid, np.nan)
+        se = np.sqrt(sigma2[:, None] * np.diagonal(cov_unscaled, axis1=1, axis2=2))
+        t_stat = beta / se
+    p_value = 2 * stats.t.sf(np.abs(t_stat), np.maximum(df_resid, 1)[:, None])
+
+    result = keys.iloc[np.repeat(np.arange(len(keys)), p)].reset_index(drop=True)
+    result['term'] = np.tile(TERMS, len(starts))
+    result['coef'] = beta.ravel()
+    result['se'] = se.ravel()
+    result['t_stat'] = t_stat.ravel()
+    result['p_value'] = p_value.ravel()
+    result['n_trials'] = np.repeat(n_trials, p)
+    result['df_resid'] = np.repeat(df_resid, p)
+    return result[columns]
+
+
+def coefficient_stats(coef_df, by=('face_id',)):
+    """
+    Per-face one-sample t-test of every term's subject-level coefficients against 0,
+    in the calc_stats() format (one row per face and term).
+
+    Args:
+        coef_df (pd.DataFrame): Output of fit_subject_models().
+        by (tuple): Grouping besides term.
+
+    Returns:
+        pd.DataFrame: Columns by, term, mean, std, sem, n_subjects, t_stat, p_value.
+    """
+    fitted = coef_df.dropna(subset=['coef'])
+    return processing.one_sample_t_summary(fitted, list(by) + ['term'], value='coef')
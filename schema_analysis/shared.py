@@ -0,0 +1,252 @@
+import multiprocessing
+import os
+import secrets
+import sys
+from multiprocessing import resource_tracker, shared_memory
+import pandas as pd
+import numpy as np
+
+# Before 3.13, attaching registers the segment with the resource tracker, which
+# would unlink it (and warn) when the attaching process exits
+_TRACK_ARGUMENT = sys.version_info >= (3, 13)
+
+# Tables attached in this process, by handle token (see attach_trials)
+_attached = {}
+
+
+class SharedTableHandle:
+    """
+    Picklable description of a published table: segment names, dtypes and
+    categories. Small enough to send with every task.
+    """
+
+    def __init__(self, token, n_rows, columns, index, owner_pid=None):
+        self.token = token
+        self.n_rows = n_rows
+        # [(column, segment name, dtype str, categories or None, original dtype or None)]
+        self.columns = columns
+        self.index = index
+        # The publisher and its child processes share one resource tracker (see _open_segment)
+        self.owner_pid = owner_pid
+
+    def __repr__(self):
+        return f"<SharedTableHandle {self.token}: {self.n_rows} rows, {len(self.columns)} columns>"
+
+
+class SharedTrialTable:
+    """
+    Trial columns published in shared memory (one segment per column), so
+    process-pool workers can use the same trials without pickling them.
+
+    The publishing process owns the segments; workers attach with the
+    picklable `handle` and get zero-copy, copy-on-write views. String
+    columns are stored as categorical codes (categories travel in the
+    handle) and decoded back to their original dtype in each process that
+    attaches, so frames match the published ones. Use as a context manager, or call close() and unlink() on the
+    owner when the workers are done; unlink() frees the memory.
+
+    Example:
+        with SharedTrialTable.publish(clean_trials) as table:
+            with ProcessPoolExecutor() as executor:
+                results = list(executor.map(work, [table.handle] * n_tasks))
+
+        def work(handle):
+            trials = attach_trials(handle)
+            ...
+    """
+
+    def __init__(self, handle, segments, owner):
+        self.handle = handle
+        self._segments = segments
+        self._owner = owner
+        # Kept after close() so the owner can still unlink
+        self._owned = list(segments) if owner else []
+        # Frames built by to_frame(), by categorical
+        self._frames = {}
+
+    @classmethod
+    def publish(cls, data):
+        """
+        Copies the trial columns (and index) of a TubeTrials or DataFrame into
+        new shared memory segments owned by this process.
+
+        Raises ValueError for columns that cannot be stored as a NumPy array
+        (e.g. nullable integers with missing values).
+        """
+        df = data.df if hasattr(data, 'df') else data
+        token = secrets.token_hex(6)
+        segments = []
+        try:
+            columns = []
+            for column in df.columns:
+                values, categories = _encode(df[column])
+                segment = _create_segment(values, f"tt_{token}_{len(segments)}")
+                segments.append(segment)
+                source_dtype = str(df[column].dtype) if categories is not None else None
+                columns.append((column, segment.name, values.dtype.str, categories, source_dtype))
+            index_values, _ = _encode(pd.Series(df.index), index=True)
+            segment = _create_segment(index_values, f"tt_{token}_{len(segments)}")
+            segments.append(segment)
+            index = (df.index.name, segment.name, index_values.dtype.str)
+        except BaseException:
+            for segment in segments:
+                segment.close()
+                segment.unlink()
+            raise
+        handle = SharedTableHandle(token, len(df), columns, index, owner_pid=os.getpid())
+        return cls(handle, segments, owner=True)
+
+    @classmethod
+    def attach(cls, handle):
+        """Maps the segments of a published table into this process (no copy)."""
+        segments = []
+        try:
+            for _, name, _, _, _ in handle.columns:
+                segments.append(_open_segment(name, handle.owner_pid))
+            segments.append(_open_segment(handle.index[1], handle.owner_pid))
+        except BaseException:
+            for segment in segments:
+                segment.close()
+            raise
+        return cls(handle, segments, owner=False)
+
+    def to_frame(self, categorical=False):
+        """
+        DataFrame over the shared columns, built once per process. Numeric and
+        boolean columns are read-only views of the segments (in-place edits
+        raise ValueError; use to_trials(), whose views copy a column on first
+        write). String columns are decoded to their original dtype, a copy made
+        once per process; with categorical=True they stay categoricals over the
+        shared codes instead (no copy, but categorical keys change groupby
+        output, so results differ in dtype from an ordinary TubeTrials).
+        """
+        if self._segments is None:
+            raise ValueError("Shared table is closed.")
+        if categorical in self._frames:
+            return self._frames[categorical]
+
+        n = self.handle.n_rows
+        data = {}
+        for (column, _, dtype, categories, source_dtype), segment in zip(self.handle.columns, self._segments):
+            values = _view(segment, dtype, n)
+            if categories is not None:
+                values = pd.Categorical.from_codes(values, categories=pd.Index(categories))
+                if not categorical:
+                    values = pd.Series(values).astype(source_dtype).array
+            data[column] = values
+        index_name, _, index_dtype = self.handle.index
+        index = pd.Index(_view(self._segments[-1], index_dtype, n), name=index_name, copy=False)
+        df = pd.DataFrame(data, index=index, copy=False)
+        self._frames[categorical] = df
+        return df
+
+    def to_trials(self, categorical=False):
+        """
+        Lightweight TubeTrials over the shared columns (see to_frame()). Each
+        call gets its own shallow frame: columns added by one view (e.g.
+        mark_valid_angles()) do not leak into the next, and an in-place edit
+        copies that column (copy-on-write) instead of touching the segment.
+        """
+        from .tube_trials import TubeTrials
+        return TubeTrials.wrap(self.to_frame(categorical=categorical).copy(deep=False))
+
+    def close(self):
+        """
+        Unmaps the segments from this process. Frames and TubeTrials views
+        obtained from this table must be released first (BufferError otherwise).
+        """
+        if self._segments is None:
+            return
+        self._frames = {}
+        for segment in self._segments:
+            segment.close()
+        self._segments = None
+
+    def unlink(self):
+        """Frees the segments (owner only). Attached processes keep their mappings until they close."""
+        if not self._owner:
+            raise ValueError("Only the publishing process can unlink a shared table.")
+        for segment in self._owned:
+            try:
+                segment.unlink()
+            except FileNotFoundError:
+                pass
+        self._owned = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        if self._owner:
+            self.unlink()
+
+    def __repr__(self):
+        role = 'owner' if self._owner else 'attached'
+        state = 'closed' if self._segments is None else role
+        return f"<SharedTrialTable {self.handle.token} ({state}): {self.handle.n_rows} trials>"
+
+
+def attach_trials(handle, categorical=False):
+    """
+    Worker-side entry point: TubeTrials view of a published table. The
+    attachment is cached per process, so repeated tasks reuse the mapping;
+    it is released when the worker exits.
+    """
+    table = _attached.get(handle.token)
+    if table is None:
+        table = _attached[handle.token] = SharedTrialTable.attach(handle)
+    return table.to_trials(categorical=categorical)
+
+
+def detach(handle):
+    """Closes this process's cached attachment of a table (see attach_trials)."""
+    table = _attached.pop(handle.token, None)
+    if table is not None:
+        table.close()
+
+
+def _encode(series, index=False):
+    """NumPy values of a column (and categories for strings)."""
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(dtype) or dtype == object:
+        if index:
+            raise ValueError("Only numeric indexes can be shared.")
+        categorical = pd.Categorical(series)
+        return np.ascontiguousarray(categorical.codes), categorical.categories.tolist()
+    values = series.to_numpy()
+    if values.dtype == object or values.dtype.hasobject:
+        raise ValueError(f"Column '{series.name}' ({dtype}) cannot be shared.")
+    return np.ascontiguousarray(values), None
+
+
+def _create_segment(values, name):
+    # Zero-length segments are not allowed
+    segment = shared_memory.SharedMemory(name=name, create=True, size=max(values.nbytes, 1))
+    np.ndarray(values.shape, dtype=values.dtype, buffer=segment.buf)[:] = values
+    return segment
+
+
+def _open_segment(name, owner_pid):
+    if _TRACK_ARGUMENT:
+        return shared_memory.SharedMemory(name=name, track=False)
+    segment = shared_memory.SharedMemory(name=name)
+    # The publisher and the processes it started (pool workers) share its
+    # tracker, where the segment is already registered once; a separate
+    # tracker must forget it again or it would unlink the segment on exit
+    if os.name == 'posix' and not _shares_owner_tracker(owner_pid):
+        # The tracker knows POSIX segments by their '/'-prefixed name
+        resource_tracker.unregister(f"/{segment.name}", 'shared_memory')
+    return segment
+
+
+def _shares_owner_tracker(owner_pid):
+    """True in the publishing process and in the child processes it started."""
+    parent = multiprocessing.parent_process()
+    return os.getpid() == owner_pid or (parent is not None and parent.pid == owner_pid)
+
+
+def _view(segment, dtype, n):
+    values = np.ndarray((n,), dtype=np.dtype(dtype), buffer=segment.buf)
+    values.flags.writeable = False
+    return values
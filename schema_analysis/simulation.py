@@ -0,0 +1,221 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import numpy as np
+from . import processing
+from .pairing import PairIndex
+
+# Design used for any parameter a design does not set
+DEFAULT_DESIGN = {
+    'n_subjects': 150,        # subjects per experiment
+    'n_tubes': 4,             # tube types per face
+    'invalid_rate': 0.1,      # probability a trial breaks the angle rule
+    'effect': 0.5,            # true mean D (degrees)
+    'subject_sd': 2.0,        # between-subject SD of true D
+    'trial_sd': 5.0,          # SD of a single pair's d around the subject's D
+    'faces': ('ID015',),      # faces every subject sees
+}
+
+# Angle rule and exclusion used by the simulated pipeline
+DEFAULT_PIPELINE = {'min_angle': 3, 'max_angle': 43, 'max_invalid_trials': 2}
+
+SIDES = np.array(['left', 'right'])
+
+
+def design_grid(**params):
+    """
+    Builds the cartesian product of design parameters.
+
+    Example:
+        design_grid(n_subjects=[50, 100, 150], invalid_rate=[0.2, 0.4])
+
+    Returns:
+        list: One design dict per combination.
+    """
+    names = list(params)
+    return [dict(zip(names, values)) for values in itertools.product(*params.values())]
+
+
+def simulate_experiments(n_experiments, design, rng, first_experiment=0):
+    """
+    Generates synthetic experiments shaped like the raw export, fully vectorized.
+
+    Every subject sees each face x tube x faceSide x tip_direction once, in a
+    random trial order. A subject's true D is drawn around `effect`; the
+    towards and away trials of a pair differ by that D plus trial noise.
+    A fraction `invalid_rate` of trials gets an angle outside the valid range.
+
+    Args:
+        n_experiments (int): Number of experiments to generate.
+        design (dict): Design parameters (see DEFAULT_DESIGN).
+        rng (np.random.Generator): Random source.
+        first_experiment (int): Id of the first experiment (keeps ids and
+            user numbers unique across batches).
+
+    Returns:
+        pd.DataFrame: Raw trials plus an 'experiment' column. user_number is
+        unique across experiments.
+    """
+    design = {**DEFAULT_DESIGN, **design}
+    faces = np.asarray(design['faces'])
+    n_subjects, n_tubes = design['n_subjects'], design['n_tubes']
+    cells_per_subject = len(faces) * n_tubes * 4
+    n_rows = n_experiments * n_subjects * cells_per_subject
+
+    # Factorial layout: subject (slowest) > face > tube > faceSide > tip_direction
+    cell = np.arange(n_rows) % cells_per_subject
+    subject = np.arange(n_rows) // cells_per_subject
+    tip = cell % 2
+    side = (cell // 2) % 2
+    tube = (cell // 4) % n_tubes
+    face = cell // (4 * n_tubes)
+    towards = tip == side
+
+    # True D per subject and face, split across the towards/away trials
+    subject_face = subject * len(faces) + face
+    n_subject_faces = n_experiments * n_subjects * len(faces)
+    true_D = rng.normal(design['effect'], design['subject_sd'], size=n_subject_faces)
+    baseline = rng.normal(18, 5, size=n_subject_faces)
+    noise = rng.normal(0, design['trial_sd'] / np.sqrt(2), size=n_rows)
+    end_angle = baseline[subject_face] + np.where(towards, 0.5, -0.5) * true_D[subject_face] + noise
+
+    invalid = rng.random(n_rows) < design['invalid_rate']
+    low = rng.uniform(-30, 3, size=n_rows)
+    high = rng.uniform(43, 90, size=n_rows)
+    end_angle = np.where(invalid, np.where(rng.random(n_rows) < 0.5, low, high), end_angle)
+    end_angle = np.round(end_angle).astype(int)
+
+    tip_direction = SIDES[tip]
+    experiment = first_experiment + subject // n_subjects
+
+    # Shuffle presentation order within subject
+    order = np.lexsort((rng.random(n_rows), subject))
+    trial_index = np.empty(n_rows, dtype=int)
+    trial_index[order] = np.arange(n_rows) % cells_per_subject
+
+    return pd.DataFrame({
+        'experiment': experiment,
+        'user_number': first_experiment * n_subjects + subject + 1,
+        'session_group': 'SIM',
+        'trialIndex': trial_index,
+        'tubeTypeIndex': tube,
+        'tip_direction': tip_direction,
+        'face_id': faces[face],
+        'faceSide': SIDES[side],
+        'towards_away': np.where(towards, 'towards', 'away'),
+        'raw_angle': np.where(tip_direction == 'left', -end_angle, end_angle),
+        'latency': rng.integers(1000, 10000, size=n_rows),
+        'sightType': 'sighted',
+    })
+
+
+def analyze_experiments(raw_df, min_angle=3, max_angle=43, max_invalid_trials=2):
+    """
+    Runs a batch of stacked experiments through the standard pipeline in one pass:
+    angle transform and validation, subject exclusion, pairing and the per-face
+    one-sample t-test, grouped by experiment.
+
+    Args:
+        raw_df (pd.DataFrame): Output of simulate_experiments().
+
+    Returns:
+        pd.DataFrame: One row per experiment and face with the calc_stats() columns.
+    """
+    df = processing.transform_angles(raw_df.copy())
+    df = processing.validate_angles(df, min_angle, max_angle)
+    bad_subjects = processing.identify_bad_subjects(df, max_invalid_trials)
+    clean_df = df[df['angle_valid'] & ~df['user_number'].isin(bad_subjects)]
+
+    pairs_df = PairIndex.from_trials(clean_df).pairs()
+    subject_D = processing.calc_subject_D(pairs_df)
+    subject_experiment = raw_df.groupby('user_number')['experiment'].first()
+    subject_D['experiment'] = subject_D['user_number'].map(subject_experiment)
+
+    # Experiments/faces that lost every subject still count (as non-significant)
+    stats_df = processing.one_sample_t_summary(subject_D, ['experiment', 'face_id'])
+    all_cells = pd.MultiIndex.from_product(
+        [np.unique(raw_df['experiment']), np.unique(raw_df['face_id'])],
+        names=['experiment', 'face_id'])
+    stats_df = stats_df.set_index(['experiment', 'face_id']).reindex(all_cells).reset_index()
+    stats_df['n_subjects'] = stats_df['n_subjects'].fillna(0).astype(int)
+    return stats_df
+
+
+def _simulate_batch(design, n_experiments, first_experiment, seed, pipeline):
+    """Worker: simulates and analyzes one batch of experiments and its null twin."""
+    rng = np.random.default_rng(seed)
+    null_design = {**design, 'effect': 0.0}
+    results = []
+    for hypothesis, batch_design in (('alternative', design), ('null', null_design)):
+        raw_df = simulate_experiments(n_experiments, batch_design, rng, first_experiment)
+        stats_df = analyze_experiments(raw_df, **pipeline)
+        stats_df['hypothesis'] = hypothesis
+        results.append(stats_df[['hypothesis', 'experiment', 'face_id', 'n_subjects', 'p_value']])
+    return pd.concat(results, ignore_index=True)
+
+
+def simulate_power(designs, n_experiments=1000, alpha=0.05, n_jobs=1, batch_size=200,
+                   seed=0, pipeline=None):
+    """
+    Monte Carlo power and false-positive rates for the per-face one-sample test.
+
+    Each design is simulated `n_experiments` times under its `effect`
+    (power) and under effect 0 (false-positive rate). Experiments are
+    generated and analyzed in vectorized batches; batches run in a
+    process pool when n_jobs > 1.
+
+    Args:
+        designs (list or dict): Design dict(s), e.g. from design_grid().
+        n_experiments (int): Experiments per design and hypothesis.
+        alpha (float): Significance level.
+        n_jobs (int): Worker processes (-1 for all cores).
+        batch_size (int): Experiments per vectorized batch.
+        seed (int): Seed for reproducible results.
+        pipeline (dict): Overrides for min_angle, max_angle, max_invalid_trials.
+
+    Returns:
+        pd.DataFrame: One row per design and face with the design parameters,
+        power, false_positive_rate and mean_subjects_retained.
+    """
+    if isinstance(designs, dict):
+        designs = [designs]
+    pipeline = {**DEFAULT_PIPELINE, **(pipeline or {})}
+    if n_jobs == -1:
+        n_jobs = os.cpu_count() or 1
+
+    jobs = []
+    for design_id, design in enumerate(designs):
+        for first in range(0, n_experiments, batch_size):
+            jobs.append((design_id, design, min(batch_size, n_experiments - first), first))
+    seeds = np.random.SeedSequence(seed).spawn(len(jobs))
+
+    if n_jobs > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            futures = [executor.submit(_simulate_batch, design, n, first, s, pipeline)
+                       for (_, design, n, first), s in zip(jobs, seeds)]
+            batches = [f.result() for f in futures]
+    else:
+        batches = [_simulate_batch(design, n, first, s, pipeline)
+                   for (_, design, n, first), s in zip(jobs, seeds)]
+
+    for (design_id, _, _, _), batch in zip(jobs, batches):
+        batch['design_id'] = design_id
+    results = pd.concat(batches, ignore_index=True)
+    results['significant'] = results['p_value'] < alpha
+
+    rates = (results.pivot_table(index=['design_id', 'face_id'], columns='hypothesis',
+                                 values='significant', aggfunc='mean')
+             .rename(columns={'alternative': 'power', 'null': 'false_positive_rate'}))
+    retained = (results[results['hypothesis'] == 'alternative']
+                .groupby(['design_id', 'face_id'])['n_subjects'].mean()
+                .rename('mean_subjects_retained'))
+    summary = rates.join(retained).reset_index()
+    summary.columns.name = None
+
+    design_df = pd.DataFrame([{**DEFAULT_DESIGN, **d} for d in designs])
+    design_df['faces'] = design_df['faces'].map(lambda f: ','.join(f))
+    design_df.index.name = 'design_id'
+    summary = design_df.reset_index().merge(summary, on='design_id')
+    summary['n_experiments'] = n_experiments
+    return summary
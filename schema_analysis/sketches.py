@@ -0,0 +1,230 @@
+import pandas as pd
+import numpy as np
+from . import processing
+from .data_loader import iter_trial_chunks, DEFAULT_CHUNKSIZE
+
+DEFAULT_PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+
+
+class HistogramSketch:
+    """
+    Mergeable fixed-bin histogram of one column, kept per group, for quantiles,
+    axis limits and histograms over data that is never held in memory at once.
+
+    Bins are aligned to multiples of `bin_width` (so sketches built from
+    different chunks or files line up and merge by adding counts) and only the
+    occupied range of bins is stored. With log=True the bins are of width
+    `bin_width` on log(value), i.e. a relative resolution of about
+    exp(bin_width) - 1 (0.01 -> 1%), suited to skewed positive values such as
+    latency; values <= 0 are counted but only reported through min.
+
+    Quantiles are interpolated within their bin, so their error is at most one
+    bin width (or the relative resolution); count, min and max are exact.
+
+    Args:
+        value (str): Column to sketch.
+        by (list): Grouping columns (e.g. ['face_id']); one histogram per group.
+        bin_width (float): Bin width (in log units with log=True).
+        log (bool): Logarithmic bins.
+    """
+
+    def __init__(self, value, by=(), bin_width=1.0, log=False):
+        if bin_width <= 0:
+            raise ValueError("bin_width must be positive.")
+        self.value = value
+        self.by = list(by)
+        self.bin_width = float(bin_width)
+        self.log = log
+        # key -> [first bin index, counts]; key -> [n, n_nonpositive, min, max]
+        self._bins = {}
+        self._totals = {}
+
+    def update(self, df):
+        """Adds the values of one chunk. NaNs are skipped. Returns self."""
+        data = df[self.by + [self.value]].dropna(subset=[self.value])
+        if data.empty:
+            return self
+        x = data[self.value].to_numpy(dtype=float)
+        if self.by:
+            codes = data.groupby(self.by, sort=False, dropna=False).ngroup().to_numpy()
+            # Missing keys become None, so they match across chunks and sketches
+            keys = [tuple(None if pd.isna(v) else v for v in k) for k in
+                    data[self.by].drop_duplicates().itertuples(index=False, name=None)]
+        else:
+            codes = np.zeros(len(x), dtype=int)
+            keys = [()]
+
+        binned = x > 0 if self.log else np.ones(len(x), dtype=bool)
+        with np.errstate(divide='ignore'):
+            scaled = np.log(np.where(binned, x, 1)) if self.log else x
+        index = np.floor(scaled / self.bin_width).astype(np.int64)
+
+        n = np.bincount(codes, minlength=len(keys))
+        n_binned = np.bincount(codes, weights=binned, minlength=len(keys)).astype(np.int64)
+        x_min = np.full(len(keys), np.inf)
+        x_max = np.full(len(keys), -np.inf)
+        np.minimum.at(x_min, codes, x)
+        np.maximum.at(x_max, codes, x)
+
+        order = np.argsort(codes, kind='stable')
+        bounds = np.r_[0, np.cumsum(n)]
+        for code, key in enumerate(keys):
+            rows = order[bounds[code]:bounds[code + 1]]
+            rows = rows[binned[rows]]
+            counts = None
+            if len(rows):
+                idx = index[rows]
+                first = idx.min()
+                counts = np.bincount(idx - first)
+            self._add(key, n[code], n[code] - n_binned[code], x_min[code], x_max[code],
+                      (first, counts) if counts is not None else None)
+        return self
+
+    def merge(self, other):
+        """Adds another sketch's counts (same value, grouping and bins). Returns a new sketch."""
+        if (self.value, self.by, self.bin_width, self.log) != (other.value, other.by, other.bin_width, other.log):
+            raise ValueError("Only sketches of the same column, grouping and bins can be merged.")
+        merged = HistogramSketch(self.value, self.by, self.bin_width, self.log)
+        for sketch in (self, other):
+            for key, (n, n_nonpositive, x_min, x_max) in sketch._totals.items():
+                merged._add(key, n, n_nonpositive, x_min, x_max, sketch._bins.get(key))
+        return merged
+
+    def __add__(self, other):
+        return self.merge(other)
+
+    def _add(self, key, n, n_nonpositive, x_min, x_max, bins):
+        totals = self._totals.setdefault(key, [0, 0, np.inf, -np.inf])
+        totals[0] += int(n)
+        totals[1] += int(n_nonpositive)
+        totals[2] = min(totals[2], x_min)
+        totals[3] = max(totals[3], x_max)
+        if bins is None:
+            return
+        first, counts = bins
+        if key not in self._bins:
+            self._bins[key] = [first, counts.copy()]
+            return
+        current_first, current = self._bins[key]
+        start = min(first, current_first)
+        end = max(first + len(counts), current_first + len(current))
+        combined = np.zeros(end - start, dtype=np.int64)
+        combined[current_first - start:current_first - start + len(current)] += current
+        combined[first - start:first - start + len(counts)] += counts
+        self._bins[key] = [start, combined]
+
+    @property
+    def keys(self):
+        # Groups with a missing key (None) sort last
+        return sorted(self._totals, key=lambda key: [(v is None, 0 if v is None else v) for v in key])
+
+    def histogram(self, key=()):
+        """
+        Returns:
+            tuple: (counts, edges) of the occupied bins of one group, as np.histogram.
+        """
+        key = _group_key(key)
+        if key not in self._bins:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        first, counts = self._bins[key]
+        edges = (first + np.arange(len(counts) + 1)) * self.bin_width
+        return counts, np.exp(edges) if self.log else edges
+
+    def max_count(self):
+        """Highest bin count over all groups (e.g. a shared y limit)."""
+        return max((counts.max() for _, counts in self._bins.values()), default=0)
+
+    def range(self):
+        """Exact (min, max) over all groups."""
+        if not self._totals:
+            return np.nan, np.nan
+        return (min(t[2] for t in self._totals.values()), max(t[3] for t in self._totals.values()))
+
+    def quantiles(self, q, key=()):
+        """
+        Approximate quantiles of one group.
+
+        Args:
+            q (array-like): Probabilities in [0, 1].
+            key: Group key (tuple of `by` values, or a single value; None or
+                NaN for a missing value).
+
+        Returns:
+            np.ndarray: Quantiles, clipped to the exact min and max.
+        """
+        key = _group_key(key)
+        q = np.atleast_1d(np.asarray(q, dtype=float))
+        if key not in self._totals:
+            return np.full(len(q), np.nan)
+        n, n_nonpositive, x_min, x_max = self._totals[key]
+        counts, edges = self.histogram(key)
+        if len(counts) == 0:
+            return np.full(len(q), x_min)
+
+        # Non-positive values (log bins only) sit below every bin at the minimum
+        cumulative = n_nonpositive + np.cumsum(counts)
+        target = q * n
+        position = np.searchsorted(cumulative, target, side='left').clip(0, len(counts) - 1)
+        below = np.where(position > 0, cumulative[position - 1], n_nonpositive)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fraction = np.clip((target - below) / counts[position], 0, 1)
+        result = edges[position] + fraction * (edges[position + 1] - edges[position])
+        result = np.where(target <= n_nonpositive, x_min, result)
+        return np.clip(result, x_min, x_max)
+
+    def percentile_table(self, percentiles=DEFAULT_PERCENTILES):
+        """
+        Returns:
+            pd.DataFrame: One row per group with the `by` columns, n, min,
+            p<percentile> columns and max.
+        """
+        rows = []
+        for key in self.keys:
+            n, _, x_min, x_max = self._totals[key]
+            row = dict(zip(self.by, key))
+            row.update({'n': n, 'min': x_min})
+            row.update({f"p{p:g}": v for p, v in zip(percentiles, self.quantiles(np.asarray(percentiles) / 100, key))})
+            row['max'] = x_max
+            rows.append(row)
+        columns = self.by + ['n', 'min'] + [f"p{p:g}" for p in percentiles] + ['max']
+        return pd.DataFrame(rows, columns=columns)
+
+    def __repr__(self):
+        kind = 'log' if self.log else 'linear'
+        return f"<HistogramSketch: {self.value} by {self.by}, {len(self._totals)} groups, {kind} bins of {self.bin_width:g}>"
+
+
+def _group_key(key):
+    key = key if isinstance(key, tuple) else (key,)
+    return tuple(None if pd.isna(v) else v for v in key)
+
+
+def sketch_exports(files, by=('face_id', 'tubeTypeIndex'), angle_bin_width=1.0, latency_bin_width=0.01,
+                   chunksize=DEFAULT_CHUNKSIZE, n_workers=4):
+    """
+    Streams export files once and sketches end angle and latency per group,
+    without loading the archive into memory. Face IDs are renamed as in
+    rename_face_ids(); trials are not deduplicated.
+
+    Args:
+        files (list): Export files (see data_loader.find_export_files).
+        by (tuple): Grouping columns.
+        angle_bin_width (float): End angle bin width in degrees.
+        latency_bin_width (float): Latency log bin width (0.01 -> ~1% resolution).
+        chunksize (int): Rows per chunk.
+        n_workers (int): Files decompressed concurrently.
+
+    Returns:
+        dict: {'end_angle': HistogramSketch, 'latency': HistogramSketch}
+    """
+    sketches = {
+        'end_angle': HistogramSketch('end_angle', by, bin_width=angle_bin_width),
+        'latency': HistogramSketch('latency', by, bin_width=latency_bin_width, log=True),
+    }
+    for _, _, _, chunk in iter_trial_chunks(files, chunksize=chunksize, n_workers=n_workers):
+        chunk['face_id'] = chunk['face_id'].replace(processing.FACE_ID_RENAMES)
+        chunk = processing.transform_angles(chunk)
+        for sketch in sketches.values():
+            if sketch.value in chunk.columns:
+                sketch.update(chunk)
+    return sketches
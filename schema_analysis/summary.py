@@ -0,0 +1,179 @@
+import json
+import pandas as pd
+import numpy as np
+from . import processing
+
+SUMMARY_VERSION = 1
+
+SUBJECT_COLUMNS = ['site', 'user_number', 'face_id', 'D', 'n_pairs']
+MOMENT_COLUMNS = ['face_id', 'n_subjects', 'mean', 'm2']
+
+
+class SiteSummary:
+    """
+    Shareable summary of one or more sites: per-subject, per-face D and the
+    per-face sufficient statistics of D (count, mean, sum of squared deviations).
+
+    Summaries hold no trials, so they can be exchanged between labs and merged
+    without reprocessing raw data. merge() is associative (and commutative):
+    subject rows are concatenated and the per-face moments are combined with
+    Chan's parallel update. Sites and user numbers must be unique across the
+    merged summaries (as they would have to be for a pooled run), so
+    calc_stats() on a merged summary reproduces calc_stats() of a pooled
+    raw-data run exactly.
+
+    Attributes:
+        subject_D (pd.DataFrame): site, user_number, face_id, D, n_pairs.
+        face_moments (pd.DataFrame): face_id, n_subjects, mean, m2 (indexed by face_id).
+    """
+
+    def __init__(self, subject_D, face_moments=None):
+        self.subject_D = subject_D[SUBJECT_COLUMNS].reset_index(drop=True)
+        if face_moments is None:
+            face_moments = _moments(self.subject_D)
+        self.face_moments = face_moments
+
+    @classmethod
+    def from_trials(cls, trials, site):
+        """
+        Builds the summary of one site.
+
+        Args:
+            trials (TubeTrials): The site's clean trials (after select(valid_only=True)).
+            site (str): Site name; must be unique among the summaries to be merged.
+
+        Returns:
+            SiteSummary
+        """
+        pairs_df = trials.calc_d_values()
+        subject_D = processing.calc_subject_D(pairs_df)
+        if not pairs_df.empty:
+            n_pairs = pairs_df.groupby(['user_number', 'face_id']).size().rename('n_pairs')
+            subject_D = subject_D.join(n_pairs, on=['user_number', 'face_id'])
+        else:
+            subject_D['n_pairs'] = pd.Series(dtype=int)
+        subject_D.insert(0, 'site', site)
+        return cls(subject_D)
+
+    @classmethod
+    def empty(cls):
+        """The identity of merge()."""
+        return cls(pd.DataFrame(columns=SUBJECT_COLUMNS))
+
+    @property
+    def sites(self):
+        return sorted(self.subject_D['site'].unique())
+
+    def merge(self, other):
+        """
+        Combines two summaries. Work is proportional to the number of subjects.
+        Raises ValueError if a site or a user_number appears in both: a site
+        would be counted twice, and a pooled run would average the pairs of
+        one user_number from two sites into a single subject.
+        """
+        overlap = set(self.sites) & set(other.sites)
+        if overlap:
+            raise ValueError(f"Site(s) {sorted(overlap)} are in both summaries.")
+        shared_users = set(self.subject_D['user_number']) & set(other.subject_D['user_number'])
+        if shared_users:
+            raise ValueError(f"user_number(s) {sorted(shared_users)[:10]} appear at more than one site; "
+                             f"renumber the subjects of one site before merging.")
+        parts = [s for s in (self.subject_D, other.subject_D) if len(s)]
+        subject_D = pd.concat(parts, ignore_index=True) if parts else self.subject_D
+        return SiteSummary(subject_D, _combine_moments(self.face_moments, other.face_moments))
+
+    def __add__(self, other):
+        return self.merge(other)
+
+    @classmethod
+    def pool(cls, summaries):
+        """Merges any number of summaries."""
+        pooled = cls.empty()
+        for summary in summaries:
+            pooled = pooled.merge(summary)
+        return pooled
+
+    def calc_stats(self):
+        """
+        Per-face one-sample t-test of subject-level D against 0, identical to
+        TubeTrials.calc_stats() on the pooled trials.
+        """
+        # Same row order as calc_subject_D() on pooled pairs, so sums match bit for bit
+        subject_D = self.subject_D.sort_values(['user_number', 'face_id'], kind='stable')
+        return processing.calc_face_stats(subject_D[['user_number', 'face_id', 'D']])
+
+    def to_dict(self):
+        """Plain (JSON-serializable) representation."""
+        return {
+            'version': SUMMARY_VERSION,
+            'subject_D': {col: self.subject_D[col].tolist() for col in SUBJECT_COLUMNS},
+            'face_moments': {col: self.face_moments[col].tolist() for col in MOMENT_COLUMNS},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') != SUMMARY_VERSION:
+            raise ValueError(f"Unsupported summary version {data.get('version')}.")
+        subject_D = pd.DataFrame(data['subject_D'], columns=SUBJECT_COLUMNS)
+        moments = pd.DataFrame(data['face_moments'], columns=MOMENT_COLUMNS)
+        return cls(subject_D, moments.set_index('face_id', drop=False).rename_axis(None))
+
+    def save(self, path):
+        """Writes the summary as JSON (.json) or a NumPy archive (.npz)."""
+        if str(path).endswith('.npz'):
+            arrays = {f"subject_D/{col}": _savable(self.subject_D[col]) for col in SUBJECT_COLUMNS}
+            arrays.update({f"face_moments/{col}": _savable(self.face_moments[col]) for col in MOMENT_COLUMNS})
+            np.savez_compressed(path, version=SUMMARY_VERSION, **arrays)
+        else:
+            with open(path, 'w') as f:
+                json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path):
+        """Reads a summary written by save()."""
+        if str(path).endswith('.npz'):
+            with np.load(path, allow_pickle=False) as archive:
+                data = {'version': int(archive['version'])}
+                for table, columns in (('subject_D', SUBJECT_COLUMNS), ('face_moments', MOMENT_COLUMNS)):
+                    data[table] = {col: archive[f"{table}/{col}"].tolist() for col in columns}
+            return cls.from_dict(data)
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def __repr__(self):
+        return (f"<SiteSummary: {len(self.sites)} site(s), "
+                f"{self.subject_D['user_number'].nunique()} subjects, {len(self.face_moments)} faces>")
+
+
+def _moments(subject_D):
+    """Per-face count, mean and sum of squared deviations of D."""
+    grouped = subject_D.groupby('face_id')['D']
+    moments = grouped.agg(n_subjects='count', mean='mean')
+    deviation = subject_D['D'] - subject_D['face_id'].map(moments['mean'])
+    moments['m2'] = (deviation ** 2).groupby(subject_D['face_id']).sum()
+    moments['face_id'] = moments.index
+    return moments[MOMENT_COLUMNS].rename_axis(None)
+
+
+def _combine_moments(a, b):
+    """Chan et al. parallel update of (n, mean, M2) per face."""
+    faces = a.index.union(b.index)
+    a = a.reindex(faces)
+    b = b.reindex(faces)
+    n_a = a['n_subjects'].fillna(0).to_numpy(dtype=float)
+    n_b = b['n_subjects'].fillna(0).to_numpy(dtype=float)
+    mean_a = a['mean'].fillna(0).to_numpy(dtype=float)
+    mean_b = b['mean'].fillna(0).to_numpy(dtype=float)
+    n = n_a + n_b
+    delta = mean_b - mean_a
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = mean_a + delta * np.where(n > 0, n_b / n, 0)
+        m2 = (a['m2'].fillna(0).to_numpy(dtype=float) + b['m2'].fillna(0).to_numpy(dtype=float)
+              + delta ** 2 * np.where(n > 0, n_a * n_b / n, 0))
+    return pd.DataFrame({'face_id': faces, 'n_subjects': n.astype(int), 'mean': mean, 'm2': m2},
+                        index=faces)
+
+
+def _savable(column):
+    values = column.to_numpy()
+    return values.astype(str) if values.dtype == object or not np.issubdtype(values.dtype, np.number) else values
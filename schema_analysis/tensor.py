@@ -0,0 +1,255 @@
+import pandas as pd
+import numpy as np
+from scipy import stats
+from .pairing import TRIAL_VALIDITY_COLUMNS, PAIR_TYPES, PAIR_COLUMNS
+
+AXES = ('subject', 'face', 'tube', 'side', 'direction')
+
+# Order of the side and direction axes
+SIDES = ('left', 'right')
+
+
+class TrialTensor:
+    """
+    Dense subject x face x tube x faceSide x tip_direction representation of trials.
+
+    Every cell of the factorial design holds one end angle. A cell is valid
+    when it holds exactly one trial and that trial is valid, which is the same
+    rule balance_trials applies, so d values, subject means and repeated-
+    measures ANOVA run as array arithmetic with no DataFrame grouping.
+
+    Attributes:
+        angles (np.ndarray): End angles, NaN where the cell is empty or duplicated.
+        valid (np.ndarray): Validity mask, same shape as angles.
+        counts (np.ndarray): Number of trials that fell into each cell.
+        rows (np.ndarray): Row position in the source table, -1 where not single.
+        subjects, faces, tubes (np.ndarray): Coordinates of the first three axes.
+    """
+
+    def __init__(self, angles, valid, counts, rows, subjects, faces, tubes):
+        self.angles = angles
+        self.valid = valid
+        self.counts = counts
+        self.rows = rows
+        self.subjects = np.asarray(subjects)
+        self.faces = np.asarray(faces)
+        self.tubes = np.asarray(tubes)
+
+    @classmethod
+    def from_trials(cls, df, valid_cols=None):
+        """
+        Builds the tensor from a processed trial table.
+
+        Args:
+            df (pd.DataFrame): Trials with end_angle and validity columns.
+            valid_cols (list): Boolean columns that must all be True.
+                Defaults to the TRIAL_VALIDITY_COLUMNS present.
+
+        Returns:
+            TrialTensor
+        """
+        side_code = pd.Categorical(df['faceSide'], categories=SIDES).codes
+        dir_code = pd.Categorical(df['tip_direction'], categories=SIDES).codes
+        subject_code, subjects = pd.factorize(df['user_number'], sort=True)
+        face_code, faces = pd.factorize(df['face_id'], sort=True)
+        tube_code, tubes = pd.factorize(df['tubeTypeIndex'], sort=True)
+
+        in_design = (side_code >= 0) & (dir_code >= 0) & (subject_code >= 0) & (face_code >= 0) & (tube_code >= 0)
+        shape = (len(subjects), len(faces), len(tubes), len(SIDES), len(SIDES))
+        flat = np.ravel_multi_index(
+            (subject_code[in_design], face_code[in_design], tube_code[in_design],
+             side_code[in_design], dir_code[in_design]), shape)
+        positions = np.flatnonzero(in_design)
+
+        if valid_cols is None:
+            valid_cols = [c for c in TRIAL_VALIDITY_COLUMNS if c in df.columns]
+        row_valid = np.ones(len(df), dtype=bool)
+        for col in valid_cols:
+            row_valid &= df[col].fillna(False).astype(bool).to_numpy()
+
+        size = int(np.prod(shape))
+        counts = np.bincount(flat, minlength=size)
+        single = counts[flat] == 1
+
+        angles = np.full(size, np.nan)
+        angles[flat[single]] = df['end_angle'].to_numpy(dtype=float)[positions[single]]
+        valid = np.zeros(size, dtype=bool)
+        valid[flat[single]] = row_valid[positions[single]]
+        rows = np.full(size, -1, dtype=np.int64)
+        rows[flat[single]] = positions[single]
+
+        return cls(angles.reshape(shape), valid.reshape(shape),
+                   counts.astype(np.uint16).reshape(shape), rows.reshape(shape),
+                   np.asarray(subjects), np.asarray(faces).astype(str), np.asarray(tubes))
+
+    @property
+    def shape(self):
+        return self.angles.shape
+
+    def d_values(self):
+        """
+        Returns (d, mask) with shape subject x face x tube x side.
+        d = towards - away for each face side; mask marks cells that form a pair.
+        """
+        side = np.arange(len(SIDES))
+        towards = self.angles[..., side, side]
+        away = self.angles[..., side, 1 - side]
+        mask = self.valid[..., side, side] & self.valid[..., side, 1 - side]
+        return np.where(mask, towards - away, np.nan), mask
+
+    def subject_D(self):
+        """
+        Returns (D, n_pairs) with shape subject x face: the mean d of every
+        subject's pairs per face (NaN where a subject has no pair for a face).
+        """
+        d, mask = self.d_values()
+        n_pairs = mask.sum(axis=(2, 3))
+        with np.errstate(invalid='ignore'):
+            D = np.where(mask, d, 0).sum(axis=(2, 3)) / n_pairs
+        return np.where(n_pairs > 0, D, np.nan), n_pairs
+
+    def face_stats(self):
+        """
+        Per-face one-sample t-test of subject-level D against 0, computed on
+        the subject x face matrix. Returns the calc_stats() columns.
+        """
+        D, n_pairs = self.subject_D()
+        present = n_pairs > 0
+        n = present.sum(axis=0).astype(float)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(present, D, 0).sum(axis=0) / n
+            ss = np.where(present, (D - mean) ** 2, 0).sum(axis=0)
+            std = np.sqrt(ss / (n - 1))
+            sem = std / np.sqrt(n)
+            t_stat = mean / sem
+            p_value = 2 * stats.t.sf(np.abs(t_stat), np.maximum(n - 1, 1))
+        has_spread = n > 1
+        stats_df = pd.DataFrame({
+            'face_id': self.faces,
+            'mean': mean,
+            'std': np.where(has_spread, std, np.nan),
+            'sem': np.where(has_spread, sem, np.nan),
+            'n_subjects': n.astype(int),
+            't_stat': np.where(has_spread, t_stat, np.nan),
+            'p_value': np.where(has_spread, p_value, np.nan),
+        })
+        return stats_df[stats_df['n_subjects'] > 0].reset_index(drop=True)
+
+    def pairs(self):
+        """
+        Returns the pairs as a balance_trials()-style DataFrame (sorted by
+        subject, face, tube, pair type) and the set of source row positions used.
+        """
+        d, mask = self.d_values()
+        s, f, t, side = np.nonzero(mask)
+        pairs_df = pd.DataFrame({
+            'user_number': self.subjects[s],
+            'face_id': self.faces[f],
+            'tubeTypeIndex': self.tubes[t],
+            'pair_type': np.array([PAIR_TYPES[x] for x in SIDES])[side],
+            'd': d[s, f, t, side],
+        }, columns=PAIR_COLUMNS)
+        used = np.concatenate([self.rows[s, f, t, side, side], self.rows[s, f, t, side, 1 - side]])
+        return pairs_df, set(used.tolist())
+
+    def rm_anova(self, factors=('face', 'tube'), faces=None):
+        """
+        Repeated-measures ANOVA of d across face and/or tube.
+
+        d is averaged over face sides into subject x face x tube cell means;
+        only subjects with every cell of the analyzed factors are used.
+
+        Args:
+            factors (tuple): ('face', 'tube'), ('face',) or ('tube',).
+                A factor left out is averaged over the cells a subject has.
+            faces (list): Restrict to these faces (e.g. faces seen by the same subjects).
+
+        Returns:
+            pd.DataFrame: One row per effect with SS, df, MS, F, p_value and n_subjects.
+        """
+        if not factors or any(f not in ('face', 'tube') for f in factors):
+            raise ValueError("factors must be ('face', 'tube'), ('face',) or ('tube',).")
+
+        d, mask = self.d_values()
+        if faces is not None:
+            keep = np.isin(self.faces, faces)
+            d, mask = d[:, keep], mask[:, keep]
+
+        # Subject x face x tube cell means over the two face sides
+        n_side = mask.sum(axis=3)
+        with np.errstate(invalid='ignore'):
+            cells = np.where(mask, d, 0).sum(axis=3) / n_side
+        cell_ok = n_side > 0
+        if 'face' not in factors:
+            cells, cell_ok = _mean_over(cells, cell_ok, axis=1)
+        if 'tube' not in factors:
+            cells, cell_ok = _mean_over(cells, cell_ok, axis=2)
+
+        complete = cell_ok.all(axis=(1, 2))
+        Y = cells[complete]
+        if len(Y) < 2:
+            raise ValueError(f"Repeated-measures ANOVA needs at least 2 subjects with every cell; found {len(Y)}.")
+        return _two_way_rm_anova(Y, factors)
+
+    def save(self, path):
+        """Writes the tensor and its coordinates to a compressed .npz file."""
+        np.savez_compressed(path, angles=self.angles, valid=self.valid, counts=self.counts,
+                            rows=self.rows, subjects=_savable(self.subjects),
+                            faces=_savable(self.faces), tubes=_savable(self.tubes))
+
+    @classmethod
+    def load(cls, path):
+        """Reads a tensor written by save()."""
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['angles'], data['valid'], data['counts'], data['rows'],
+                       data['subjects'], data['faces'], data['tubes'])
+
+    def __repr__(self):
+        dims = ' x '.join(f"{n} {a}" for n, a in zip(self.shape, AXES))
+        return f"<TrialTensor: {dims}>"
+
+
+def _savable(coords):
+    # Object arrays would need pickling; store them as fixed-width strings
+    return coords.astype(str) if coords.dtype == object else coords
+
+
+def _mean_over(values, ok, axis):
+    n = ok.sum(axis=axis, keepdims=True)
+    with np.errstate(invalid='ignore'):
+        mean = np.where(ok, values, 0).sum(axis=axis, keepdims=True) / n
+    return mean, n > 0
+
+
+def _two_way_rm_anova(Y, factors):
+    """SS decomposition of a subject x A x B array (B or A may have one level)."""
+    n, a, b = Y.shape
+    grand = Y.mean()
+    m_s = Y.mean(axis=(1, 2))
+    m_a = Y.mean(axis=(0, 2))
+    m_b = Y.mean(axis=(0, 1))
+    m_ab = Y.mean(axis=0)
+    m_sa = Y.mean(axis=2)
+    m_sb = Y.mean(axis=1)
+
+    ss_a = n * b * ((m_a - grand) ** 2).sum()
+    ss_b = n * a * ((m_b - grand) ** 2).sum()
+    ss_ab = n * ((m_ab - m_a[:, None] - m_b[None, :] + grand) ** 2).sum()
+    ss_as = b * ((m_sa - m_s[:, None] - m_a[None, :] + grand) ** 2).sum()
+    ss_bs = a * ((m_sb - m_s[:, None] - m_b[None, :] + grand) ** 2).sum()
+    resid = (Y - m_sa[:, :, None] - m_sb[:, None, :] - m_ab[None] + m_s[:, None, None]
+             + m_a[None, :, None] + m_b[None, None, :] - grand)
+    ss_abs = (resid ** 2).sum()
+
+    effects = [('face', ss_a, a - 1, ss_as, (a - 1) * (n - 1)),
+               ('tube', ss_b, b - 1, ss_bs, (b - 1) * (n - 1)),
+               ('face:tube', ss_ab, (a - 1) * (b - 1), ss_abs, (a - 1) * (b - 1) * (n - 1))]
+    rows = []
+    for name, ss, df, ss_err, df_err in effects:
+        if df == 0:
+            continue
+        ms, ms_err = ss / df, ss_err / df_err
+        f_stat = ms / ms_err if ms_err > 0 else np.nan
+        rows.append({'effect': name, 'SS': ss, 'df': df, 'MS': ms, 'SS_error': ss_err, 'df_error': df_err,
+                     'F': f_stat, 'p_value': stats.f.sf(f_stat, df, df_err), 'n_subjects': n})
+    return pd.DataFrame(rows)
@@ -1,7 +1,17 @@
 import pandas as pd
-import numpy as np
-from scipy import stats
 from . import processing
+from . import cube
+from . import influence
+from . import correlation
+from . import learning
+from . import regression
+from . import mixed_model
+from . import rank_tests as rank_test_engine
+from . import bayes
+from .pairing import PairIndex
+from .tensor import TrialTensor
+from .summary import SiteSummary
+from .shared import SharedTrialTable
 
 class TubeTrials:
     def __init__(self, data):
@@ -17,7 +27,23 @@ class TubeTrials:
             self.df = data.copy()
         else:
             raise ValueError("Data must be a file path or pandas DataFrame")
+        self._pair_index = None
+        self._pair_index_key = None
+        if 'session_group' in self.df.columns:
+            processing.set_exclusion_flag(self.df, 'session_group', self.df['session_group'].isna())
             
+    @classmethod
+    def wrap(cls, df):
+        """
+        TubeTrials over an existing DataFrame without copying it or re-deriving
+        any columns (e.g. a view of shared memory, see shared.SharedTrialTable).
+        """
+        trials = cls.__new__(cls)
+        trials.df = df
+        trials._pair_index = None
+        trials._pair_index_key = None
+        return trials
+
     def process_angles(self):
         """
         Renames face IDs and calculates end_angle.
@@ -25,6 +51,7 @@ class TubeTrials:
         """
         self.df = processing.rename_face_ids(self.df)
         self.df = processing.transform_angles(self.df)
+        self._pair_index = None
         print(f"Processed {len(self.df)} trials, calculated end_angle for all.")
         
     def mark_valid_angles(self, min_angle=3, max_angle=40):
@@ -34,21 +61,57 @@ class TubeTrials:
         """
         # processing.validate_angles adds 'angle_valid' column
         self.df = processing.validate_angles(self.df, min_angle, max_angle)
+        processing.set_exclusion_flag(self.df, 'angle', ~self.df['angle_valid'])
+        self._pair_index = None
         n_valid = self.df['angle_valid'].sum()
         n_total = len(self.df)
         pct_valid = (n_valid / n_total * 100) if n_total > 0 else 0
         print(f"Marked angles: {n_valid}/{n_total} valid ({pct_valid:.1f}%), {n_total - n_valid} invalid ({100 - pct_valid:.1f}%)")
         
-    def mark_valid_subjects(self, max_invalid_trials=2):
+    def mark_valid_latencies(self, method='mad', threshold=3.5, upper_pct=99):
+        """
+        Marks slow latency outliers (e.g. inattentive trials lasting minutes).
+        Adds column: 'latency_valid' (bool)
+        Optional; outliers are left out of pairing. They only exclude a subject
+        when mark_valid_subjects() is given max_latency_outliers.
+
+        Args:
+            method (str): 'mad' (robust z-score of log latency against the
+                subject's median/MAD) or 'percentile' (slower than the
+                upper_pct percentile of all trials).
+            threshold (float): Robust z-score cut-off for 'mad'.
+            upper_pct (float): Percentile cutoff for 'percentile'.
+        """
+        if 'latency' not in self.df.columns:
+            raise ValueError("Missing column 'latency'.")
+
+        self.df = processing.flag_latency_outliers(self.df, method, threshold, upper_pct)
+        processing.set_exclusion_flag(self.df, 'latency', ~self.df['latency_valid'])
+        self._pair_index = None
+        n_outliers = (~self.df['latency_valid']).sum()
+        n_total = len(self.df)
+        pct_outliers = (n_outliers / n_total * 100) if n_total > 0 else 0
+        print(f"Marked latencies ({method}): {n_outliers}/{n_total} outliers ({pct_outliers:.1f}%)")
+
+    def mark_valid_subjects(self, max_invalid_trials=2, max_latency_outliers=None):
         """
         Marks subjects as valid/invalid based on invalid trials.
         Adds column: 'subject_valid' (bool)
+
+        Args:
+            max_invalid_trials (int): Trials breaking the angle rule a subject may have.
+            max_latency_outliers (int): Latency outliers a subject may have, counted
+                separately (needs mark_valid_latencies()). None: latency outliers
+                never exclude a subject.
         """
         if 'angle_valid' not in self.df.columns:
             raise ValueError("Run mark_valid_angles() first.")
+        if max_latency_outliers is not None and 'latency_valid' not in self.df.columns:
+            raise ValueError("Run mark_valid_latencies() first.")
             
-        bad_subjects = processing.identify_bad_subjects(self.df, max_invalid_trials)
+        bad_subjects = processing.identify_bad_subjects(self.df, max_invalid_trials, max_latency_outliers)
         self.df['subject_valid'] = ~self.df['user_number'].isin(bad_subjects)
+        processing.set_exclusion_flag(self.df, 'subject', ~self.df['subject_valid'])
         
         n_excluded_subjects = len(bad_subjects)
         n_total_subjects = self.df['user_number'].nunique()
@@ -66,7 +129,8 @@ class TubeTrials:
         Returns a NEW TubeTrials instance with a subset of data.
         
         Args:
-            valid_only (bool): If True, filters by angle_valid=True and is_excluded_subject=False.
+            valid_only (bool): If True, filters by angle_valid=True and is_excluded_subject=False
+                (and latency_valid=True when latency outliers were marked).
             query (str): Pandas query string.
         """
         new_df = self.df.copy()
@@ -74,6 +138,8 @@ class TubeTrials:
         if valid_only:
             if 'angle_valid' in new_df.columns:
                 new_df = new_df[new_df['angle_valid']]
+            if 'latency_valid' in new_df.columns:
+                new_df = new_df[new_df['latency_valid']]
             if 'subject_valid' in new_df.columns:
                 new_df = new_df[new_df['subject_valid']]
                 
@@ -82,34 +148,68 @@ class TubeTrials:
             
         return TubeTrials(new_df)
         
-    def calc_d_values(self):
+    @property
+    def pair_index(self):
         """
-        Calculates d values for pairs.
-        Returns a pandas DataFrame of pairs.
+        PairIndex of towards/away candidates for this data.
+        Built on first use and shared by calc_d_values() and get_unmatched_trials();
+        rebuilt whenever the pairing columns, validity columns or rows of df
+        change, including direct edits to df (see PairIndex.source_key).
         """
         # Ensure necessary columns exist
         required_cols = ['end_angle', 'angle_valid']
         for col in required_cols:
             if col not in self.df.columns:
                 raise ValueError(f"Missing column '{col}'. Run process_angles() and mark_valid_angles() first.")
-                
-        results_df, _ = processing.balance_trials(self.df)
-        return results_df
+
+        # Rebuilt whenever the columns it reads changed, however df was edited
+        key = PairIndex.source_key(self.df)
+        if self._pair_index is None or self._pair_index_key != key:
+            self._pair_index = PairIndex.from_trials(self.df)
+            self._pair_index_key = key
+        return self._pair_index
+
+    def calc_d_values(self):
+        """
+        Calculates d values for pairs.
+        Returns a pandas DataFrame of pairs.
+        """
+        return self.pair_index.pairs()
 
     def get_unmatched_trials(self):
         """
         Returns a DataFrame of trials that were valid but not part of a pair.
         """
-        # Ensure necessary columns exist
-        required_cols = ['end_angle', 'angle_valid']
-        for col in required_cols:
-            if col not in self.df.columns:
-                raise ValueError(f"Missing column '{col}'. Run process_angles() and mark_valid_angles() first.")
-                
-        _, used_indices = processing.balance_trials(self.df)
-        unmatched_mask = ~self.df.index.isin(used_indices)
-        return self.df[unmatched_mask]
-    
+        return self.df[self.pair_index.unmatched_mask()]
+
+    def mark_unpaired(self):
+        """
+        Flags usable trials (valid trial of a valid subject) that have no
+        partner in balance_trials, completing the 'exclusion_flags' audit.
+        Run after mark_valid_subjects().
+        Adds/updates column: 'exclusion_flags' (see processing.EXCLUSION_REASONS)
+        """
+        if 'subject_valid' not in self.df.columns:
+            raise ValueError("Run mark_valid_subjects() first.")
+
+        # Pair within the trials select(valid_only=True) keeps, so invalid
+        # duplicates in a cell cannot block pairs calc_d_values() uses
+        clean = self.select(valid_only=True)
+        usable = self.df.index.isin(clean.df.index)
+        paired = self.df.index.isin(list(clean.pair_index.used_indices))
+        unpaired = usable & ~paired
+        processing.set_exclusion_flag(self.df, 'unpaired', unpaired)
+        print(f"Marked unpaired: {unpaired.sum()}/{usable.sum()} usable trials have no partner")
+
+    def exclusion_summary(self, by=None):
+        """
+        Counts excluded trials per reason (see processing.exclusion_summary).
+
+        Args:
+            by (str or list): None (overall), 'user_number', 'face_id' or a list.
+        """
+        return processing.exclusion_summary(self.df, by=by)
+
     def get_vector(self, field):
         """
         Returns a numpy array of values for a specific field.
@@ -132,14 +232,7 @@ class TubeTrials:
         Calculates 'Big D' (average of 'd' values) per subject per face.
         Returns a DataFrame with columns: user_number, face_id, D
         """
-        pairs_df = self.calc_d_values()
-        if pairs_df.empty:
-            return pd.DataFrame(columns=['user_number', 'face_id', 'D'])
-            
-        # Group by user and face, calculate mean of 'd'
-        subject_D = pairs_df.groupby(['user_number', 'face_id'])['d'].mean().reset_index()
-        subject_D.rename(columns={'d': 'D'}, inplace=True)
-        return subject_D
+        return processing.calc_subject_D(self.calc_d_values())
 
     def get_validity_stats(self):
         """
@@ -159,53 +252,164 @@ class TubeTrials:
         n_angle_valid = self.df['angle_valid'].sum()
         n_subject_valid = self.df['subject_valid'].sum()
         
-        # Valid angle AND Valid subject
-        n_fully_valid = len(self.df[self.df['angle_valid'] & self.df['subject_valid']])
+        # Valid trial (angle, and latency if marked) AND Valid subject
+        n_fully_valid = len(self.df[processing.trial_validity(self.df) & self.df['subject_valid']])
         
         print("\n--- Pre-Balancing Validity Stats ---")
         print(f"Total Trials: {n_total}")
         print(f"Angle Valid: {n_angle_valid} ({n_angle_valid/n_total*100:.1f}%)")
+        if 'latency_valid' in self.df.columns:
+            n_latency_valid = self.df['latency_valid'].sum()
+            print(f"Latency Valid: {n_latency_valid} ({n_latency_valid/n_total*100:.1f}%)")
         print(f"Subject Valid (Trials): {n_subject_valid} ({n_subject_valid/n_total*100:.1f}%)")
-        print(f"Fully Valid (Angle & Subject): {n_fully_valid} ({n_fully_valid/n_total*100:.1f}%)")
+        print(f"Fully Valid (Trial & Subject): {n_fully_valid} ({n_fully_valid/n_total*100:.1f}%)")
         
-    def calc_stats(self):
+    def calc_stats(self, rank_tests=False, bayes_factor=False):
         """
         Calculates statistics for D values grouped by FaceID.
         Performs a one-sample t-test against 0 for each face,
         using the subject-level average D values.
+
+        Args:
+            rank_tests (bool): Also report the Wilcoxon signed-rank test and the
+                Yuen 20% trimmed-mean test (columns wilcoxon_W, wilcoxon_p,
+                trimmed_mean, yuen_t, yuen_p; see rank_tests.rank_test_summary).
+            bayes_factor (bool): Also report the JZS Bayes factor BF10 of each
+                t-test (column bf10; < 1/3 is moderate evidence for the null).
+
         Returns a DataFrame with stats.
         """
-        subject_D_df = self.calc_subject_D()
-        
-        if subject_D_df.empty:
-            return pd.DataFrame()
-            
-        stats_results = []
-        for face_id in subject_D_df['face_id'].unique():
-            face_data = subject_D_df[subject_D_df['face_id'] == face_id]['D']
-            if len(face_data) > 1:
-                t_stat, p_val = stats.ttest_1samp(face_data, 0)
-                stats_results.append({
-                    'face_id': face_id,
-                    'mean': face_data.mean(),
-                    'std': face_data.std(),
-                    'sem': face_data.sem(),
-                    'n_subjects': len(face_data),
-                    't_stat': t_stat,
-                    'p_value': p_val
-                })
-            else:
-                 stats_results.append({
-                    'face_id': face_id,
-                    'mean': face_data.mean() if len(face_data) > 0 else np.nan,
-                    'std': np.nan,
-                    'sem': np.nan,
-                    'n_subjects': len(face_data),
-                    't_stat': np.nan,
-                    'p_value': np.nan
-                })
-                
-        return pd.DataFrame(stats_results)
+        subject_D = self.calc_subject_D()
+        stats_df = processing.calc_face_stats(subject_D)
+        if rank_tests and not stats_df.empty:
+            stats_df = stats_df.merge(rank_test_engine.rank_test_summary(subject_D, ['face_id']),
+                                      on='face_id', how='left')
+        if bayes_factor and not stats_df.empty:
+            stats_df = bayes.add_bayes_factors(stats_df)
+        return stats_df
+
+    def calc_jackknife(self, alpha=0.05):
+        """
+        Leave-one-subject-out influence analysis for the per-face t-test.
+        For every subject, reports the face's mean, t and p with that subject
+        removed, ranked by how much the removal moves t.
+        Returns a DataFrame (see influence.jackknife_subject_D).
+        """
+        return influence.jackknife_subject_D(self.calc_subject_D(), alpha=alpha)
+
+    def calc_face_correlations(self, n_boot=0, alpha=0.05, seed=0):
+        """
+        Correlation of subject-level D between every pair of faces, over the
+        subjects measured on both, with sign agreement and optional bootstrap CIs.
+        Returns a DataFrame (see correlation.face_correlations).
+        """
+        return correlation.face_correlations(self.calc_subject_D(), n_boot=n_boot, alpha=alpha, seed=seed)
+
+    def calc_rolling_D(self, window=4):
+        """
+        Rolling and cumulative d per subject and face, ordered by trialIndex.
+        Returns a DataFrame (see learning.rolling_D_stats).
+        """
+        return learning.rolling_D_stats(self.pair_index.pair_rows(), self.df, window=window)
+
+    def calc_rolling_angles(self, window=8):
+        """
+        Rolling and cumulative end angle per subject, face and towards/away
+        direction, ordered by trialIndex, over the valid trials.
+        Returns a DataFrame (see learning.rolling_angle_stats).
+        """
+        if 'end_angle' not in self.df.columns:
+            raise ValueError("Missing column 'end_angle'. Run process_angles() first.")
+        return learning.rolling_angle_stats(self.df, window=window)
+
+    def calc_block_stats(self, n_blocks=2):
+        """
+        Early/late block comparison of D and paired end angles, including a
+        paired test of the change in D from the first to the last block.
+        Returns a DataFrame (see learning.block_stats).
+        """
+        return learning.block_stats(self.pair_index.pair_rows(), self.df, n_blocks=n_blocks)
+
+    def calc_subject_models(self):
+        """
+        Per-subject, per-face least-squares fit of end_angle on tube type,
+        face side and towards/away, over the valid trials, solved as one batch.
+        Returns a DataFrame with one row per subject, face and term
+        (see regression.fit_subject_models).
+        """
+        if 'end_angle' not in self.df.columns:
+            raise ValueError("Missing column 'end_angle'. Run process_angles() first.")
+        return regression.fit_subject_models(self.df[processing.trial_validity(self.df)])
+
+    def calc_model_stats(self):
+        """
+        Per-face one-sample t-test of each model term's subject-level coefficients
+        against 0, in the calc_stats() format with an extra 'term' column.
+        """
+        return regression.coefficient_stats(self.calc_subject_models())
+
+    def calc_mixed_model(self, factors=None):
+        """
+        Pair-level linear mixed model: d ~ face + tube + pair type with a random
+        intercept per subject, fitted by REML on sparse matrices. Unlike
+        calc_stats(), every pair counts, so subjects with more pairs weigh more
+        (to the extent the subject variance allows).
+        Returns a MixedModelFit (see mixed_model.fit_mixed_model); its
+        face_effects() are the per-face tests.
+        """
+        if factors is None:
+            factors = mixed_model.MIXED_FACTORS
+        return mixed_model.fit_mixed_model(self.calc_d_values(), factors=factors)
+
+    def calc_stats_cube(self, dimensions=None, grouping_sets=None, rank_tests=False, bayes_factor=False):
+        """
+        Calculates subject-level D and the per-face t-test summary for every
+        combination of breakdown dimensions in a single grouped pass.
+
+        Args:
+            dimensions (list): Dimensions to combine. Defaults to
+                tubeTypeIndex, pair_type, sightType and session_group (those present).
+            grouping_sets (list): Explicit list of dimension combinations. Overrides `dimensions`.
+            rank_tests (bool): Add the Wilcoxon and Yuen columns of calc_stats(rank_tests=True).
+            bayes_factor (bool): Add the bf10 column of calc_stats(bayes_factor=True).
+
+        Returns:
+            pd.DataFrame: Long-format table, one row per grouping/face/slice.
+            The 'face_id' grouping reproduces calc_stats().
+        """
+        pairs_df = cube.attach_subject_attributes(self.calc_d_values(), self.df)
+        if dimensions is None:
+            dimensions = cube.CUBE_DIMENSIONS
+        return cube.calc_stats_cube(pairs_df, grouping_sets=grouping_sets,
+                                    dimensions=[d for d in dimensions if d in pairs_df.columns],
+                                    rank_tests=rank_tests, bayes_factor=bayes_factor)
+
+    def to_tensor(self):
+        """
+        Returns the trials as a dense TrialTensor
+        (subject x face x tube x faceSide x tip_direction), e.g. for rm_anova().
+        Invalid trials are kept in the tensor but masked out of pairs.
+        """
+        if 'end_angle' not in self.df.columns:
+            raise ValueError("Missing column 'end_angle'. Run process_angles() first.")
+        return TrialTensor.from_trials(self.df)
+
+    def summarize(self, site):
+        """
+        Returns a mergeable SiteSummary (per-subject D and per-face moments) for
+        pooling with other sites without sharing trials. Call on the clean trials
+        (after select(valid_only=True)), like calc_stats().
+        """
+        return SiteSummary.from_trials(self, site)
+
+    def share(self):
+        """
+        Publishes the trials in shared memory for process-pool workers.
+        Returns a SharedTrialTable; pass its `handle` to the workers, which call
+        shared.attach_trials(handle). Use it as a context manager so the
+        segments are freed.
+        """
+        return SharedTrialTable.publish(self)
 
     def __len__(self):
         return len(self.df)
@@ -2,11 +2,16 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
 from scipy import stats as sp_stats
+from .sketches import HistogramSketch
 
-def plot_results(results, stats_df):
+def plot_results(results, stats_df, sketch=None):
     """
     Generates per-face D-value distributions and summary statistics plots.
     Includes Overview and Zoomed views with significance thresholds.
+
+    Axis limits and histogram bins come from a HistogramSketch of d by face_id
+    (bin width 2 degrees), built in one pass over `results` unless given,
+    e.g. merged from sketches of several runs.
     """
     if stats_df.empty:
         print("No valid data to visualize.")
@@ -19,31 +24,23 @@ def plot_results(results, stats_df):
     sns.set_theme(style="whitegrid", palette="muted")
     
     # --- 1. Calculate Global Limits for Standardization ---
+    bin_width = 2 # Fixed bin width in degrees
+    if sketch is None:
+        sketch = HistogramSketch('d', by=['face_id'], bin_width=bin_width).update(results)
+    bin_width = sketch.bin_width
     
     # Global X limits
-    all_d = results['d']
-    min_d, max_d = all_d.min(), all_d.max()
+    min_d, max_d = sketch.range()
     # Add 10% padding
     x_range = max_d - min_d
     x_min_global = min_d - (x_range * 0.1)
     x_max_global = max_d + (x_range * 0.1)
     
-    # Global Y limits (Max Frequency)
-    # We need to compute histograms to find the max frequency peak across all faces
-    max_freq_global = 0
-    bin_width = 2 # Fixed bin width in degrees
+    # Shared bin edges, aligned with the sketch bins, so bar heights match the y limit
+    bins = np.arange(np.floor(min_d / bin_width), np.floor(max_d / bin_width) + 2) * bin_width
     
-    for face_id in unique_faces:
-        face_data = results[results['face_id'] == face_id]['d']
-        if len(face_data) > 0:
-            # Calculate histogram bins using numpy to find max counts
-            # Create bins covering the range
-            bins = np.arange(np.floor(face_data.min()), np.ceil(face_data.max()) + bin_width, bin_width)
-            counts, _ = np.histogram(face_data, bins=bins)
-            current_max = counts.max() if len(counts) > 0 else 0
-            if current_max > max_freq_global:
-                max_freq_global = current_max
-                
+    # Global Y limits (Max Frequency): highest bin over all faces
+    max_freq_global = sketch.max_count()
     y_max_global = max_freq_global * 1.1 # Add 10% padding
     
     print(f"Global Standardization: X range [{x_min_global:.1f}, {x_max_global:.1f}], Y max {y_max_global:.1f}, Bin Width {bin_width}")
@@ -114,7 +111,7 @@ def plot_results(results, stats_df):
 
         # Plot Histogram
         # Use fixed binwidth to ensure bars represent same "amount" of degrees across plots
-        sns.histplot(face_data, kde=True, ax=ax, color='skyblue', alpha=0.6, binwidth=bin_width)
+        sns.histplot(face_data, kde=True, ax=ax, color='skyblue', alpha=0.6, bins=bins)
         
         # Standardize Axes
         ax.set_xlim(x_min_global, x_max_global)
@@ -153,7 +150,7 @@ def plot_results(results, stats_df):
         face_stats = stats_df[stats_df['face_id'] == face_id].iloc[0]
         
         # Plot Histogram (Zoomed)
-        sns.histplot(face_data, kde=True, ax=ax, color='skyblue', alpha=0.4, binwidth=bin_width)
+        sns.histplot(face_data, kde=True, ax=ax, color='skyblue', alpha=0.4, bins=bins)
         
         # Standardize Axes (Y only, X is zoomed)
         ax.set_ylim(0, y_max_global)
@@ -189,7 +186,7 @@ def plot_results(results, stats_df):
         face_stats = stats_df[stats_df['face_id'] == face_id].iloc[0]
         
         # Plot Histogram
-        sns.histplot(face_data, kde=True, ax=ax, color='skyblue', alpha=0.4, binwidth=bin_width)
+        sns.histplot(face_data, kde=True, ax=ax, color='skyblue', alpha=0.4, bins=bins)
         
         # Standardize Axes
         ax.set_ylim(0, y_max_global)
@@ -236,3 +233,144 @@ def plot_results(results, stats_df):
     
     plt.tight_layout()
     plt.show()
+
+
+def plot_learning(rolling_D, block_df):
+    """
+    Plots how D develops over a session.
+    Left: mean cumulative D across subjects by pair position within the face
+    (±SEM), from the cumulative_D of learning.rolling_D_stats().
+    Right: block D per face (±SEM), from learning.block_stats().
+    """
+    if rolling_D.empty or block_df.empty:
+        print("No valid data to visualize.")
+        return
+
+    sns.set_theme(style="whitegrid", palette="muted")
+    fig, axes = plt.subplots(1, 2, figsize=(16, 6))
+
+    for face_id, face_data in rolling_D.groupby('face_id'):
+        curve = face_data.groupby('pair_number')['cumulative_D'].agg(['mean', 'sem'])
+        axes[0].plot(curve.index, curve['mean'], marker='o', label=f"Face {face_id}")
+        axes[0].fill_between(curve.index, curve['mean'] - curve['sem'].fillna(0),
+                             curve['mean'] + curve['sem'].fillna(0), alpha=0.2)
+    axes[0].axhline(0, color='black', linewidth=1)
+    axes[0].set_title('Cumulative D over the Session (±SEM)', fontweight='bold', fontsize=14)
+    axes[0].set_xlabel('Pair number (trial order)')
+    axes[0].set_ylabel('Cumulative D (degrees)')
+    axes[0].legend()
+
+    block_D = block_df[block_df['measure'] == 'D']
+    faces = sorted(block_D['face_id'].unique())
+    blocks = sorted(block_D['block'].unique())
+    width = 0.8 / len(blocks)
+    for i, block in enumerate(blocks):
+        data = block_D[block_D['block'] == block].set_index('face_id').reindex(faces)
+        axes[1].bar(np.arange(len(faces)) + i * width, data['mean'], width=width,
+                    yerr=data['sem'].fillna(0), capsize=5, alpha=0.7, label=f"Block {block}")
+    axes[1].set_xticks(np.arange(len(faces)) + width * (len(blocks) - 1) / 2)
+    axes[1].set_xticklabels(faces)
+    axes[1].axhline(0, color='black', linewidth=1)
+    axes[1].set_title('Mean D per Block (±SEM)', fontweight='bold', fontsize=14)
+    axes[1].set_ylabel('D-value (degrees)')
+    axes[1].legend()
+
+    plt.tight_layout()
+    plt.show()
+
+
+def plot_subject_qc(subject_df, subject_cells, subject_D, group, output_path, min_angle=3, max_angle=43):
+    """
+    Draws one subject's QC page and saves it to output_path.
+    Uses a standalone Figure (no pyplot state), so it renders headless and is
+    safe to call from worker processes.
+
+    Panels: end angle per face/tube/direction against the group median,
+    end angle in trial order (invalid and unmatched trials marked), pairing
+    outcome of every cell against the group average, and latency in trial order.
+    """
+    user = subject_df['user_number'].iloc[0]
+    trials = subject_df.sort_values('trialIndex')
+    valid = trials['trial_valid'].to_numpy()
+    paired = trials['paired'].to_numpy()
+
+    fig = plt.Figure(figsize=(16, 10))
+    axes = fig.subplots(2, 2)
+
+    # --- 1. End angle per condition ---
+    ax = axes[0, 0]
+    # Trials missing a face or tube have no condition and are only drawn in trial order
+    keyed = trials.dropna(subset=['face_id', 'tubeTypeIndex'])
+    conditions = keyed[['face_id', 'tubeTypeIndex']].drop_duplicates().sort_values(['face_id', 'tubeTypeIndex'])
+    positions = {tuple(c): i for i, c in enumerate(conditions.itertuples(index=False))}
+    for direction, offset, color in (('towards', -0.15, 'teal'), ('away', 0.15, 'darkorange')):
+        rows = keyed[keyed['towards_away'] == direction]
+        x = np.array([positions[(f, t)] for f, t in zip(rows['face_id'], rows['tubeTypeIndex'])]) + offset
+        ok = rows['trial_valid'].to_numpy()
+        ax.scatter(x[ok], rows['end_angle'][ok], color=color, label=direction.capitalize())
+        ax.scatter(x[~ok], rows['end_angle'][~ok], color='red', marker='x')
+        for (f, t), pos in positions.items():
+            median = group['angle_median'].get((f, t, direction), np.nan)
+            ax.hlines(median, pos + offset - 0.12, pos + offset + 0.12, color='grey', linewidth=2)
+    ax.axhspan(min_angle, max_angle, color='green', alpha=0.06, label='Valid range')
+    ax.set_xticks(range(len(positions)))
+    ax.set_xticklabels([f"{f}\ntube {t}" for f, t in positions], fontsize='small')
+    ax.set_ylabel('End angle (degrees)')
+    ax.set_title('End Angle per Condition (grey: group median, x: invalid)', fontweight='bold')
+    ax.legend(fontsize='small')
+
+    # --- 2. Trial order ---
+    ax = axes[0, 1]
+    order = trials['trialIndex'].to_numpy()
+    angle = trials['end_angle'].to_numpy()
+    ax.scatter(order[valid & paired], angle[valid & paired], color='teal', label='Paired')
+    ax.scatter(order[valid & ~paired], angle[valid & ~paired], facecolors='none', edgecolors='teal', label='Unmatched')
+    ax.scatter(order[~valid], angle[~valid], color='red', marker='x', label='Invalid')
+    ax.axhline(min_angle, color='green', linestyle=':')
+    ax.axhline(max_angle, color='green', linestyle=':')
+    ax.set_xlabel('Trial index')
+    ax.set_ylabel('End angle (degrees)')
+    ax.set_title('Trials in Order', fontweight='bold')
+    ax.legend(fontsize='small')
+
+    # --- 3. Pairing outcome of every cell ---
+    ax = axes[1, 0]
+    reasons = group['reasons_per_subject'].index
+    counts = subject_cells['reason'].value_counts().reindex(reasons, fill_value=0)
+    x = np.arange(len(reasons))
+    ax.bar(x - 0.2, counts, width=0.4, color='teal', label='Subject')
+    ax.bar(x + 0.2, group['reasons_per_subject'], width=0.4, color='grey', alpha=0.6, label='Group mean')
+    ax.set_xticks(x)
+    ax.set_xticklabels(reasons, rotation=30, ha='right', fontsize='small')
+    ax.set_ylabel('Cells')
+    ax.set_title('Cell Pairing Outcome', fontweight='bold')
+    ax.legend(fontsize='small')
+
+    # --- 4. Latency ---
+    ax = axes[1, 1]
+    if 'latency' in trials.columns:
+        latency = trials['latency'].to_numpy(dtype=float)
+        outlier = ~trials['latency_valid'].to_numpy() if 'latency_valid' in trials.columns else np.zeros(len(trials), bool)
+        ax.scatter(order[~outlier], latency[~outlier], color='teal', label='Latency')
+        ax.scatter(order[outlier], latency[outlier], color='red', marker='x', label='Outlier')
+        ax.axhline(group['latency_median'], color='grey', linestyle='--', label='Group median')
+        if np.nanmin(latency) > 0:
+            ax.set_yscale('log')
+        ax.legend(fontsize='small')
+    ax.set_xlabel('Trial index')
+    ax.set_ylabel('Latency')
+    ax.set_title('Latency in Order', fontweight='bold')
+
+    # --- Header ---
+    header = f"Subject {user}"
+    for col in ('session_group', 'sightType'):
+        if col in trials.columns:
+            header += f" | {col}: {trials[col].iloc[0]}"
+    header += f" | valid trials: {valid.sum()}/{len(trials)} | pairs: {int(paired.sum()) // 2}"
+    if 'subject_valid' in trials.columns:
+        header += " | EXCLUDED" if not trials['subject_valid'].iloc[0] else " | included"
+    D_text = ', '.join(f"{f}: D={d:.2f}" for f, d in zip(subject_D['face_id'], subject_D['D']))
+    fig.suptitle(f"{header}\n{D_text or 'no pairs'}", fontweight='bold', fontsize=13)
+
+    fig.tight_layout()
+    fig.savefig(output_path, dpi=80)
@@ -6,7 +6,7 @@ This script processes experimental data through a standardized pipeline:
 1. Load & Merge: Combine all CSV files from data/raw/
 2. Clean: Remove rows with missing group_id
 3. Preprocess: Rename faces, transform angles
-4. Filter: Angle rule (3-43°), subject exclusion (>2 invalid)
+4. Filter: Angle rule (3-43°), optional latency outliers, subject exclusion (>2 invalid)
 5. Balance: Remove unmatched trials
 6. Analyze: Calculate D-values and statistics
 
@@ -18,12 +18,15 @@ import os
 import pandas as pd
 from schema_analysis.data_loader import load_and_merge_csvs
 from schema_analysis import TubeTrials
+from schema_analysis.export import export_results
 
 # Configuration
 DATA_DIR = os.path.join('data', 'raw')
 MIN_ANGLE = 3
 MAX_ANGLE = 43
 MAX_INVALID_TRIALS = 2
+LATENCY_OUTLIER_METHOD = None  # None (off), 'mad' or 'percentile'
+OUTPUT_FORMAT = 'csv'  # 'csv', 'parquet' or 'arrow' (partitioned by face_id, needs pyarrow)
 
 def main():
     print("=" * 70)
@@ -58,8 +61,12 @@ def main():
     print(f"  Applying angle rule: {MIN_ANGLE} < end_angle < {MAX_ANGLE}")
     trials.mark_valid_angles(min_angle=MIN_ANGLE, max_angle=MAX_ANGLE)
     
+    if LATENCY_OUTLIER_METHOD:
+        print(f"  Marking slow latency outliers ({LATENCY_OUTLIER_METHOD})...")
+        trials.mark_valid_latencies(method=LATENCY_OUTLIER_METHOD)
+    
     print(f"  Excluding subjects with >{MAX_INVALID_TRIALS} invalid trials...")
-    trials.mark_bad_subjects(max_invalid_trials=MAX_INVALID_TRIALS)
+    trials.mark_valid_subjects(max_invalid_trials=MAX_INVALID_TRIALS)
     
     print(f"\n[STEP 5] Selecting valid trials...")
     clean_trials = trials.select(valid_only=True)
@@ -89,15 +96,14 @@ def main():
     output_dir = 'results'
     os.makedirs(output_dir, exist_ok=True)
     
-    results_file = os.path.join(output_dir, 'd_values.csv')
-    stats_file = os.path.join(output_dir, 'statistics.csv')
-    
-    results.to_csv(results_file, index=False)
-    stats_df.to_csv(stats_file, index=False)
+    tables = {'d_values': results, 'subject_D': clean_trials.calc_subject_D(), 'statistics': stats_df}
+    thresholds = {'min_angle': MIN_ANGLE, 'max_angle': MAX_ANGLE, 'max_invalid_trials': MAX_INVALID_TRIALS,
+                  'latency_outlier_method': LATENCY_OUTLIER_METHOD}
+    saved = export_results(output_dir, tables, fmt=OUTPUT_FORMAT, thresholds=thresholds)
     
     print(f"\n\nResults saved to:")
-    print(f"  - {results_file}")
-    print(f"  - {stats_file}")
+    for path in saved.values():
+        print(f"  - {path}")
     
     print("\n" + "=" * 70)
     print("ANALYSIS COMPLETE")
@@ -11,6 +11,9 @@ setup(
         "seaborn",
         "scipy"
     ],
+    extras_require={
+        "export": ["pyarrow"],
+    },
     author="Antigravity",
     description="Analysis tool for schema experiments",
 )
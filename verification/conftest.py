@@ -0,0 +1,41 @@
+import pytest
+import sys
+import os
+
+# Add project root and verification directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.dirname(__file__))
+
+from schema_analysis.tube_trials import TubeTrials
+
+
+def mark_trials(raw_df):
+    """
+    Runs the standard marking steps of scripts/standardized_analysis.py on
+    raw trials (angles 3-43, at most 2 invalid trials per subject).
+
+    Returns:
+        TubeTrials: All trials, with the validity columns added.
+    """
+    trials = TubeTrials(raw_df)
+    trials.process_angles()
+    trials.mark_valid_angles(min_angle=3, max_angle=43)
+    trials.mark_valid_subjects(max_invalid_trials=2)
+    return trials
+
+
+def clean_trials_from(raw_df):
+    """mark_trials() followed by select(valid_only=True)."""
+    return mark_trials(raw_df).select(valid_only=True)
+
+
+@pytest.fixture
+def make_marked_trials():
+    """Factory: raw trials DataFrame -> marked TubeTrials (see mark_trials)."""
+    return mark_trials
+
+
+@pytest.fixture
+def make_clean_trials():
+    """Factory: raw trials DataFrame -> clean TubeTrials (see clean_trials_from)."""
+    return clean_trials_from
@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+"""
+Differential Test Harness
+-------------------------
+Checks alternative (faster) pipeline engines against the reference
+`processing` functions on many randomized trial tables.
+
+Each table is built from the full factorial design (face x tube x faceSide x
+tip_direction per subject) and then perturbed with the cases that break
+pairing and exclusion logic:
+- missing towards/away trials
+- duplicated trials
+- end angles exactly on the 3 and 43 degree boundaries
+- subjects with exactly `max_invalid_trials` and one more invalid trial
+- faces recorded under their old IDs (ID001/ID022)
+- missing face_id, tubeTypeIndex, faceSide or tip_direction
+- subjects without a session_group (dropped on load, as in the analysis script)
+
+For every table the reference pipeline and every registered engine are run
+and their `results_df`, `used_indices` and per-face stats are diffed. The
+reference stats come from a frozen copy of the original per-face t-test loop
+(baseline_face_stats), not from the package, so a change to
+processing.calc_face_stats is checked too. The
+timing of each engine relative to the reference is recorded as its speedup.
+
+Loaders are checked the same way: the table is split into several CSV files
+and each registered loader must reproduce `load_and_merge_csvs`. The built-in
+loaders re-read the files in tiny chunks and as gzip/bz2/xz/zip exports.
+
+Usage:
+    python verification/differential_harness.py [n_tables] [seed]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import zipfile
+import pandas as pd
+import numpy as np
+from scipy import stats
+
+# Add project root to path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from schema_analysis import processing
+from schema_analysis import cube
+from schema_analysis.data_loader import load_and_merge_csvs
+from schema_analysis.pairing import PairIndex
+from schema_analysis.tensor import TrialTensor
+from schema_analysis.tube_trials import TubeTrials
+
+MIN_ANGLE = 3
+MAX_ANGLE = 43
+MAX_INVALID_TRIALS = 2
+
+FACES = ['ID015', 'ID017', 'ID030']
+SIDES = ['left', 'right']
+RESULT_KEYS = ['user_number', 'face_id', 'tubeTypeIndex', 'pair_type']
+STAT_COLUMNS = ['mean', 'std', 'sem', 'n_subjects', 't_stat', 'p_value']
+PAIR_KEYS = ['face_id', 'tubeTypeIndex', 'faceSide', 'tip_direction']
+OLD_FACE_IDS = {new: old for old, new in processing.FACE_ID_RENAMES.items()}
+
+# Registered engines: name -> callable(raw_df) -> (results_df, used_indices, stats_df)
+ENGINES = {}
+
+# Registered loaders: name -> callable(directory) -> pd.DataFrame
+LOADERS = {}
+
+
+def register_engine(name, engine):
+    """Adds a pipeline engine to be diffed against the reference."""
+    ENGINES[name] = engine
+
+
+def register_loader(name, loader):
+    """Adds a CSV loader to be diffed against load_and_merge_csvs."""
+    LOADERS[name] = loader
+
+
+# --- Randomized tables ---
+
+def generate_trials(rng, n_subjects=12, n_tubes=4, p_missing=0.05, p_duplicate=0.03,
+                    p_boundary=0.05, p_invalid=0.08, p_old_id=0.3, p_nan_key=0.02,
+                    p_no_group=0.1):
+    """
+    Generates one randomized trial table shaped like the raw export.
+
+    Args:
+        rng (np.random.Generator): Random source.
+        n_subjects (int): Number of subjects.
+        n_tubes (int): Number of tube types per face.
+        p_missing (float): Probability a trial is dropped.
+        p_duplicate (float): Probability a trial is duplicated.
+        p_boundary (float): Probability an end angle sits exactly on a threshold.
+        p_invalid (float): Probability an end angle is out of range.
+        p_old_id (float): Probability a subject's face is recorded under its old ID.
+        p_nan_key (float): Probability one pairing key of a trial is missing.
+        p_no_group (float): Probability a subject has no session_group.
+
+    Returns:
+        pd.DataFrame: Raw trials (before process_angles()).
+    """
+    rows = []
+    for user in range(1, n_subjects + 1):
+        faces = rng.choice(FACES, size=rng.integers(1, 3), replace=False)
+        group = f"G{rng.integers(1, 3)}" if rng.random() >= p_no_group else None
+        for face in faces:
+            if face in OLD_FACE_IDS and rng.random() < p_old_id:
+                face = OLD_FACE_IDS[face]
+            for tube in range(n_tubes):
+                for side in SIDES:
+                    for tip in SIDES:
+                        rows.append((user, group, tube, tip, face, side))
+    df = pd.DataFrame(rows, columns=['user_number', 'session_group', 'tubeTypeIndex',
+                                     'tip_direction', 'face_id', 'faceSide'])
+    n = len(df)
+
+    end_angle = rng.normal(18, 8, size=n).round()
+    out_of_range = rng.random(n) < p_invalid
+    end_angle[out_of_range] = rng.choice([-20, 0, 60, 120], size=out_of_range.sum())
+    on_boundary = rng.random(n) < p_boundary
+    end_angle[on_boundary] = rng.choice([MIN_ANGLE, MAX_ANGLE], size=on_boundary.sum())
+
+    # Push a few subjects exactly onto (and one past) the exclusion threshold
+    users = df['user_number'].unique()
+    for user, n_invalid in zip(rng.choice(users, size=min(2, len(users)), replace=False),
+                               [MAX_INVALID_TRIALS, MAX_INVALID_TRIALS + 1]):
+        user_rows = np.flatnonzero(df['user_number'].to_numpy() == user)
+        end_angle[user_rows] = np.clip(end_angle[user_rows], MIN_ANGLE + 1, MAX_ANGLE - 1)
+        end_angle[rng.choice(user_rows, size=n_invalid, replace=False)] = 0
+
+    df['towards_away'] = np.where(df['faceSide'] == df['tip_direction'], 'towards', 'away')
+    df['raw_angle'] = np.where(df['tip_direction'] == 'left', -end_angle, end_angle)
+    df['latency'] = rng.integers(500, 20000, size=n)
+    df['sightType'] = 'sighted'
+
+    # Blank one pairing key of a few trials
+    blank = np.flatnonzero(rng.random(n) < p_nan_key)
+    for row, key in zip(blank, rng.choice(PAIR_KEYS, size=len(blank))):
+        df.loc[row, key] = np.nan
+
+    keep = rng.random(n) >= p_missing
+    duplicate = keep & (rng.random(n) < p_duplicate)
+    df = pd.concat([df[keep], df[duplicate]]).sort_index(kind='stable')
+
+    # Shuffle within subject and number trials in presentation order
+    df = df.sample(frac=1, random_state=int(rng.integers(2**31))).sort_values('user_number', kind='stable')
+    df['trialIndex'] = df.groupby('user_number').cumcount()
+    return df.reset_index(drop=True)
+
+
+# --- Reference pipeline ---
+
+def load_trials(raw_df):
+    """Drops trials without a session_group, as scripts/standardized_analysis.py does on load."""
+    return raw_df.dropna(subset=['session_group'])
+
+
+def prepare_trials(raw_df):
+    """
+    Reference preprocessing: transform angles, validate, exclude subjects and
+    keep only valid trials (the same steps as scripts/standardized_analysis.py).
+    """
+    df = processing.rename_face_ids(load_trials(raw_df).copy())
+    df = processing.transform_angles(df)
+    df = processing.validate_angles(df, MIN_ANGLE, MAX_ANGLE)
+    bad_subjects = processing.identify_bad_subjects(df, MAX_INVALID_TRIALS)
+    return df[df['angle_valid'] & ~df['user_number'].isin(bad_subjects)].copy()
+
+
+def baseline_subject_D(pairs_df):
+    # Frozen copy of the original TubeTrials.calc_subject_D()
+    if pairs_df.empty:
+        return pd.DataFrame(columns=['user_number', 'face_id', 'D'])
+    subject_D = pairs_df.groupby(['user_number', 'face_id'])['d'].mean().reset_index()
+    subject_D.rename(columns={'d': 'D'}, inplace=True)
+    return subject_D
+
+
+def baseline_face_stats(subject_D_df):
+    # Frozen copy of the original TubeTrials.calc_stats() per-face loop
+    if subject_D_df.empty:
+        return pd.DataFrame()
+
+    stats_results = []
+    for face_id in subject_D_df['face_id'].unique():
+        face_data = subject_D_df[subject_D_df['face_id'] == face_id]['D']
+        if len(face_data) > 1:
+            t_stat, p_val = stats.ttest_1samp(face_data, 0)
+            stats_results.append({
+                'face_id': face_id,
+                'mean': face_data.mean(),
+                'std': face_data.std(),
+                'sem': face_data.sem(),
+                'n_subjects': len(face_data),
+                't_stat': t_stat,
+                'p_value': p_val
+            })
+        else:
+            stats_results.append({
+                'face_id': face_id,
+                'mean': face_data.mean() if len(face_data) > 0 else np.nan,
+                'std': np.nan,
+                'sem': np.nan,
+                'n_subjects': len(face_data),
+                't_stat': np.nan,
+                'p_value': np.nan
+            })
+    return pd.DataFrame(stats_results)
+
+
+def reference_pipeline(raw_df):
+    clean_df = prepare_trials(raw_df)
+    results_df, used_indices = processing.balance_trials_reference(clean_df)
+    stats_df = baseline_face_stats(baseline_subject_D(results_df))
+    return results_df, used_indices, stats_df
+
+
+# --- Engines ---
+
+def pair_index_engine(raw_df):
+    clean_df = prepare_trials(raw_df)
+    pair_index = PairIndex.from_trials(clean_df)
+    results_df = pair_index.pairs()
+    subject_D = processing.calc_subject_D(results_df)
+    stats_df = processing.one_sample_t_summary(subject_D, ['face_id']) if not subject_D.empty else pd.DataFrame()
+    return results_df, pair_index.used_indices, stats_df
+
+
+def tube_trials_engine(raw_df):
+    trials = TubeTrials(load_trials(raw_df))
+    trials.process_angles()
+    trials.mark_valid_angles(min_angle=MIN_ANGLE, max_angle=MAX_ANGLE)
+    trials.mark_valid_subjects(max_invalid_trials=MAX_INVALID_TRIALS)
+    clean_trials = trials.select(valid_only=True)
+    return clean_trials.calc_d_values(), clean_trials.pair_index.used_indices, clean_trials.calc_stats()
+
+
+def stats_cube_engine(raw_df):
+    clean_df = prepare_trials(raw_df)
+    pair_index = PairIndex.from_trials(clean_df)
+    results_df = pair_index.pairs()
+    if results_df.empty:
+        return results_df, pair_index.used_indices, pd.DataFrame()
+    cube_df = cube.calc_stats_cube(results_df, grouping_sets=[[]])
+    return results_df, pair_index.used_indices, cube_df.drop(columns='grouping')
+
+
+def trial_tensor_engine(raw_df):
+    clean_df = prepare_trials(raw_df)
+    tensor = TrialTensor.from_trials(clean_df)
+    results_df, used_rows = tensor.pairs()
+    used_indices = set(clean_df.index[sorted(used_rows)])
+    stats_df = tensor.face_stats() if len(results_df) else pd.DataFrame()
+    return results_df, used_indices, stats_df
+
+
+register_engine('pair_index', pair_index_engine)
+register_engine('tube_trials', tube_trials_engine)
+register_engine('stats_cube', stats_cube_engine)
+register_engine('trial_tensor', trial_tensor_engine)
+
+
+# --- Loaders ---
+
+def chunked_loader(directory):
+    # Chunks far smaller than a file, so rows cross many chunk boundaries
+    return load_and_merge_csvs(directory, chunksize=7)
+
+
+def compressed_loader(directory):
+    # Re-encode each CSV as one of the archive formats and stream it back
+    with tempfile.TemporaryDirectory() as archive:
+        for i, path in enumerate(sorted(os.listdir(directory))):
+            df = pd.read_csv(os.path.join(directory, path))
+            suffix = ['.csv.gz', '.csv.bz2', '.csv.xz', '.zip'][i % 4]
+            target = os.path.join(archive, path[:-len('.csv')] + suffix)
+            if suffix == '.zip':
+                with zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED) as bundle:
+                    bundle.writestr(path, df.to_csv(index=False))
+            else:
+                df.to_csv(target, index=False)
+        return load_and_merge_csvs(archive, chunksize=50)
+
+
+register_loader('chunked', chunked_loader)
+register_loader('compressed', compressed_loader)
+
+
+# --- Diffing ---
+
+def diff_results(expected, actual):
+    """
+    Compares (results_df, used_indices, stats_df) of two pipelines.
+    Returns a list of human-readable differences (empty when equivalent).
+    """
+    problems = []
+    exp_results, exp_used, exp_stats = expected
+    act_results, act_used, act_stats = actual
+
+    if len(exp_results) != len(act_results):
+        problems.append(f"results_df: {len(act_results)} pairs, expected {len(exp_results)}")
+    elif len(exp_results):
+        exp_sorted = exp_results.sort_values(RESULT_KEYS).reset_index(drop=True)
+        act_sorted = act_results[exp_results.columns].sort_values(RESULT_KEYS).reset_index(drop=True)
+        try:
+            pd.testing.assert_frame_equal(act_sorted, exp_sorted, check_dtype=False)
+        except AssertionError as e:
+            problems.append(f"results_df differs: {str(e).splitlines()[0]}")
+
+    if set(exp_used) != set(act_used):
+        problems.append(f"used_indices: {len(set(act_used) ^ set(exp_used))} row(s) differ")
+
+    if exp_stats.empty or act_stats.empty:
+        if exp_stats.empty != act_stats.empty:
+            problems.append("stats: one pipeline produced no statistics")
+        return problems
+
+    exp_stats = exp_stats.set_index('face_id').sort_index()
+    act_stats = act_stats.set_index('face_id').sort_index()
+    if list(exp_stats.index) != list(act_stats.index):
+        problems.append(f"stats faces: {list(act_stats.index)}, expected {list(exp_stats.index)}")
+        return problems
+    for col in STAT_COLUMNS:
+        if not np.allclose(act_stats[col].astype(float), exp_stats[col].astype(float),
+                           rtol=1e-9, atol=1e-12, equal_nan=True):
+            problems.append(f"stats column '{col}' differs")
+    return problems
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def _quietly(fn, *args):
+    # The pipeline steps print progress; keep the harness output readable
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            return _timed(fn, *args)
+        finally:
+            sys.stdout = stdout
+
+
+def run_harness(n_tables=50, seed=0, engines=None, loaders=None, table_kwargs=None):
+    """
+    Runs every engine and loader against the reference on `n_tables` random tables.
+
+    Args:
+        n_tables (int): Number of randomized tables.
+        seed (int): Seed for the table generator.
+        engines (dict): Engines to check. Defaults to all registered engines.
+        loaders (dict): Loaders to check. Defaults to all registered loaders.
+        table_kwargs (dict): Extra arguments for generate_trials().
+
+    Returns:
+        pd.DataFrame: One row per engine/loader with n_tables, n_failed,
+        first_failure, reference_time, engine_time and speedup.
+    """
+    engines = ENGINES if engines is None else engines
+    loaders = LOADERS if loaders is None else loaders
+    rng = np.random.default_rng(seed)
+
+    report = {name: {'kind': 'engine', 'n_failed': 0, 'first_failure': None,
+                     'reference_time': 0.0, 'engine_time': 0.0} for name in engines}
+    report.update({name: {'kind': 'loader', 'n_failed': 0, 'first_failure': None,
+                          'reference_time': 0.0, 'engine_time': 0.0} for name in loaders})
+
+    for table_no in range(n_tables):
+        raw_df = generate_trials(rng, **(table_kwargs or {}))
+        expected, ref_time = _quietly(reference_pipeline, raw_df)
+
+        for name, engine in engines.items():
+            actual, engine_time = _quietly(engine, raw_df)
+            _record(report[name], table_no, diff_results(expected, actual), ref_time, engine_time)
+
+        if loaders:
+            with tempfile.TemporaryDirectory() as directory:
+                _write_split_csvs(raw_df, directory, rng)
+                expected_df, ref_time = _quietly(load_and_merge_csvs, directory)
+                for name, loader in loaders.items():
+                    actual_df, engine_time = _quietly(loader, directory)
+                    _record(report[name], table_no, _diff_frames(expected_df, actual_df),
+                            ref_time, engine_time)
+
+    summary = pd.DataFrame.from_dict(report, orient='index').rename_axis('engine').reset_index()
+    summary.insert(2, 'n_tables', n_tables)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        summary['speedup'] = summary['reference_time'] / summary['engine_time']
+    return summary
+
+
+def _record(entry, table_no, problems, ref_time, engine_time):
+    entry['reference_time'] += ref_time
+    entry['engine_time'] += engine_time
+    if problems:
+        entry['n_failed'] += 1
+        if entry['first_failure'] is None:
+            entry['first_failure'] = f"table {table_no}: {'; '.join(problems)}"
+
+
+def _write_split_csvs(df, directory, rng):
+    n_files = int(rng.integers(1, 4))
+    for i, part in enumerate(np.array_split(np.arange(len(df)), n_files)):
+        df.iloc[part].to_csv(os.path.join(directory, f"part_{i}.csv"), index=False)
+
+
+def _diff_frames(expected, actual):
+    # File order is not part of the contract; compare rows as a multiset
+    columns = sorted(expected.columns)
+    try:
+        pd.testing.assert_frame_equal(actual[columns].sort_values(columns).reset_index(drop=True),
+                                      expected[columns].sort_values(columns).reset_index(drop=True),
+                                      check_dtype=False)
+    except KeyError as e:
+        return [f"loaded frame is missing columns: {e}"]
+    except AssertionError as e:
+        return [f"loaded frame differs: {str(e).splitlines()[0]}"]
+    return []
+
+
+def main():
+    n_tables = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+
+    print("=" * 70)
+    print(f"DIFFERENTIAL HARNESS - {n_tables} randomized tables (seed {seed})")
+    print("=" * 70)
+    summary = run_harness(n_tables, seed)
+    print(summary.to_string(index=False))
+
+    if summary['n_failed'].sum() == 0:
+        print("\n✓✓✓ ALL ENGINES MATCH THE REFERENCE ✓✓✓")
+        sys.exit(0)
+    print("\n✗✗✗ ENGINE MISMATCHES FOUND ✗✗✗")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
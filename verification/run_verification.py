@@ -32,7 +32,7 @@ def main():
     trials = TubeTrials(df)
     trials.process_angles()
     trials.mark_valid_angles(min_angle=3, max_angle=43)
-    trials.mark_bad_subjects(max_invalid_trials=2)
+    trials.mark_valid_subjects(max_invalid_trials=2)
     clean_trials = trials.select(valid_only=True)
     stats = clean_trials.calc_stats()
     results = clean_trials.calc_d_values()
@@ -2,7 +2,6 @@
 import os
 import sys
 import pandas as pd
-import random
 
 # Add project root to sys.path to import schema_analysis
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
@@ -11,6 +10,8 @@ sys.path.insert(0, project_root)
 from schema_analysis.data_loader import load_and_merge_csvs
 from schema_analysis import TubeTrials
 
+SEED = 42
+
 def main():
     print("=" * 80)
     print("RANDOM VERIFICATION DATA GENERATOR")
@@ -33,53 +34,32 @@ def main():
     # We don't filter subjects yet because we want to see individual valid pairs 
     # even if the subject might be excluded later, or we can filter strictly. 
     # Let's filter strictly to verify the "happy path".
-    trials.mark_bad_subjects(max_invalid_trials=2)
+    trials.mark_valid_subjects(max_invalid_trials=2)
     clean_trials = trials.select(valid_only=True)
     df = clean_trials.df # Work with the underlying dataframe
 
     # 3. Find Valid Pairs
-    # We need to manually identify potential pairs to verify the logic "from scratch"
-    # or rely on the logic we are testing to find candidates.
-    # To truly verify, let's find groups that *look* like they should be pairs.
-    
-    valid_pairs = []
-    
-    # Group by potential pairing keys
-    grouped = df.groupby(['user_number', 'face_id', 'tubeTypeIndex'])
-    
-    for (user, face, tube), group in grouped:
-        # Check for Face Left candidate
-        t_left = group[(group['faceSide'] == 'left') & (group['tip_direction'] == 'left')]
-        a_left = group[(group['faceSide'] == 'left') & (group['tip_direction'] == 'right')]
-        
-        if len(t_left) == 1 and len(a_left) == 1:
-            valid_pairs.append({
-                'type': 'FaceLeft',
-                'user': user, 'face': face, 'tube': tube,
-                'towards': t_left.iloc[0],
-                'away': a_left.iloc[0]
-            })
-            
-        # Check for Face Right candidate
-        t_right = group[(group['faceSide'] == 'right') & (group['tip_direction'] == 'right')]
-        a_right = group[(group['faceSide'] == 'right') & (group['tip_direction'] == 'left')]
-        
-        if len(t_right) == 1 and len(a_right) == 1:
-            valid_pairs.append({
-                'type': 'FaceRight',
-                'user': user, 'face': face, 'tube': tube,
-                'towards': t_right.iloc[0],
-                'away': a_right.iloc[0]
-            })
-
-    print(f"Found {len(valid_pairs)} valid pairs available for verification.")
+    # Candidates come from the same PairIndex that balance_trials reads,
+    # so the sample covers exactly the pairs the pipeline can produce.
+    pair_index = clean_trials.pair_index
+    n_available = int(pair_index.paired.sum())
+    print(f"Found {n_available} valid pairs available for verification.")
     
-    if not valid_pairs:
+    if n_available == 0:
         print("No valid pairs found to sample!")
         return
 
-    # 4. Randomly Select 10 pairs
-    selected_pairs = random.sample(valid_pairs, min(10, len(valid_pairs)))
+    # 4. Randomly Select 10 pairs (seeded so the selection can be reproduced)
+    sampled = pair_index.sample(10, seed=SEED)
+    selected_pairs = [
+        {
+            'type': row.pair_type,
+            'user': row.user_number, 'face': row.face_id, 'tube': row.tubeTypeIndex,
+            'towards': df.loc[row.towards_index],
+            'away': df.loc[row.away_index]
+        }
+        for row in sampled.itertuples(index=False)
+    ]
     
     print("\n" + "="*80)
     print("SELECTED PAIRS FOR MANUAL VERIFICATION")
@@ -0,0 +1,54 @@
+import numpy as np
+import sys
+import os
+from scipy import integrate
+
+# Add project root and verification directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.dirname(__file__))
+
+import differential_harness
+from schema_analysis.bayes import DEFAULT_PRIOR_SCALE, jzs_bayes_factor
+
+
+def _bf10_quad(t, n, r=DEFAULT_PRIOR_SCALE):
+    v = n - 1
+    def integrand(g):
+        scale = 1 + n * g * r ** 2
+        return (scale ** -0.5 * (1 + t ** 2 / (scale * v)) ** (-(v + 1) / 2)
+                * (2 * np.pi) ** -0.5 * g ** -1.5 * np.exp(-1 / (2 * g)))
+    return integrate.quad(integrand, 0, np.inf, limit=500)[0] / (1 + t ** 2 / v) ** (-(v + 1) / 2)
+
+
+def test_matches_direct_integration():
+    print("--- Testing JZS Bayes factors against direct integration ---")
+    cases = [(0.0, 10), (0.62, 147), (2.5, 20), (-3.0, 100), (10.0, 8), (1.0, 2), (0.1, 5000)]
+    t_stat, n = np.array(cases).T
+    bf10 = jzs_bayes_factor(t_stat, n)
+    expected = [_bf10_quad(t, k) for t, k in cases]
+    assert np.allclose(bf10, expected, rtol=1e-8)
+    assert np.isnan(jzs_bayes_factor([1.0, np.nan], [1, 10])).all()
+    print("PASS: BF10 matches scipy.integrate.quad for null, small and large effects.")
+
+
+def test_calc_stats_and_cube(make_clean_trials):
+    print("\n--- Testing bf10 in calc_stats and the statistics cube ---")
+    raw_df = differential_harness.generate_trials(np.random.default_rng(44), n_subjects=25)
+    clean_trials = make_clean_trials(raw_df)
+
+    stats_df = clean_trials.calc_stats(bayes_factor=True)
+    testable = stats_df[stats_df['n_subjects'] >= 2]
+    assert np.allclose(testable['bf10'], [_bf10_quad(t, n) for t, n in zip(testable['t_stat'], testable['n_subjects'])])
+
+    cube_df = clean_trials.calc_stats_cube(bayes_factor=True)
+    face_rows = cube_df[cube_df['grouping'] == 'face_id'].set_index('face_id')
+    assert np.allclose(face_rows.loc[stats_df['face_id'], 'bf10'], stats_df['bf10'], equal_nan=True)
+    testable = (cube_df['n_subjects'] >= 2) & np.isfinite(cube_df['t_stat'].astype(float))
+    assert (cube_df['bf10'].notna() == testable).all()
+    print("PASS: calc_stats and every cube slice carry matching Bayes factors.")
+
+
+if __name__ == "__main__":
+    from conftest import clean_trials_from
+    test_matches_direct_integration()
+    test_calc_stats_and_cube(clean_trials_from)
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import sys
+import os
+from scipy import stats
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from schema_analysis.correlation import face_correlations, pairwise_correlations, subject_face_matrix
+
+
+def _subject_D(rng, n_subjects=60, n_faces=5):
+    # Shared subject effect plus noise; each subject misses some faces
+    effect = rng.normal(0, 1, size=n_subjects)
+    rows = [(user, f"ID{face:03d}", effect[user] + rng.normal(0, 1))
+            for user in range(n_subjects) for face in range(n_faces) if rng.random() < 0.7]
+    return pd.DataFrame(rows, columns=['user_number', 'face_id', 'D'])
+
+
+def test_matches_pearsonr():
+    print("--- Testing pairwise-complete correlations against scipy ---")
+    subject_D = _subject_D(np.random.default_rng(43))
+    result = face_correlations(subject_D)
+    wide = subject_D.pivot(index='user_number', columns='face_id', values='D')
+
+    assert len(result) == 10
+    for _, row in result.iterrows():
+        both = wide[[row['face_a'], row['face_b']]].dropna()
+        expected = stats.pearsonr(both.iloc[:, 0], both.iloc[:, 1])
+        assert row['n_subjects'] == len(both)
+        assert np.isclose(row['r'], expected.statistic)
+        assert np.isclose(row['p_value'], expected.pvalue)
+        assert np.isclose(row['sign_agreement'], (np.sign(both.iloc[:, 0]) == np.sign(both.iloc[:, 1])).mean())
+    print("PASS: r, p and sign agreement match per-pair computations.")
+
+
+def test_bootstrap_weights():
+    print("\n--- Testing bootstrap replicates as subject weights ---")
+    rng = np.random.default_rng(44)
+    subject_D = _subject_D(rng, n_subjects=30, n_faces=3)
+    values, mask, users, _ = subject_face_matrix(subject_D)
+
+    # A weighted replicate equals the correlation of the resampled subjects
+    picks = rng.integers(0, len(users), size=len(users))
+    weights = np.bincount(picks, minlength=len(users)).astype(float)[None]
+    r_weighted = pairwise_correlations(values, mask, weights)[0][0]
+    r_resampled = pairwise_correlations(values[picks], mask[picks])[0]
+    assert np.allclose(r_weighted, r_resampled, equal_nan=True)
+    print("PASS: Weighted replicate equals resampled data.")
+
+    result = face_correlations(subject_D, n_boot=500, seed=1)
+    assert (result['ci_low'] <= result['r']).all() and (result['r'] <= result['ci_high']).all()
+    pd.testing.assert_frame_equal(result, face_correlations(subject_D, n_boot=500, seed=1))
+    print("PASS: Bootstrap CIs bracket r and are reproducible.")
+
+
+if __name__ == "__main__":
+    test_matches_pearsonr()
+    test_bootstrap_weights()
@@ -0,0 +1,77 @@
+import pandas as pd
+import pytest
+import sys
+import os
+import zipfile
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from schema_analysis.data_loader import load_and_merge_csvs
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), 'data', 'dummy_verification.csv')
+
+
+def test_overlapping_exports_are_deduplicated(tmp_path):
+    print("--- Testing de-duplication of overlapping exports ---")
+    df = pd.read_csv(DATA_FILE)
+    df.to_csv(tmp_path / 'export_a.csv', index=False)
+
+    # Second export repeats half the trials; one of them was edited
+    overlap = df.iloc[:10].copy()
+    overlap.loc[overlap.index[0], 'raw_angle'] += 1
+    overlap.to_csv(tmp_path / 'export_b.csv', index=False)
+
+    merged, conflicts = load_and_merge_csvs(str(tmp_path), return_conflicts=True)
+    assert len(merged) == len(df) + 1
+    assert len(conflicts) == 2
+    assert sorted(conflicts['source_file']) == ['export_a.csv', 'export_b.csv']
+
+    merged_first = load_and_merge_csvs(str(tmp_path), on_conflict='first')
+    assert len(merged_first) == len(df)
+    assert not merged_first.duplicated(['user_number', 'trialIndex']).any()
+
+    merged_drop = load_and_merge_csvs(str(tmp_path), on_conflict='drop')
+    assert len(merged_drop) == len(df) - 1
+    print("PASS: Exact duplicates dropped and conflicting trials reported.")
+
+
+def test_deduplicate_can_be_disabled(tmp_path):
+    print("\n--- Testing merge without de-duplication ---")
+    df = pd.read_csv(DATA_FILE)
+    df.to_csv(tmp_path / 'export_a.csv', index=False)
+    df.to_csv(tmp_path / 'export_b.csv', index=False)
+
+    assert len(load_and_merge_csvs(str(tmp_path), deduplicate=False)) == 2 * len(df)
+    print("PASS: deduplicate=False concatenates blindly.")
+
+
+def test_exports_without_key_columns_load(tmp_path):
+    print("\n--- Testing exports without a trialIndex column ---")
+    df = pd.read_csv(DATA_FILE).drop(columns='trialIndex')
+    df.to_csv(tmp_path / 'export_a.csv', index=False)
+    df.to_csv(tmp_path / 'export_b.csv', index=False)
+
+    with pytest.warns(UserWarning, match='trialIndex'):
+        merged = load_and_merge_csvs(str(tmp_path))
+    assert len(merged) == 2 * len(df)
+    print("PASS: Exports without the trial key load undeduplicated, with a warning.")
+
+
+def test_compressed_exports_are_streamed(tmp_path):
+    print("\n--- Testing compressed and zipped exports ---")
+    df = pd.read_csv(DATA_FILE)
+    parts = [df.iloc[i::4] for i in range(4)]
+    parts[0].to_csv(tmp_path / 'site_a.csv.gz', index=False)
+    parts[1].to_csv(tmp_path / 'site_b.csv.bz2', index=False)
+    parts[2].to_csv(tmp_path / 'site_c.csv.xz', index=False)
+    with zipfile.ZipFile(tmp_path / 'site_d.zip', 'w', zipfile.ZIP_DEFLATED) as bundle:
+        bundle.writestr('session_1.csv', parts[3].iloc[:5].to_csv(index=False))
+        bundle.writestr('session_2.csv', parts[3].iloc[5:].to_csv(index=False))
+    (tmp_path / 'notes.txt').write_text('not an export')
+
+    merged = load_and_merge_csvs(str(tmp_path), chunksize=3)
+    columns = sorted(df.columns)
+    pd.testing.assert_frame_equal(merged[columns].sort_values(columns).reset_index(drop=True),
+                                  df[columns].sort_values(columns).reset_index(drop=True))
+    print("PASS: gzip, bz2, xz and zip members load like the plain CSV.")
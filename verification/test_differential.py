@@ -0,0 +1,21 @@
+import sys
+import os
+
+# Add verification directory to path for the harness
+sys.path.append(os.path.dirname(__file__))
+
+import differential_harness
+
+
+def test_engines_match_reference():
+    print("--- Running differential harness ---")
+    summary = differential_harness.run_harness(n_tables=5, seed=123)
+    print(summary.to_string(index=False))
+
+    failed = summary[summary['n_failed'] > 0]
+    assert failed.empty, failed['first_failure'].tolist()
+    print("PASS: All engines match the reference pipeline.")
+
+
+if __name__ == "__main__":
+    test_engines_match_reference()
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import sys
+import os
+
+# Add project root and verification directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.dirname(__file__))
+
+import differential_harness
+from schema_analysis import processing
+
+
+def test_flags_match_stages(make_marked_trials):
+    print("--- Testing exclusion bitmask against the marking stages ---")
+    raw_df = differential_harness.generate_trials(np.random.default_rng(21), n_subjects=15)
+    raw_df.loc[raw_df['user_number'] == raw_df['user_number'].iloc[0], 'session_group'] = np.nan
+
+    trials = make_marked_trials(raw_df)
+    trials.mark_unpaired()
+
+    reasons = processing.decode_exclusion_flags(trials.df['exclusion_flags'])
+    assert (reasons['session_group'] == trials.df['session_group'].isna()).all()
+    assert (reasons['angle'] == ~trials.df['angle_valid']).all()
+    assert (reasons['subject'] == ~trials.df['subject_valid']).all()
+    assert not reasons['latency'].any()
+
+    # Usable trials are included exactly when they are part of a pair
+    clean_trials = trials.select(valid_only=True)
+    used = clean_trials.pair_index.used_indices
+    included = trials.df.index[trials.df['exclusion_flags'] == 0]
+    assert set(included) == used - set(trials.df.index[reasons['session_group']])
+    print("PASS: Every bit matches its stage and unflagged trials are the paired ones.")
+
+
+def test_summary_counts():
+    print("\n--- Testing exclusion summary ---")
+    df = pd.DataFrame({'user_number': [1, 1, 2, 2], 'face_id': ['ID015', 'ID017', 'ID015', 'ID015']})
+    processing.set_exclusion_flag(df, 'angle', [True, False, True, False])
+    processing.set_exclusion_flag(df, 'subject', [True, True, False, False])
+
+    overall = processing.exclusion_summary(df).iloc[0]
+    assert overall['n_trials'] == 4 and overall['n_included'] == 1
+    assert overall['angle'] == 2 and overall['subject'] == 2 and overall['unpaired'] == 0
+
+    per_face = processing.exclusion_summary(df, by='face_id').set_index('face_id')
+    assert per_face.loc['ID015', 'angle'] == 2 and per_face.loc['ID017', 'subject'] == 1
+
+    # Re-running a stage replaces its bit
+    processing.set_exclusion_flag(df, 'angle', [False] * 4)
+    assert processing.exclusion_summary(df).iloc[0]['angle'] == 0
+    print("PASS: Counts per reason, per face and after re-marking are correct.")
+
+
+def test_invalid_duplicate_does_not_block_pair(make_marked_trials):
+    print("\n--- Testing unpaired flag with an invalid duplicate in the cell ---")
+    df = pd.DataFrame({
+        'user_number': [1, 1, 1], 'session_group': ['G1'] * 3, 'face_id': ['ID015'] * 3,
+        'tubeTypeIndex': [0] * 3, 'faceSide': ['left'] * 3,
+        'tip_direction': ['left', 'left', 'right'],
+        'towards_away': ['towards', 'towards', 'away'],
+        'raw_angle': [-10, -60, 20], 'latency': [1000, 1100, 1200], 'sightType': ['sighted'] * 3,
+    })
+    trials = make_marked_trials(df)
+    trials.mark_unpaired()
+
+    d_values = trials.select(valid_only=True).calc_d_values()
+    assert d_values['d'].tolist() == [-10]
+    reasons = processing.decode_exclusion_flags(trials.df['exclusion_flags'])
+    assert reasons['unpaired'].tolist() == [False, False, False]
+    assert reasons['angle'].tolist() == [False, True, False]
+    print("PASS: The invalid duplicate is flagged by angle only and the valid pair stays paired.")
+
+
+if __name__ == "__main__":
+    from conftest import mark_trials
+    test_flags_match_stages(mark_trials)
+    test_summary_counts()
+    test_invalid_duplicate_does_not_block_pair(mark_trials)
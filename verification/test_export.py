@@ -0,0 +1,94 @@
+import importlib.util
+import pandas as pd
+import pytest
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from schema_analysis import export
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), '..', 'results')
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+@pytest.mark.parametrize('fmt', ['parquet', 'arrow', 'csv'])
+def test_round_trip(tmp_path, fmt):
+    if fmt != 'csv':
+        pytest.importorskip('pyarrow')
+    d_values = pd.read_csv(os.path.join(RESULTS_DIR, 'd_values.csv'))
+    stats_df = pd.read_csv(os.path.join(RESULTS_DIR, 'statistics.csv'))
+    thresholds = {'min_angle': 3, 'max_angle': 43, 'max_invalid_trials': 2}
+
+    export.export_results(str(tmp_path), {'d_values': d_values, 'statistics': stats_df},
+                          fmt=fmt, thresholds=thresholds)
+
+    # Partitioned formats come back grouped by face_id
+    expected = d_values.sort_values('face_id', kind='stable').reset_index(drop=True)
+    if fmt == 'csv':
+        expected = d_values
+    actual = export.read_results(str(tmp_path), 'd_values')
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+
+    face_stats = export.read_results(str(tmp_path), 'statistics', face_ids=['ID015'])
+    assert face_stats['face_id'].tolist() == ['ID015']
+
+    if fmt != 'csv':
+        assert export.read_metadata(str(tmp_path), 'd_values')['thresholds'] == thresholds
+
+
+@pytest.mark.parametrize('fmt', ['parquet', 'arrow'])
+def test_missing_face_id_is_kept(tmp_path, fmt):
+    print("\n--- Testing export of rows without a face_id ---")
+    pytest.importorskip('pyarrow')
+    d_values = pd.read_csv(os.path.join(RESULTS_DIR, 'd_values.csv'))
+    d_values.loc[d_values.index[:5], 'face_id'] = None
+
+    export.export_results(str(tmp_path), {'d_values': d_values}, fmt=fmt)
+    actual = export.read_results(str(tmp_path), 'd_values')
+    assert len(actual) == len(d_values)
+    assert actual['face_id'].isna().sum() == 5
+
+    missing = export.read_results(str(tmp_path), 'd_values', face_ids=[None])
+    assert len(missing) == 5 and missing['face_id'].isna().all()
+    print("PASS: Rows without a face_id are written to the null partition.")
+
+
+def test_arrow_default_is_zero_copy(tmp_path):
+    print("\n--- Testing zero-copy Arrow reads ---")
+    pa = pytest.importorskip('pyarrow')
+    d_values = pd.read_csv(os.path.join(RESULTS_DIR, 'd_values.csv'))
+    export.export_results(str(tmp_path), {'d_values': d_values}, fmt='arrow')
+
+    before = pa.total_allocated_bytes()
+    table = export.read_table(str(tmp_path), 'd_values')
+    # Columns are views of the mapped files; only concatenation metadata is allocated
+    assert pa.total_allocated_bytes() - before < d_values.memory_usage(deep=False).sum() / 10
+    assert table.num_rows == len(d_values)
+    print("PASS: Default Arrow export is read without decompressing.")
+
+
+@pytest.mark.parametrize('fmt', ['parquet', 'arrow'])
+def test_analysis_script_export(tmp_path, monkeypatch, fmt):
+    print(f"\n--- Testing {fmt} export from the analysis script ---")
+    pytest.importorskip('pyarrow')
+    spec = importlib.util.spec_from_file_location(
+        'standardized_analysis', os.path.join(PROJECT_DIR, 'scripts', 'standardized_analysis.py'))
+    script = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(script)
+
+    # The script reads data/raw and writes results/ relative to the working directory
+    (tmp_path / 'data').mkdir()
+    (tmp_path / 'data' / 'raw').symlink_to(os.path.join(PROJECT_DIR, 'data', 'raw'))
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(script, 'OUTPUT_FORMAT', fmt)
+    script.main()
+
+    for name in ['d_values', 'subject_D', 'statistics']:
+        faces = sorted(p.name for p in (tmp_path / 'results' / name).iterdir())
+        assert faces == ['face_id=ID015', 'face_id=ID017', 'face_id=ID030']
+    stats_df = export.read_results('results', 'statistics')
+    assert stats_df['n_subjects'].max() == 147
+    assert export.read_metadata('results', 'd_values')['thresholds']['max_invalid_trials'] == 2
+    print("PASS: The analysis script writes every table partitioned by face.")
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from schema_analysis import processing
+from schema_analysis.influence import jackknife_subject_D
+
+
+def test_jackknife_matches_rerun():
+    print("--- Testing closed-form jackknife against reruns ---")
+    rng = np.random.default_rng(11)
+    subject_D = pd.DataFrame({
+        'user_number': np.arange(25),
+        'face_id': ['ID015'] * 15 + ['ID017'] * 10,
+        'D': rng.normal(0.5, 2, size=25).round(2),
+    })
+    jackknife = jackknife_subject_D(subject_D).set_index(['face_id', 'user_number'])
+
+    for _, row in subject_D.iterrows():
+        rerun = processing.calc_face_stats(subject_D.drop(index=row.name))
+        expected = rerun.set_index('face_id').loc[row['face_id']]
+        actual = jackknife.loc[(row['face_id'], row['user_number'])]
+        for col in ['mean', 'std', 'sem', 'n_subjects', 't_stat', 'p_value']:
+            assert np.isclose(actual[col], expected[col]), col
+    print("PASS: Downdated statistics match dropping each subject and rerunning.")
+
+
+def test_ranking():
+    print("\n--- Testing influence ranking ---")
+    subject_D = pd.DataFrame({
+        'user_number': [1, 2, 3, 4, 5],
+        'face_id': ['ID015'] * 5,
+        'D': [0.1, -0.2, 0.3, 0.0, 12.0],
+    })
+    jackknife = jackknife_subject_D(subject_D)
+
+    assert jackknife.iloc[0]['user_number'] == 5
+    assert jackknife['influence_rank'].tolist() == [1, 2, 3, 4, 5]
+    print("PASS: The extreme subject ranks as most influential.")
+
+
+if __name__ == "__main__":
+    test_jackknife_matches_rerun()
+    test_ranking()
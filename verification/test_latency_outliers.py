@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from schema_analysis import processing
+from schema_analysis.tube_trials import TubeTrials
+
+
+def _trials(latencies):
+    # Two subjects, each with one complete FaceLeft pair per tube
+    n = len(latencies)
+    data = {
+        'face_id': ['ID015'] * n,
+        'user_number': [1] * (n // 2) + [2] * (n // 2),
+        'faceSide': ['left'] * n,
+        'tubeTypeIndex': [i // 2 % (n // 4) for i in range(n)],
+        'tip_direction': ['left', 'right'] * (n // 2),
+        'raw_angle': [-10, 5] * (n // 2),
+        'latency': latencies,
+    }
+    trials = TubeTrials(pd.DataFrame(data))
+    trials.process_angles()
+    trials.mark_valid_angles(min_angle=3, max_angle=43)
+    return trials
+
+
+def test_mad_flags_per_subject():
+    print("--- Testing latency outliers (MAD) ---")
+    # Subject 1 has one 131 second trial; subject 2 is uniformly slow
+    trials = _trials([4000, 4200, 3900, 131477, 4100, 3800, 4050, 4150,
+                      9000, 9100, 8900, 9050, 9200, 8800, 9150, 8950])
+    trials.mark_valid_latencies(method='mad', threshold=3.5)
+
+    flagged = trials.df.loc[~trials.df['latency_valid'], 'latency'].tolist()
+    assert flagged == [131477]
+    print("PASS: Only the inattentive trial is flagged, not the fastest ones.")
+
+
+def test_outliers_feed_subjects_and_pairing():
+    print("\n--- Testing latency outliers in exclusion and pairing ---")
+    trials = _trials([4000, 4200, 3900, 131477, 4100, 3800, 4050, 4150,
+                      9000, 9100, 8900, 9050, 9200, 8800, 9150, 8950])
+    n_pairs_before = len(trials.calc_d_values())
+    trials.mark_valid_latencies(method='mad', threshold=3.5)
+
+    # The outlier's pair is no longer formed
+    assert len(trials.calc_d_values()) == n_pairs_before - 1
+
+    # Latency outliers do not use up the angle-rule budget...
+    trials.mark_valid_subjects(max_invalid_trials=0)
+    assert trials.df['subject_valid'].all()
+
+    # ...but have their own
+    trials.mark_valid_subjects(max_invalid_trials=0, max_latency_outliers=0)
+    valid_subjects = trials.df.groupby('user_number')['subject_valid'].all()
+    assert not valid_subjects[1] and valid_subjects[2]
+    print("PASS: Latency outliers drop their pair and count against their own subject budget.")
+
+
+def test_percentile_method():
+    print("\n--- Testing latency outliers (percentile) ---")
+    trials = _trials(list(range(1000, 17000, 1000)))
+    trials.mark_valid_latencies(method='percentile', upper_pct=90)
+
+    # One cutoff over all 16 trials: only the two slowest (both subject 2) are flagged
+    flagged = trials.df.loc[~trials.df['latency_valid']]
+    assert flagged['latency'].tolist() == [15000, 16000]
+    assert flagged['user_number'].unique().tolist() == [2]
+    print("PASS: Percentile cutoff flags only the slowest trials overall.")
+
+
+def _realistic_trials(seed=0, n_subjects=150, n_lapsing=6):
+    # 32 trials per subject with log-normal latencies (subject medians 2-8 s),
+    # 1% attention lapses of 1-10 minutes, and a few subjects who lapse 5 times
+    rng = np.random.default_rng(seed)
+    n_trials = 32
+    cells = [(face_side, tip) for face_side in ['left', 'right'] for tip in ['left', 'right']]
+    rows = []
+    for user in range(1, n_subjects + 1):
+        median = np.exp(rng.normal(np.log(4000), 0.35))
+        latency = median * np.exp(rng.normal(0, 0.45, n_trials))
+        lapses = rng.random(n_trials) < 0.01
+        if user <= n_lapsing:
+            lapses[rng.choice(n_trials, 5, replace=False)] = True
+        latency[lapses] = rng.uniform(60000, 600000, lapses.sum())
+        for i in range(n_trials):
+            face_side, tip = cells[i % 4]
+            rows.append((user, 'ID015', i // 4, face_side, tip, rng.uniform(5, 30), latency[i], lapses[i]))
+    df = pd.DataFrame(rows, columns=['user_number', 'face_id', 'tubeTypeIndex', 'faceSide',
+                                     'tip_direction', 'end_angle', 'latency', 'lapse'])
+    return processing.validate_angles(df, min_angle=3, max_angle=43)
+
+
+def test_realistic_exclusion_counts():
+    print("\n--- Testing latency exclusions on realistic latencies ---")
+    df = processing.flag_latency_outliers(_realistic_trials(), method='mad')
+    flagged = ~df['latency_valid']
+
+    # Every lapse is caught, with few ordinary trials flagged along with them
+    assert flagged[df['lapse']].all()
+    false_positives = (flagged & ~df['lapse']).sum()
+    assert false_positives <= 0.01 * len(df)
+    per_subject = flagged.groupby(df['user_number']).sum()
+    assert (per_subject[per_subject.index > 6] <= 2).all()
+
+    # No subject is excluded by default; with a budget only the lapsing ones are
+    assert processing.identify_bad_subjects(df, max_invalid_trials=2) == []
+    excluded = processing.identify_bad_subjects(df, max_invalid_trials=2, max_latency_outliers=3)
+    assert excluded == [1, 2, 3, 4, 5, 6]
+    print(f"PASS: {flagged.sum()} of {len(df)} trials flagged ({false_positives} without a lapse); "
+          f"0 subjects excluded by default, {len(excluded)} with max_latency_outliers=3.")
+
+
+if __name__ == "__main__":
+    test_mad_flags_per_subject()
+    test_outliers_feed_subjects_and_pairing()
+    test_percentile_method()
+    test_realistic_exclusion_counts()
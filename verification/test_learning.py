@@ -0,0 +1,76 @@
+import numpy as np
+import sys
+import os
+
+# Add project root and verification directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.dirname(__file__))
+
+import differential_harness
+from schema_analysis import learning
+from schema_analysis.pairing import PairIndex
+from schema_analysis.tube_trials import TubeTrials
+
+
+def test_rolling_matches_pandas(make_clean_trials):
+    print("--- Testing rolling statistics against pandas rolling ---")
+    clean_df = make_clean_trials(differential_harness.generate_trials(np.random.default_rng(3), n_subjects=20)).df
+    rolling = learning.rolling_D_stats(PairIndex.from_trials(clean_df).pair_rows(), clean_df, window=4)
+
+    keys = ['user_number', 'face_id']
+    grouped = rolling.groupby(keys)['d']
+    expected = grouped.rolling(4, min_periods=1).agg(['mean', 'std'])
+    assert np.allclose(rolling['rolling_mean'], expected['mean'])
+    assert np.allclose(rolling['rolling_std'], expected['std'], equal_nan=True)
+    assert np.allclose(rolling['cumulative_D'], grouped.expanding().mean())
+    assert (rolling['pair_number'] == rolling.groupby(keys).cumcount() + 1).all()
+    assert (rolling.groupby(keys)['trialIndex'].diff().dropna() >= 0).all()
+
+    # The last cumulative D of each subject and face is its D
+    final = rolling.groupby(keys)['cumulative_D'].last()
+    subject_D = TubeTrials.wrap(clean_df).calc_subject_D().set_index(keys)['D']
+    assert np.allclose(final.sort_index(), subject_D.loc[final.index].sort_index())
+    print("PASS: Cumsum windows match pandas rolling/expanding per subject and face.")
+
+
+def test_rolling_angles_match_pandas(make_clean_trials):
+    print("\n--- Testing rolling end angles against pandas rolling ---")
+    clean_df = make_clean_trials(differential_harness.generate_trials(np.random.default_rng(3), n_subjects=20)).df.dropna(subset=['face_id'])
+    rolling = TubeTrials.wrap(clean_df).calc_rolling_angles(window=8)
+
+    keys = ['user_number', 'face_id', 'towards_away']
+    assert len(rolling) == len(clean_df)
+    grouped = rolling.groupby(keys)['end_angle']
+    expected = grouped.rolling(8, min_periods=1).agg(['mean', 'std'])
+    assert np.allclose(rolling['rolling_mean'], expected['mean'])
+    assert np.allclose(rolling['rolling_std'], expected['std'], equal_nan=True)
+    assert np.allclose(rolling['cumulative_mean'], grouped.expanding().mean())
+    assert (rolling['trial_number'] == rolling.groupby(keys).cumcount() + 1).all()
+    assert (rolling.groupby(keys)['trialIndex'].diff().dropna() > 0).all()
+    print("PASS: Windows are per subject, face and direction and match pandas rolling/expanding.")
+
+
+def test_block_change(make_clean_trials):
+    print("\n--- Testing early/late D change ---")
+    clean_df = make_clean_trials(differential_harness.generate_trials(np.random.default_rng(4), n_subjects=20)).df
+    pair_rows = PairIndex.from_trials(clean_df).pair_rows()
+    blocks = learning.block_stats(pair_rows, clean_df, n_blocks=2)
+
+    # Per-subject early/late D by hand, splitting each session at its midpoint
+    pairs = learning.attach_pair_order(pair_rows, clean_df)
+    session = clean_df.groupby('user_number')['trialIndex'].agg(['min', 'max'])
+    midpoint = pairs['user_number'].map((session['min'] + session['max'] + 1) / 2)
+    pairs['late'] = pairs['trialIndex'] >= midpoint
+    D = pairs.groupby(['user_number', 'face_id', 'late'])['d'].mean().unstack().dropna()
+    change = (D[True] - D[False]).groupby('face_id').mean()
+
+    actual = blocks[blocks['measure'] == 'D_change'].set_index('face_id')['mean']
+    assert np.allclose(actual.sort_index(), change.sort_index())
+    print("PASS: D_change matches the hand-computed early/late difference.")
+
+
+if __name__ == "__main__":
+    from conftest import clean_trials_from
+    test_rolling_matches_pandas(clean_trials_from)
+    test_rolling_angles_match_pandas(clean_trials_from)
+    test_block_change(clean_trials_from)
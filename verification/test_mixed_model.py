@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from schema_analysis.mixed_model import fit_mixed_model, mixed_design
+
+
+def _pairs(rng, n_subjects=80, subject_sd=2.0):
+    subject_effect = rng.normal(0, subject_sd, size=n_subjects)
+    rows = []
+    for user in range(n_subjects):
+        for face in rng.choice(['ID015', 'ID017', 'ID030'], size=2, replace=False):
+            for tube in range(4):
+                for pair_type in ['FaceLeft', 'FaceRight']:
+                    if rng.random() < 0.8:
+                        d = 0.5 * (face == 'ID017') + 0.3 * tube + subject_effect[user] + rng.normal(0, 4)
+                        rows.append((user, face, tube, pair_type, d))
+    return pd.DataFrame(rows, columns=['user_number', 'face_id', 'tubeTypeIndex', 'pair_type', 'd'])
+
+
+def _dense_reml_llf(X, y, groups, subject_var, residual_var):
+    V = residual_var * np.eye(len(y)) + subject_var * (groups[:, None] == groups[None, :])
+    V_inv = np.linalg.inv(V)
+    A = X.T @ V_inv @ X
+    beta = np.linalg.solve(A, X.T @ V_inv @ y)
+    r = y - X @ beta
+    n, p = X.shape
+    llf = -0.5 * ((n - p) * np.log(2 * np.pi) + np.linalg.slogdet(V)[1] + np.linalg.slogdet(A)[1] + r @ V_inv @ r)
+    return beta, np.linalg.inv(A), llf
+
+
+def test_matches_dense_gls():
+    print("--- Testing sparse REML fit against dense GLS ---")
+    pairs = _pairs(np.random.default_rng(45))
+    fit = fit_mixed_model(pairs)
+    X = mixed_design(pairs)[0].toarray()
+    y = pairs['d'].to_numpy()
+    groups = pairs['user_number'].to_numpy()
+
+    beta, cov, llf = _dense_reml_llf(X, y, groups, fit.subject_var, fit.residual_var)
+    assert np.allclose(fit.fixed_effects['coef'], beta)
+    assert np.allclose(fit.cov, cov)
+    assert np.isclose(fit.reml_llf, llf)
+
+    # The fitted variances maximize the REML likelihood
+    for factor in [0.9, 1.1]:
+        assert _dense_reml_llf(X, y, groups, fit.subject_var * factor, fit.residual_var)[2] < llf
+        assert _dense_reml_llf(X, y, groups, fit.subject_var, fit.residual_var * factor)[2] < llf
+    print("PASS: Coefficients, covariance and REML likelihood match the dense computation.")
+
+
+def test_face_effects_and_no_subject_variance():
+    print("\n--- Testing face effects and a zero subject variance ---")
+    pairs = _pairs(np.random.default_rng(46), n_subjects=200)
+    faces = fit_mixed_model(pairs).face_effects().set_index('face_id')
+    # Face means averaged over tubes (0.3 * mean tube = 0.45), plus 0.5 for ID017
+    assert np.allclose(faces['coef'], [0.45, 0.95, 0.45], atol=3 * faces['se'].max())
+
+    pairs = _pairs(np.random.default_rng(47), subject_sd=0.0)
+    fit = fit_mixed_model(pairs)
+    assert fit.icc < 0.05
+    print("PASS: Face effects recover the simulated means; no subject variance gives ICC near 0.")
+
+
+if __name__ == "__main__":
+    test_matches_dense_gls()
+    test_face_effects_and_no_subject_variance()
@@ -0,0 +1,89 @@
+import pandas as pd
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from schema_analysis import processing
+from schema_analysis.pairing import PairIndex
+from schema_analysis.tube_trials import TubeTrials
+
+
+def _trials():
+    # User 1 / tube 0: complete FaceLeft pair, FaceRight missing its away trial
+    # User 1 / tube 1: FaceLeft with a duplicated towards trial, FaceRight with an invalid away trial
+    # User 2 / tube 0: complete FaceLeft and FaceRight pairs
+    data = {
+        'user_number':   [1, 1, 1, 1, 1, 1, 1, 1, 2, 2, 2, 2],
+        'face_id':       ['ID015'] * 12,
+        'tubeTypeIndex': [0, 0, 0, 1, 1, 1, 1, 1, 0, 0, 0, 0],
+        'faceSide':      ['left', 'left', 'right', 'left', 'left', 'left', 'right', 'right',
+                          'left', 'left', 'right', 'right'],
+        'tip_direction': ['left', 'right', 'right', 'left', 'left', 'right', 'right', 'left',
+                          'left', 'right', 'right', 'left'],
+        'end_angle':     [10, 5, 12, 8, 9, 7, 20, 50, 14, 11, 6, 9],
+    }
+    df = pd.DataFrame(data)
+    return processing.validate_angles(df, min_angle=3, max_angle=43)
+
+
+def test_pairs_match_reference():
+    print("--- Testing PairIndex against reference pairing ---")
+    df = _trials()
+    expected, expected_used = processing.balance_trials_reference(df)
+    pair_index = PairIndex.from_trials(df)
+
+    pd.testing.assert_frame_equal(pair_index.pairs(), expected, check_dtype=False)
+    assert pair_index.used_indices == expected_used
+    print("PASS: PairIndex pairs and used rows match balance_trials_reference().")
+
+
+def test_failure_reasons():
+    print("\n--- Testing PairIndex failure reasons ---")
+    reasons = PairIndex.from_trials(_trials()).cells.set_index(
+        ['user_number', 'tubeTypeIndex', 'faceSide'])['reason']
+
+    assert reasons[(1, 0, 'left')] == 'paired'
+    assert reasons[(1, 0, 'right')] == 'missing_away'
+    assert reasons[(1, 1, 'left')] == 'duplicate_towards'
+    assert reasons[(1, 1, 'right')] == 'invalid_away'
+    print("PASS: Unpaired cells report why they failed.")
+
+
+def test_seeded_sample_is_reproducible():
+    print("\n--- Testing PairIndex sampling ---")
+    pair_index = PairIndex.from_trials(_trials())
+    first = pair_index.sample(2, seed=7)
+    second = pair_index.sample(2, seed=7)
+
+    pd.testing.assert_frame_equal(first, second)
+    assert len(pair_index.sample(100, seed=7)) == int(pair_index.paired.sum())
+    print("PASS: Same seed selects the same pairs.")
+
+
+def test_cached_index_follows_direct_edits():
+    print("\n--- Testing TubeTrials pair_index cache ---")
+    trials = TubeTrials.wrap(_trials())
+    assert len(trials.calc_d_values()) == 3
+
+    # Invalidate the towards trial of user 2 / FaceLeft directly in df
+    trials.df.loc[8, 'angle_valid'] = False
+    pairs = trials.calc_d_values()
+    expected, _ = processing.balance_trials_reference(trials.df)
+    pd.testing.assert_frame_equal(pairs, expected, check_dtype=False)
+    assert len(pairs) == 2
+    unmatched = trials.get_unmatched_trials()
+    assert 8 in unmatched.index and 9 in unmatched.index
+
+    # Replacing df with a filtered frame also rebuilds the index
+    trials.df = trials.df[trials.df['user_number'] == 1]
+    assert trials.calc_d_values()['user_number'].unique().tolist() == [1]
+    print("PASS: Direct edits to df rebuild the cached pairs.")
+
+
+if __name__ == "__main__":
+    test_pairs_match_reference()
+    test_failure_reasons()
+    test_seeded_sample_is_reproducible()
+    test_cached_index_follows_direct_edits()
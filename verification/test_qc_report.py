@@ -0,0 +1,128 @@
+import importlib
+import numpy as np
+import pytest
+import sys
+import os
+
+# Add project root and verification directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.dirname(__file__))
+
+import differential_harness
+from schema_analysis import visualization
+from schema_analysis.qc_report import generate_qc_reports, prepare_qc_data
+
+PLOTTING_PACKAGES = ('matplotlib', 'seaborn')
+
+
+def _plotting_modules():
+    return [name for name in sys.modules if name.split('.')[0] in PLOTTING_PACKAGES]
+
+
+@pytest.fixture(scope='module', autouse=True)
+def real_matplotlib():
+    """
+    test_angle_validation.py replaces matplotlib with mocks for the whole
+    session, but QC pages must really be written. Imports the real modules
+    for this file's tests and puts the previous ones back afterwards.
+    """
+    previous = {name: sys.modules.pop(name) for name in _plotting_modules()}
+    importlib.reload(visualization)
+    yield
+    for name in _plotting_modules():
+        del sys.modules[name]
+    sys.modules.update(previous)
+    importlib.reload(visualization)
+
+
+def test_only_changed_subjects_regenerate(tmp_path, make_marked_trials):
+    print("--- Testing incremental QC report generation ---")
+    raw_df = differential_harness.generate_trials(np.random.default_rng(8), n_subjects=3)
+    output_dir = str(tmp_path)
+
+    first = generate_qc_reports(make_marked_trials(raw_df), output_dir)
+    assert (first['status'] == 'generated').all()
+    for page in first['page']:
+        assert os.path.getsize(os.path.join(output_dir, page)) > 0
+
+    second = generate_qc_reports(make_marked_trials(raw_df), output_dir)
+    assert (second['status'] == 'unchanged').all()
+
+    # Slowing the slowest trial further leaves every group reference as it was
+    slowest = raw_df['latency'].idxmax()
+    changed_user = raw_df.loc[slowest, 'user_number']
+    raw_df.loc[slowest, 'latency'] += 100000
+    third = generate_qc_reports(make_marked_trials(raw_df), output_dir).set_index('user_number')['status']
+    assert third[changed_user] == 'generated'
+    assert (third.drop(changed_user) == 'unchanged').all()
+    print("PASS: Only the subject whose data changed was redrawn.")
+
+
+def test_new_subject_keeps_other_pages(tmp_path, make_marked_trials):
+    print("\n--- Testing QC pages after a subject is added ---")
+    raw_df = differential_harness.generate_trials(np.random.default_rng(8), n_subjects=6)
+    output_dir = str(tmp_path)
+    new_user = raw_df['user_number'].max()
+    generate_qc_reports(make_marked_trials(raw_df[raw_df['user_number'] != new_user]), output_dir)
+
+    # The new subject moves the group references, which only force=True redraws
+    second = generate_qc_reports(make_marked_trials(raw_df), output_dir).set_index('user_number')['status']
+    assert second[new_user] == 'generated'
+    assert (second.drop(new_user) == 'unchanged').all()
+
+    forced = generate_qc_reports(make_marked_trials(raw_df), output_dir, force=True)
+    assert (forced['status'] == 'generated').all()
+    print("PASS: Only the new subject was drawn; force=True redrew every page.")
+
+
+def test_missing_condition_keys(tmp_path, make_marked_trials):
+    print("\n--- Testing QC pages for trials without face or tube ---")
+    raw_df = differential_harness.generate_trials(np.random.default_rng(8), n_subjects=6)
+    assert raw_df[['face_id', 'tubeTypeIndex']].isna().any(axis=None)
+
+    report = generate_qc_reports(make_marked_trials(raw_df), str(tmp_path))
+    assert (report['status'] == 'generated').all() and len(report) == raw_df['user_number'].nunique()
+    print("PASS: Trials with a missing face or tube did not stop the report.")
+
+
+def test_paired_matches_clean_selection(make_marked_trials):
+    print("\n--- Testing QC pairing against the clean selection ---")
+    raw_df = differential_harness.generate_trials(np.random.default_rng(8), n_subjects=6, p_duplicate=0.2)
+    trials = make_marked_trials(raw_df)
+    trial_df, _, subject_D, _ = prepare_qc_data(trials)
+
+    clean_trials = trials.select(valid_only=True)
+    assert trial_df['paired'].sum() == 2 * len(clean_trials.calc_d_values())
+    expected_D = clean_trials.calc_subject_D().sort_values(['user_number', 'face_id'])
+    assert np.allclose(subject_D.sort_values(['user_number', 'face_id'])['D'], expected_D['D'])
+    print("PASS: Paired trials and D are those of select(valid_only=True).")
+
+
+def test_process_pool_pages(tmp_path, make_marked_trials):
+    print("\n--- Testing QC pages rendered in a process pool ---")
+    raw_df = differential_harness.generate_trials(np.random.default_rng(9), n_subjects=4)
+    output_dir = str(tmp_path)
+
+    first = generate_qc_reports(make_marked_trials(raw_df), output_dir, n_jobs=2)
+    assert (first['status'] == 'generated').all() and len(first) == raw_df['user_number'].nunique()
+    for page in first['page']:
+        assert os.path.getsize(os.path.join(output_dir, page)) > 0
+
+    # The manifest written from the pool's results makes the serial run a no-op
+    second = generate_qc_reports(make_marked_trials(raw_df), output_dir, n_jobs=1)
+    assert (second['status'] == 'unchanged').all()
+    print("PASS: Pool workers wrote every page and the manifest recorded them.")
+
+
+if __name__ == "__main__":
+    import tempfile
+    from conftest import mark_trials
+    with tempfile.TemporaryDirectory() as directory:
+        test_only_changed_subjects_regenerate(directory, mark_trials)
+    with tempfile.TemporaryDirectory() as directory:
+        test_new_subject_keeps_other_pages(directory, mark_trials)
+    with tempfile.TemporaryDirectory() as directory:
+        test_missing_condition_keys(directory, mark_trials)
+    test_paired_matches_clean_selection(mark_trials)
+    with tempfile.TemporaryDirectory() as directory:
+        test_process_pool_pages(directory, mark_trials)
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import sys
+import os
+from scipy import stats
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from schema_analysis.rank_tests import rank_test_summary
+
+
+def _subject_D(rng):
+    # Continuous (exact p), rounded small (ties/zeros, sign flips) and large samples (normal approximation)
+    samples = {
+        'exact': rng.normal(0.5, 1, size=20),
+        'tied_small': np.round(rng.normal(0.5, 2, size=11)),
+        'tied_large': np.round(rng.normal(0.5, 2, size=40)),
+        'large': rng.standard_t(3, size=120),
+    }
+    return pd.concat([pd.DataFrame({'face_id': name, 'user_number': np.arange(len(v)), 'D': v})
+                      for name, v in samples.items()], ignore_index=True)
+
+
+def test_wilcoxon_matches_scipy():
+    print("--- Testing vectorized signed-rank test against scipy ---")
+    subject_D = _subject_D(np.random.default_rng(4))
+    summary = rank_test_summary(subject_D, ['face_id']).set_index('face_id')
+
+    for face_id, group in subject_D.groupby('face_id'):
+        expected = stats.wilcoxon(group['D'])
+        assert np.isclose(summary.loc[face_id, 'wilcoxon_W'], expected.statistic), face_id
+        assert np.isclose(summary.loc[face_id, 'wilcoxon_p'], expected.pvalue), face_id
+    print("PASS: W and p match scipy.stats.wilcoxon for exact, tied and large samples.")
+
+
+def test_yuen_trimmed_mean():
+    print("\n--- Testing Yuen trimmed-mean test ---")
+    subject_D = _subject_D(np.random.default_rng(5))
+    summary = rank_test_summary(subject_D, ['face_id']).set_index('face_id')
+
+    for face_id, group in subject_D.groupby('face_id'):
+        x = np.sort(group['D'].to_numpy())
+        n = len(x)
+        g = int(np.floor(0.2 * n))
+        h = n - 2 * g
+        winsorized = np.clip(x, x[g], x[n - g - 1])
+        se = np.sqrt((n - 1) * winsorized.var(ddof=1) / (h * (h - 1)))
+        t_stat = stats.trim_mean(x, 0.2) / se
+
+        assert np.isclose(summary.loc[face_id, 'trimmed_mean'], stats.trim_mean(x, 0.2))
+        assert np.isclose(summary.loc[face_id, 'yuen_t'], t_stat)
+        assert np.isclose(summary.loc[face_id, 'yuen_p'], 2 * stats.t.sf(abs(t_stat), h - 1))
+    print("PASS: Trimmed mean, t and p match the textbook formulas.")
+
+
+if __name__ == "__main__":
+    test_wilcoxon_matches_scipy()
+    test_yuen_trimmed_mean()
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from schema_analysis.regression import TERMS, design_matrix, fit_subject_models
+
+
+def _trials(rng, n_subjects):
+    cells = pd.MultiIndex.from_product(
+        [range(1, n_subjects + 1), ['ID015'], range(4), ['left', 'right'], ['towards', 'away']],
+        names=['user_number', 'face_id', 'tubeTypeIndex', 'faceSide', 'towards_away']).to_frame(index=False)
+    slope = rng.normal(2, 1, size=n_subjects)[cells['user_number'] - 1]
+    cells['end_angle'] = 10 + slope * cells['tubeTypeIndex'] + rng.normal(0, 3, size=len(cells))
+    return cells.sample(frac=1, random_state=0)
+
+
+def test_batched_fit_matches_lstsq():
+    print("--- Testing batched OLS against per-subject lstsq ---")
+    df = _trials(np.random.default_rng(2), n_subjects=6)
+    fits = fit_subject_models(df)
+
+    for user, subject_df in df.groupby('user_number'):
+        X = design_matrix(subject_df)
+        y = subject_df['end_angle'].to_numpy()
+        beta, rss, _, _ = np.linalg.lstsq(X, y, rcond=None)
+        sigma2 = rss[0] / (len(y) - X.shape[1])
+        se = np.sqrt(sigma2 * np.diag(np.linalg.inv(X.T @ X)))
+
+        actual = fits[fits['user_number'] == user].set_index('term').loc[TERMS]
+        assert np.allclose(actual['coef'], beta)
+        assert np.allclose(actual['se'], se)
+    print("PASS: Coefficients and standard errors match single fits.")
+
+
+def test_rank_deficient_subject():
+    print("\n--- Testing a subject with a single tube type ---")
+    df = _trials(np.random.default_rng(3), n_subjects=2)
+    df = df[(df['user_number'] == 1) | (df['tubeTypeIndex'] == 0)]
+    fits = fit_subject_models(df).set_index('user_number')
+
+    assert fits.loc[2, 'coef'].isna().all()
+    assert fits.loc[1, 'coef'].notna().all()
+    print("PASS: Unidentifiable models give NaN without affecting others.")
+
+
+if __name__ == "__main__":
+    test_batched_fit_matches_lstsq()
+    test_rank_deficient_subject()
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import sys
+import os
+import pickle
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Add project root and verification directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.dirname(__file__))
+
+import differential_harness
+from schema_analysis.shared import SharedTrialTable, attach_trials, detach
+from schema_analysis.tube_trials import TubeTrials
+
+
+def _segments_exist(handle):
+    return [os.path.exists(f"/dev/shm/{name}") for _, name, _, _, _ in handle.columns]
+
+
+def _worker_stats(handle):
+    trials = attach_trials(handle)
+    trials.mark_valid_angles(min_angle=3, max_angle=30)
+    return os.getpid(), trials.select(valid_only=True).calc_stats()
+
+
+def test_views_and_lifecycle(make_clean_trials):
+    print("--- Testing shared-memory views and cleanup ---")
+    raw_df = differential_harness.generate_trials(np.random.default_rng(46), n_subjects=20)
+    clean_trials = make_clean_trials(raw_df)
+
+    with clean_trials.share() as table:
+        assert len(pickle.dumps(table.handle)) < len(pickle.dumps(clean_trials.df)) / 10
+        view = attach_trials(table.handle)
+        pd.testing.assert_frame_equal(view.df, clean_trials.df)
+        pd.testing.assert_frame_equal(attach_trials(table.handle).calc_stats(), clean_trials.calc_stats())
+        pd.testing.assert_frame_equal(attach_trials(table.handle).calc_subject_D(), clean_trials.calc_subject_D())
+        assert isinstance(table.to_frame(categorical=True)['face_id'].dtype, pd.CategoricalDtype)
+
+        # Views share the segment memory; edits copy the column instead of writing to it
+        other = attach_trials(table.handle)
+        assert np.shares_memory(view.df['end_angle'].to_numpy(), other.df['end_angle'].to_numpy())
+        other.df.loc[other.df.index[0], 'end_angle'] = -999
+        assert (view.df['end_angle'] != -999).all()
+        assert (attach_trials(table.handle).df['end_angle'] != -999).all()
+        del view, other
+        detach(table.handle)
+        handle = table.handle
+    if sys.platform.startswith('linux'):
+        assert not any(_segments_exist(handle))
+    print("PASS: Views match the trials, share memory, copy on write and segments are freed on exit.")
+
+
+def test_process_pool_workers(make_clean_trials):
+    print("\n--- Testing workers attached to a shared table ---")
+    raw_df = differential_harness.generate_trials(np.random.default_rng(47), n_subjects=20)
+    clean_trials = make_clean_trials(raw_df)
+    expected = TubeTrials(clean_trials.df)
+    expected.mark_valid_angles(min_angle=3, max_angle=30)
+    expected = expected.select(valid_only=True).calc_stats()
+
+    with SharedTrialTable.publish(clean_trials) as table:
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=2, mp_context=context) as executor:
+            results = list(executor.map(_worker_stats, [table.handle] * 4))
+        if sys.platform.startswith('linux'):
+            assert all(_segments_exist(table.handle))
+    for _, stats_df in results:
+        pd.testing.assert_frame_equal(stats_df, expected)
+    print("PASS: Every task gets the same result and worker exit leaves the segments alive.")
+
+
+if __name__ == "__main__":
+    from conftest import clean_trials_from
+    test_views_and_lifecycle(clean_trials_from)
+    test_process_pool_workers(clean_trials_from)
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from schema_analysis import simulation
+
+
+def test_batched_pipeline_matches_tube_trials(make_clean_trials):
+    print("--- Testing batched simulation pipeline ---")
+    rng = np.random.default_rng(3)
+    design = {'n_subjects': 30, 'faces': ('ID015', 'ID017')}
+    raw_df = simulation.simulate_experiments(3, design, rng)
+    batched = simulation.analyze_experiments(raw_df)
+
+    for experiment, exp_df in raw_df.groupby('experiment'):
+        expected = make_clean_trials(exp_df.drop(columns='experiment')).calc_stats().set_index('face_id')
+
+        actual = batched[batched['experiment'] == experiment].set_index('face_id')
+        for col in ['mean', 'std', 't_stat', 'p_value']:
+            assert np.allclose(actual.loc[expected.index, col], expected[col], equal_nan=True), col
+    print("PASS: Batched analysis matches the per-experiment TubeTrials pipeline.")
+
+
+def test_power_is_reproducible_across_workers():
+    print("\n--- Testing simulate_power ---")
+    designs = simulation.design_grid(n_subjects=[20, 40], effect=[0.0, 3.0])
+    serial = simulation.simulate_power(designs, n_experiments=40, batch_size=20, n_jobs=1, seed=5)
+    parallel = simulation.simulate_power(designs, n_experiments=40, batch_size=20, n_jobs=2, seed=5)
+
+    pd.testing.assert_frame_equal(serial, parallel)
+    assert serial['power'].between(0, 1).all()
+    # A large effect with more subjects should be detected more often than no effect
+    strong = serial[(serial['effect'] == 3.0) & (serial['n_subjects'] == 40)]['power'].iloc[0]
+    null = serial[(serial['effect'] == 0.0) & (serial['n_subjects'] == 40)]['power'].iloc[0]
+    assert strong > null
+    print("PASS: Power estimates are reproducible and ordered by effect size.")
+
+
+if __name__ == "__main__":
+    from conftest import clean_trials_from
+    test_batched_pipeline_matches_tube_trials(clean_trials_from)
+    test_power_is_reproducible_across_workers()
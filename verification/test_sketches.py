@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import sys
+import os
+import tempfile
+
+# Add project root and verification directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.dirname(__file__))
+
+import differential_harness
+from schema_analysis import processing
+from schema_analysis.sketches import HistogramSketch, sketch_exports
+
+
+def _split(df, n):
+    bounds = np.linspace(0, len(df), n + 1).astype(int)
+    return [df.iloc[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def test_merged_chunks_match_one_pass():
+    print("--- Testing sketch merge and quantile accuracy ---")
+    rng = np.random.default_rng(42)
+    df = pd.DataFrame({'face_id': rng.choice(['ID015', 'ID017'], size=20000),
+                       'd': rng.normal(0, 8, size=20000),
+                       'latency': rng.lognormal(8, 1, size=20000)})
+
+    whole = HistogramSketch('d', by=['face_id'], bin_width=0.5).update(df)
+    parts = [HistogramSketch('d', by=['face_id'], bin_width=0.5).update(chunk)
+             for chunk in _split(df, 7)]
+    merged = parts[0]
+    for part in parts[1:]:
+        merged = merged + part
+    for face_id in ['ID015', 'ID017']:
+        assert np.array_equal(merged.histogram(face_id)[0], whole.histogram(face_id)[0])
+        exact = np.quantile(df.loc[df['face_id'] == face_id, 'd'], [0, 0.05, 0.5, 0.95, 1])
+        assert np.all(np.abs(merged.quantiles([0, 0.05, 0.5, 0.95, 1], face_id) - exact) <= 0.5)
+    assert merged.range() == (df['d'].min(), df['d'].max())
+    print("PASS: Merged chunks equal one pass; quantiles within one bin.")
+
+    latency = HistogramSketch('latency', bin_width=0.01, log=True).update(df)
+    exact = np.quantile(df['latency'], [0.01, 0.5, 0.99])
+    assert np.all(np.abs(latency.quantiles([0.01, 0.5, 0.99]) / exact - 1) <= 0.011)
+    print("PASS: Log-binned quantiles within the relative resolution.")
+
+
+def test_sketch_exports():
+    print("\n--- Testing streamed sketches of export files ---")
+    raw_df = differential_harness.generate_trials(np.random.default_rng(43), n_subjects=20)
+    # A few trials without a face_id, spread over the files and chunks
+    raw_df.loc[raw_df.index[::37], 'face_id'] = None
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = []
+        for i, part in enumerate(_split(raw_df, 3)):
+            paths.append(os.path.join(tmp_dir, f"part{i}.csv.gz"))
+            part.to_csv(paths[-1], index=False)
+        sketches = sketch_exports(paths, by=['face_id'], chunksize=50)
+
+    expected_df = processing.transform_angles(raw_df.copy())
+    expected_df['face_id'] = expected_df['face_id'].replace(processing.FACE_ID_RENAMES)
+    table = sketches['end_angle'].percentile_table(percentiles=[50])
+    assert pd.isna(table['face_id'].iloc[-1])
+    for (face_id, group), (_, row) in zip(expected_df.groupby('face_id', dropna=False), table.iterrows()):
+        assert row['face_id'] == face_id or (pd.isna(row['face_id']) and pd.isna(face_id))
+        assert row['n'] == len(group)
+        assert row['min'] == group['end_angle'].min()
+        assert abs(row['p50'] - group['end_angle'].median()) <= 1
+    print("PASS: Counts, minima and medians match the loaded data, including trials without a face_id.")
+
+
+if __name__ == "__main__":
+    test_merged_chunks_match_one_pass()
+    test_sketch_exports()
@@ -0,0 +1,60 @@
+import pandas as pd
+import numpy as np
+import sys
+import os
+
+# Add project root and verification directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.dirname(__file__))
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), 'data', 'dummy_verification.csv')
+
+
+def test_face_grouping_matches_calc_stats(make_clean_trials):
+    print("--- Testing Stats Cube (face_id grouping) ---")
+    clean_trials = make_clean_trials(pd.read_csv(DATA_FILE))
+    expected = clean_trials.calc_stats().set_index('face_id').sort_index()
+
+    cube_df = clean_trials.calc_stats_cube()
+    actual = cube_df[cube_df['grouping'] == 'face_id'].set_index('face_id').sort_index()
+
+    for col in ['mean', 'std', 'sem', 'n_subjects', 't_stat', 'p_value']:
+        assert np.allclose(actual[col].astype(float), expected[col].astype(float), equal_nan=True), col
+    print("PASS: Cube face_id rows match calc_stats().")
+
+
+def test_slice_matches_filtered_pipeline(make_clean_trials):
+    print("\n--- Testing Stats Cube (pair_type slice) ---")
+    clean_trials = make_clean_trials(pd.read_csv(DATA_FILE))
+    cube_df = clean_trials.calc_stats_cube(grouping_sets=[['pair_type']])
+
+    for pair_type in ['FaceLeft', 'FaceRight']:
+        pairs = clean_trials.calc_d_values()
+        pairs = pairs[pairs['pair_type'] == pair_type]
+        subject_D = pairs.groupby(['user_number', 'face_id'])['d'].mean()
+        expected_means = subject_D.groupby('face_id').mean()
+
+        rows = cube_df[cube_df['pair_type'] == pair_type].set_index('face_id')
+        assert np.allclose(rows.loc[expected_means.index, 'mean'], expected_means)
+    print("PASS: pair_type slices match a filtered rerun.")
+
+
+def test_varying_subject_attribute_raises(make_clean_trials):
+    print("\n--- Testing a subject whose sightType changes ---")
+    clean_trials = make_clean_trials(pd.read_csv(DATA_FILE))
+    user = clean_trials.df['user_number'].iloc[0]
+    rows = clean_trials.df.index[clean_trials.df['user_number'] == user]
+    clean_trials.df.loc[rows[:1], 'sightType'] = 'changed'
+    try:
+        clean_trials.calc_stats_cube()
+        assert False, "A varying subject attribute should be refused"
+    except ValueError as e:
+        assert 'sightType' in str(e)
+    print("PASS: Subjects spanning two slices are reported instead of silently assigned.")
+
+
+if __name__ == "__main__":
+    from conftest import clean_trials_from
+    test_face_grouping_matches_calc_stats(clean_trials_from)
+    test_slice_matches_filtered_pipeline(clean_trials_from)
+    test_varying_subject_attribute_raises(clean_trials_from)
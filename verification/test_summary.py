@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import sys
+import os
+import tempfile
+
+# Add project root and verification directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.dirname(__file__))
+
+import differential_harness
+from schema_analysis.summary import SiteSummary
+
+
+def _site_summaries(make_clean_trials, raw_df, n_sites, rng):
+    users = raw_df['user_number'].unique()
+    site = rng.integers(0, n_sites, size=len(users))
+    return [make_clean_trials(raw_df[raw_df['user_number'].isin(users[site == s])]).summarize(f"site{s}")
+            for s in range(n_sites)]
+
+
+def test_merged_sites_match_pooled_run(make_clean_trials):
+    print("--- Testing merged site summaries against a pooled run ---")
+    rng = np.random.default_rng(41)
+    raw_df = differential_harness.generate_trials(rng, n_subjects=30)
+    pooled = make_clean_trials(raw_df).calc_stats()
+
+    a, b, c = _site_summaries(make_clean_trials, raw_df, 3, rng)
+    for merged in [(a + b) + c, a + (b + c), SiteSummary.pool([c, a, b])]:
+        pd.testing.assert_frame_equal(merged.calc_stats(), pooled, check_exact=True)
+
+    # Chan-merged moments agree with the pooled subject D
+    moments = ((a + b) + c).face_moments.set_index('face_id')
+    expected = pooled.set_index('face_id').loc[moments.index]
+    assert np.allclose(moments['mean'], expected['mean'])
+    assert np.allclose(np.sqrt(moments['m2'] / (moments['n_subjects'] - 1)), expected['std'])
+    print("PASS: Any merge order reproduces calc_stats() exactly.")
+
+    try:
+        a + a
+        assert False, "Merging a site twice should fail"
+    except ValueError:
+        print("PASS: A site cannot be merged twice.")
+
+
+def test_shared_user_numbers_raise(make_clean_trials):
+    print("\n--- Testing user numbers shared between sites ---")
+    rng = np.random.default_rng(43)
+    raw_df = differential_harness.generate_trials(rng, n_subjects=10)
+    a = make_clean_trials(raw_df).summarize('site_a')
+    b = make_clean_trials(raw_df).summarize('site_b')
+    try:
+        a + b
+        assert False, "Merging sites with the same user numbers should fail"
+    except ValueError as e:
+        assert 'more than one site' in str(e)
+
+    renumbered = raw_df.assign(user_number=raw_df['user_number'] + 1000)
+    merged = a + make_clean_trials(renumbered).summarize('site_b')
+    assert merged.sites == ['site_a', 'site_b']
+    assert not merged.subject_D.duplicated(['user_number', 'face_id']).any()
+    print("PASS: Overlapping user numbers are refused; renumbered sites merge.")
+
+
+def test_save_and_load(make_clean_trials):
+    print("\n--- Testing summary serialization ---")
+    rng = np.random.default_rng(42)
+    raw_df = differential_harness.generate_trials(rng, n_subjects=20)
+    summary = SiteSummary.pool(_site_summaries(make_clean_trials, raw_df, 2, rng))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name in ['summary.json', 'summary.npz']:
+            path = os.path.join(tmp_dir, name)
+            summary.save(path)
+            loaded = SiteSummary.load(path)
+            pd.testing.assert_frame_equal(loaded.calc_stats(), summary.calc_stats(), check_exact=True)
+            assert loaded.sites == summary.sites
+            pd.testing.assert_frame_equal(loaded.face_moments, summary.face_moments, check_dtype=False)
+            print(f"PASS: {name} round trip keeps the statistics.")
+
+
+if __name__ == "__main__":
+    from conftest import clean_trials_from
+    test_merged_sites_match_pooled_run(clean_trials_from)
+    test_shared_user_numbers_raise(clean_trials_from)
+    test_save_and_load(clean_trials_from)
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import sys
+import os
+
+# Add project root and verification directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.dirname(__file__))
+
+import differential_harness
+from schema_analysis.tensor import TrialTensor
+
+
+def test_one_way_anova(make_clean_trials):
+    print("--- Testing tube repeated-measures ANOVA ---")
+    raw_df = differential_harness.generate_trials(np.random.default_rng(5), n_subjects=20)
+    tensor = TrialTensor.from_trials(make_clean_trials(raw_df).df)
+    anova = tensor.rm_anova(factors=('tube',)).set_index('effect')
+
+    # Textbook one-way RM ANOVA on the subject x tube means (side means, then averaged over faces)
+    d, mask = tensor.d_values()
+    with np.errstate(invalid='ignore'):
+        side_means = np.where(mask, d, 0).sum(axis=3) / mask.sum(axis=3)
+        cells = np.nansum(side_means, axis=1) / (~np.isnan(side_means)).sum(axis=1)
+    Y = cells[~np.isnan(cells).any(axis=1)]
+    n, k = Y.shape
+    grand = Y.mean()
+    ss_tube = n * ((Y.mean(axis=0) - grand) ** 2).sum()
+    ss_subject = k * ((Y.mean(axis=1) - grand) ** 2).sum()
+    ss_error = ((Y - grand) ** 2).sum() - ss_tube - ss_subject
+    f_stat = (ss_tube / (k - 1)) / (ss_error / ((k - 1) * (n - 1)))
+
+    assert anova.loc['tube', 'n_subjects'] == n
+    assert np.isclose(anova.loc['tube', 'F'], f_stat)
+    print("PASS: F matches the textbook computation.")
+
+
+def test_save_load(tmp_path, make_clean_trials):
+    print("\n--- Testing tensor save/load ---")
+    raw_df = differential_harness.generate_trials(np.random.default_rng(6), n_subjects=20)
+    tensor = TrialTensor.from_trials(make_clean_trials(raw_df).df)
+    path = os.path.join(str(tmp_path), 'tensor.npz')
+    tensor.save(path)
+    loaded = TrialTensor.load(path)
+
+    assert loaded.shape == tensor.shape
+    assert np.array_equal(loaded.angles, tensor.angles, equal_nan=True)
+    pd.testing.assert_frame_equal(loaded.face_stats(), tensor.face_stats())
+    print("PASS: Loaded tensor reproduces the face statistics.")
+
+
+if __name__ == "__main__":
+    import tempfile
+    from conftest import clean_trials_from
+    test_one_way_anova(clean_trials_from)
+    with tempfile.TemporaryDirectory() as directory:
+        test_save_load(directory, clean_trials_from)